@@ -20,3 +20,13 @@ export function useRecipeRecommendations(params?: {
     staleTime: 5 * 60 * 1000, // 5 minutes
   });
 }
+
+// Record that the user viewed or cooked a recipe (training data for collaborative recommendations)
+export function useRecordRecipeInteraction() {
+  return useMutation({
+    mutationFn: async (interaction: { userId: string; recipeId: string; type: 'view' | 'cook' }) => {
+      const { data } = await apiClient.post(API_ENDPOINTS.AI.RECIPE_INTERACTIONS, interaction);
+      return data;
+    },
+  });
+}
@@ -1,19 +1,29 @@
 import React, { useState } from 'react';
 import { View, Text, FlatList, StyleSheet, Image, TextInput, TouchableOpacity, ActivityIndicator } from 'react-native';
-import { useRecipeRecommendations } from '../hooks/useAI';
+import { useRecipeRecommendations, useRecordRecipeInteraction } from '../hooks/useAI';
+import { useAuthStore } from '../store/authStore';
 import { SafeAreaView } from 'react-native-safe-area-context';
 import { Ionicons } from '@expo/vector-icons';
 
 const RecipesScreen = () => {
   const [searchTerm, setSearchTerm] = useState('');
   const { data: recipes = [], isLoading } = useRecipeRecommendations();
+  const { user } = useAuthStore();
+  const { mutate: recordInteraction } = useRecordRecipeInteraction();
+
+  const record = (recipeId: string | undefined, type: 'view' | 'cook') => {
+    const userId = user?.userId ?? user?.id;
+    if (userId && recipeId) {
+      recordInteraction({ userId, recipeId: recipeId.toString(), type });
+    }
+  };
 
   const filteredRecipes = recipes.filter((recipe: any) => 
     recipe.name.toLowerCase().includes(searchTerm.toLowerCase())
   );
 
   const renderItem = ({ item }: { item: any }) => (
-    <View style={styles.card}>
+    <TouchableOpacity style={styles.card} activeOpacity={0.8} onPress={() => record(item.id, 'view')}>
       <View style={styles.imageContainer}>
         <Text style={styles.placeholderIcon}>🍽️</Text>
       </View>
@@ -27,8 +37,11 @@ const RecipesScreen = () => {
           <Text style={styles.detailText}>⏱️ {item.cookTime} min</Text>
           <Text style={styles.detailText}>👥 {item.servings} servings</Text>
         </View>
+        <TouchableOpacity style={styles.cookedButton} onPress={() => record(item.id, 'cook')}>
+          <Text style={styles.cookedButtonText}>I cooked this</Text>
+        </TouchableOpacity>
       </View>
-    </View>
+    </TouchableOpacity>
   );
 
   return (
@@ -151,6 +164,18 @@ const styles = StyleSheet.create({
     fontSize: 12,
     color: '#888',
   },
+  cookedButton: {
+    marginTop: 12,
+    paddingVertical: 8,
+    borderRadius: 8,
+    borderWidth: 1,
+    borderColor: '#4CAF50',
+    alignItems: 'center',
+  },
+  cookedButtonText: {
+    color: '#4CAF50',
+    fontWeight: 'bold',
+  },
   loadingContainer: {
     flex: 1,
     justifyContent: 'center',
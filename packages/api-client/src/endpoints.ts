@@ -57,6 +57,7 @@ export const API_ENDPOINTS = {
   AI: {
     RECOMMENDATIONS: '/api/ai/recommendations/recipes',
     POPULAR: '/api/ai/recommendations/popular',
+    RECIPE_INTERACTIONS: '/api/ai/recommendations/interactions',
     BARCODE: '/api/ai/barcode/analyze',
     NUTRITION: '/api/ai/nutrition/analyze',
     ANALYZE_FOOD: '/api/ai/analyze-food',
@@ -0,0 +1,87 @@
+"""
+Micro-Batching
+Groups concurrent requests into one call of a batch function, run off the event loop
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+class MicroBatcher:
+    """
+    Queue in front of a batch function (list of inputs -> list of outputs)
+    
+    The worker waits for a first item, then keeps collecting until max_batch_size items
+    are queued or max_wait_ms has passed since that first item, and runs the whole batch
+    in one thread call. Under a burst, batches fill immediately; a lone request waits at
+    most max_wait_ms.
+    """
+    
+    def __init__(self, batch_fn: Callable[[List[Any]], List[Any]], max_batch_size: int, max_wait_ms: float):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.batches = 0
+        self.items = 0
+    
+    async def submit(self, item: Any) -> Any:
+        """Queue one input and wait for its output"""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((item, future))
+        return await future
+    
+    async def _collect(self) -> List[Tuple[Any, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+        
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def run(self):
+        """Background task draining the queue batch by batch"""
+        while True:
+            batch = await self._collect()
+            # Requests cancelled while queued (client gone) are dropped
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            
+            try:
+                outputs = await asyncio.to_thread(self.batch_fn, [item for item, _ in batch])
+                error: Optional[Exception] = None
+            except Exception as e:
+                outputs, error = None, e
+            
+            self.batches += 1
+            self.items += len(batch)
+            for index, (_, future) in enumerate(batch):
+                if future.done():
+                    continue
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(outputs[index])
+    
+    def stats(self) -> Dict:
+        """Batches run, items served and mean batch size"""
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self.queue.qsize(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
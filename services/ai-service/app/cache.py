@@ -0,0 +1,78 @@
+"""
+In-process Caches
+LRU cache with optional TTL, memory cap and hit/miss counters, shared by the feature store and result caches
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+class LRUCache:
+    """
+    Least-recently-used cache for a single event loop
+    Entries expire after ttl seconds when a ttl is given. With max_bytes, entries are also
+    evicted while their total size (as measured by sizeof) exceeds it.
+    """
+    
+    def __init__(self, maxsize: int, ttl: Optional[float] = None,
+                 max_bytes: Optional[int] = None, sizeof: Optional[Callable[[Any], int]] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Cached value, or default on a miss or an expired entry"""
+        entry = self._data.get(key)
+        if entry is None or (entry[0] is not None and entry[0] < time.monotonic()):
+            if entry is not None:
+                self.delete(key)
+            self.misses += 1
+            return default
+        
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+    
+    def set(self, key: Hashable, value: Any):
+        """Insert or refresh an entry, evicting the least recently used one when full"""
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        self.delete(key)
+        self._data[key] = (expires_at, value, size)
+        self.bytes += size
+        
+        while len(self._data) > self.maxsize or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            _, evicted = self._data.popitem(last=False)
+            self.bytes -= evicted[2]
+    
+    def delete(self, key: Hashable):
+        """Drop an entry if present"""
+        entry = self._data.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
+    
+    def clear(self):
+        """Drop all entries"""
+        self._data.clear()
+        self.bytes = 0
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Size and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
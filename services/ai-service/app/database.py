@@ -6,6 +6,10 @@ from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import ASCENDING, DESCENDING
 import os
 
+# startup: create indexes before serving; background: create them during warm-up;
+# skip: indexes are created by the migration step (python -m app.migrate)
+DB_INDEXES = os.getenv("DB_INDEXES", "startup").lower()
+
 client = None
 database = None
 
@@ -19,12 +23,34 @@ async def connect_db():
     client = AsyncIOMotorClient(mongodb_uri)
     database = client[db_name]
     
-    # Create indexes
+    print("✅ Connected to MongoDB")
+
+async def ensure_indexes():
+    """Create the service's indexes (no-op for those that already exist)"""
     await database.oil_logs.create_index([("userId", ASCENDING), ("date", DESCENDING)])
+    await database.oil_logs.create_index("createdAt")
     await database.users.create_index("userId", unique=True)
     await database.recipes.create_index([("tags", ASCENDING)])
+    await database.recipes.create_index([("viewCount", DESCENDING)])
+    await database.recipe_interactions.create_index([("userId", ASCENDING), ("recipeId", ASCENDING)])
+    await database.consumption_forecasts.create_index("userId", unique=True)
+    await database.feature_states.create_index("userId", unique=True)
+    await database.feature_states.create_index("window._id")
+    await database.oil_log_daily.create_index([("userId", ASCENDING), ("day", ASCENDING)], unique=True)
+    await database.oil_log_daily.create_index("day")
+    await database.region_daily.create_index([("region", ASCENDING), ("day", ASCENDING)], unique=True)
+    await database.region_daily.create_index("day")
+    await database.user_activity.create_index("userId", unique=True)
+    await database.user_activity.create_index([("last_day", ASCENDING), ("region", ASCENDING)])
+    # At most one active training job
+    await database.training_jobs.create_index("active", unique=True, partialFilterExpression={"active": True})
+    await database.training_jobs.create_index([("created_at", DESCENDING)])
     
-    print("✅ Connected to MongoDB")
+    print("✅ MongoDB indexes ensured")
+
+async def ping_db():
+    """Round trip to MongoDB; raises if it is unreachable"""
+    await database.command("ping")
 
 async def close_db():
     """Close MongoDB connection"""
@@ -0,0 +1,92 @@
+"""
+Model Executor
+Runs CPU-bound model work (feature building, fitting, forecasting) in a thread or process pool
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+MODEL_EXECUTOR = os.getenv("MODEL_EXECUTOR", "thread").lower()
+MODEL_EXECUTOR_WORKERS = int(os.getenv("MODEL_EXECUTOR_WORKERS", 2))
+MODEL_EXECUTOR_MAX_QUEUE = int(os.getenv("MODEL_EXECUTOR_MAX_QUEUE", 32))
+
+class ExecutorBusyError(RuntimeError):
+    """Every worker is busy and the queue is full"""
+
+class ModelExecutor:
+    """
+    Bounded pool for model work, so pandas/sklearn/numpy calls never block the event loop
+    
+    At most workers + max_queue calls are running or queued at once. run() waits for a
+    slot (background jobs, training); try_run() raises ExecutorBusyError instead, so
+    request handlers can shed load with a 503 rather than pile up.
+    
+    "thread" suits NumPy/sklearn work, which mostly releases the GIL. "process" isolates
+    pure-Python pandas work from the event loop's GIL, but every argument and result is
+    pickled, so only functions that return their results (rather than mutating their
+    arguments) may be sent to it. Worker processes are spawned, not forked, to avoid
+    inheriting the event loop and MongoDB client.
+    """
+    
+    def __init__(self, kind: str = MODEL_EXECUTOR, workers: int = MODEL_EXECUTOR_WORKERS,
+                 max_queue: int = MODEL_EXECUTOR_MAX_QUEUE):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"MODEL_EXECUTOR must be 'thread' or 'process', got {kind!r}")
+        self.kind = kind
+        self.workers = max(1, workers)
+        self.capacity = self.workers + max(0, max_queue)
+        self.pending = 0
+        self.rejected = 0
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._pool: Optional[Executor] = None
+    
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="model")
+        return self._pool
+    
+    async def _submit(self, fn: Callable[..., Any], args: tuple, kwargs: Dict) -> Any:
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_pool(), functools.partial(fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+    
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool, waiting for a queue slot if none is free"""
+        async with self._slots:
+            return await self._submit(fn, args, kwargs)
+    
+    async def try_run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn(*args, **kwargs) in the pool, or raise ExecutorBusyError if the queue is full"""
+        if self._slots.locked():
+            self.rejected += 1
+            raise ExecutorBusyError("Model executor is at capacity, try again shortly")
+        async with self._slots:
+            return await self._submit(fn, args, kwargs)
+    
+    def shutdown(self):
+        """Stop the pool, dropping queued work"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+    
+    def stats(self) -> Dict:
+        """Pool kind, size and current load"""
+        return {
+            "kind": self.kind,
+            "workers": self.workers,
+            "capacity": self.capacity,
+            "pending": self.pending,
+            "rejected": self.rejected
+        }
+
+model_executor = ModelExecutor()
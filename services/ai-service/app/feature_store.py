@@ -0,0 +1,162 @@
+"""
+Feature State Store
+Compact per-user consumption feature state so predictions don't refetch and rebuild 90 days of logs
+"""
+
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from app.cache import LRUCache
+from app.database import get_database
+from app.log_events import log_events, changed_user_id
+
+FEATURE_WINDOW = 30  # Longest rolling window used by the consumption model
+HISTORY_LOGS = 90  # History window of /ai/predictions/consumption, caps the stored log count
+FEATURE_CACHE_SIZE = int(os.getenv("FEATURE_CACHE_SIZE", 100000))
+FEATURE_STATE_MAX_AGE_SECONDS = float(os.getenv("FEATURE_STATE_MAX_AGE_SECONDS", 3600))
+FEATURE_REBUILD_ATTEMPTS = 3
+
+class FeatureStore:
+    """
+    Per-user state: the latest FEATURE_WINDOW logs (date order) and the log count (capped
+    at HISTORY_LOGS)
+    
+    Reads go through an in-process LRU cache backed by the feature_states collection
+    and are O(1) in the user's history. A change stream on oil_logs folds new logs into
+    the stored state as they arrive. Every state is rebuilt from oil_logs once it is older
+    than FEATURE_STATE_MAX_AGE_SECONDS, which bounds how long it can drift from missed
+    events, and is the only refresh without a stream (standalone MongoDB).
+    
+    Each write bumps the state's version; a rebuild only replaces the version it read,
+    so it cannot overwrite a log folded in while it was reading oil_logs.
+    """
+    
+    def __init__(self):
+        self.cache = LRUCache(FEATURE_CACHE_SIZE)
+        log_events.subscribe(self.handle_change)
+    
+    def _is_stale(self, state: Dict) -> bool:
+        rebuilt_at = state.get("rebuilt_at")
+        if rebuilt_at is None or datetime.now() - rebuilt_at > timedelta(seconds=FEATURE_STATE_MAX_AGE_SECONDS):
+            return True
+        # Only states written since the stream opened are guaranteed to have seen every log
+        return log_events.watching and state["updated_at"] < log_events.started_at
+    
+    async def get(self, user_id: str) -> Dict:
+        """Feature state of a user, rebuilt from oil_logs if missing or stale"""
+        state = self.cache.get(user_id)
+        if state is not None and not self._is_stale(state):
+            return state
+        
+        db = get_database()
+        state = await db.feature_states.find_one({"userId": user_id})
+        if state is None or self._is_stale(state):
+            state = await self.rebuild(user_id)
+        
+        self.cache.set(user_id, state)
+        return state
+    
+    async def rebuild(self, user_id: str) -> Dict:
+        """
+        Recompute a user's state from their latest logs and store it
+        Retried when the stored state changes meanwhile; if it keeps changing, the fresh
+        state is returned without being stored.
+        """
+        for _ in range(FEATURE_REBUILD_ATTEMPTS):
+            state, previous = await self._read_state(user_id)
+            if await self._store(state, previous):
+                break
+        return state
+    
+    async def _read_state(self, user_id: str) -> Tuple[Dict, Optional[Dict]]:
+        """Fresh state of a user, and the version document of the stored state it replaces"""
+        db = get_database()
+        # Read the version before the logs, so any log folded in after this is a conflict
+        previous = await db.feature_states.find_one({"userId": user_id}, {"version": 1})
+        
+        logs = await db.oil_logs.find(
+            {"userId": user_id},
+            {"amount": 1, "date": 1}
+        ).sort("date", -1).limit(FEATURE_WINDOW).to_list(length=FEATURE_WINDOW)
+        
+        log_count = len(logs)
+        if log_count == FEATURE_WINDOW:
+            log_count = await db.oil_logs.count_documents({"userId": user_id}, limit=HISTORY_LOGS)
+        
+        now = datetime.now()
+        state = {
+            "userId": user_id,
+            "window": [
+                {"_id": log["_id"], "date": log["date"], "amount": log["amount"]}
+                for log in reversed(logs)
+            ],
+            "log_count": log_count,
+            "version": (previous.get("version") or 0) + 1 if previous else 1,
+            "rebuilt_at": now,
+            "updated_at": now
+        }
+        return state, previous
+    
+    async def _store(self, state: Dict, previous: Optional[Dict]) -> bool:
+        """Write a rebuilt state unless the stored one changed since it was read"""
+        db = get_database()
+        
+        if previous is None:
+            try:
+                await db.feature_states.insert_one(dict(state))
+            except DuplicateKeyError:
+                return False  # Created concurrently
+            return True
+        
+        # {"version": None} also matches states stored before versions were added
+        result = await db.feature_states.replace_one(
+            {"userId": state["userId"], "version": previous.get("version")},
+            state
+        )
+        return result.matched_count == 1
+    
+    async def apply_log(self, log: Dict):
+        """
+        Fold a newly inserted oil log into its user's stored state
+        Idempotent per log _id, so every worker may apply the same change event
+        """
+        db = get_database()
+        entry = {"_id": log["_id"], "date": log["date"], "amount": log["amount"]}
+        query = {"userId": log["userId"], "window._id": {"$ne": log["_id"]}}
+        update = {
+            "$push": {"window": {"$each": [entry], "$sort": {"date": 1}, "$slice": -FEATURE_WINDOW}},
+            "$inc": {"version": 1},
+            "$set": {"updated_at": datetime.now()}
+        }
+        
+        # log_count stops at HISTORY_LOGS, like count_documents(limit=HISTORY_LOGS) in a rebuild
+        result = await db.feature_states.update_one(
+            {**query, "log_count": {"$lt": HISTORY_LOGS}},
+            {**update, "$inc": {"log_count": 1, "version": 1}}
+        )
+        if result.matched_count == 0:
+            await db.feature_states.update_one(query, update)
+        self.cache.delete(log["userId"])
+    
+    async def invalidate(self, user_id: Optional[str] = None, log_id=None):
+        """Drop stored state for a user, or for whichever user's window holds a log"""
+        db = get_database()
+        query = {"userId": user_id} if user_id is not None else {"window._id": log_id}
+        
+        async for state in db.feature_states.find(query, {"userId": 1}):
+            self.cache.delete(state["userId"])
+        await db.feature_states.delete_many(query)
+    
+    async def handle_change(self, change: Dict):
+        """Apply an oil_logs change event"""
+        if change["operationType"] == "insert":
+            await self.apply_log(change["fullDocument"])
+        elif changed_user_id(change) is not None:
+            await self.invalidate(user_id=changed_user_id(change))
+        else:
+            await self.invalidate(log_id=change["documentKey"]["_id"])
+
+feature_store = FeatureStore()
@@ -0,0 +1,237 @@
+"""
+Batch Forecasting
+Bulk consumption forecasts for many users, shared by the batch endpoint and the nightly refresh job
+"""
+
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+from app.models.ml_models import MLModels
+from app.models.registry import get_models
+from app.executor import model_executor
+
+FORECAST_BATCH_SIZE = int(os.getenv("FORECAST_BATCH_SIZE", 1000))
+FORECAST_REFRESH_HOURS = float(os.getenv("FORECAST_REFRESH_HOURS", 24))
+FORECAST_LEASE_SECONDS = float(os.getenv("FORECAST_LEASE_SECONDS", 60))
+HISTORY_LOGS = 90  # Same history window as /ai/predictions/consumption
+MIN_LOGS = 3
+ACTIVE_WINDOW_DAYS = 30
+
+async def find_active_user_ids(region: Optional[str] = None) -> List[str]:
+    """
+    Users that logged oil in the last ACTIVE_WINDOW_DAYS days
+    Restricted to one region when given
+    """
+    db = get_database()
+    since = datetime.now() - timedelta(days=ACTIVE_WINDOW_DAYS)
+    
+    pipeline = [
+        {"$match": {"date": {"$gte": since}}},
+        {"$group": {"_id": "$userId"}}
+    ]
+    if region:
+        pipeline += [
+            {"$lookup": {
+                "from": "users",
+                "localField": "_id",
+                "foreignField": "userId",
+                "as": "user"
+            }},
+            {"$match": {"user.region": region}},
+            {"$project": {"_id": 1}}
+        ]
+    
+    cursor = db.oil_logs.aggregate(pipeline, allowDiskUse=True)
+    return [doc["_id"] async for doc in cursor]
+
+async def load_forecast_inputs(user_ids: List[str]) -> Tuple[Dict[str, List[Dict]], Dict[str, Dict]]:
+    """
+    Load profiles and the latest HISTORY_LOGS logs for a chunk of users in two queries
+    Returns: (user_logs, user_profiles)
+    """
+    db = get_database()
+    
+    users = await db.users.find(
+        {"userId": {"$in": user_ids}},
+        {"userId": 1, "familySize": 1, "age": 1}
+    ).to_list(length=None)
+    user_profiles = {
+        user["userId"]: {
+            "familySize": user.get("familySize", 1),
+            "age": user.get("age", 30)
+        }
+        for user in users
+    }
+    
+    pipeline = [
+        {"$match": {"userId": {"$in": user_ids}}},
+        # Latest HISTORY_LOGS per user, newest first, without collecting the rest of the history
+        {"$group": {
+            "_id": "$userId",
+            "logs": {"$topN": {
+                "n": HISTORY_LOGS,
+                "sortBy": {"date": -1},
+                "output": {"amount": "$amount", "date": "$date"}
+            }}
+        }}
+    ]
+    
+    user_logs = {}
+    async for doc in db.oil_logs.aggregate(pipeline, allowDiskUse=True):
+        user_logs[doc["_id"]] = [
+            {
+                "userId": doc["_id"],
+                "amount": log["amount"],
+                "date": log["date"].isoformat() if hasattr(log["date"], "isoformat") else log["date"]
+            }
+            for log in doc["logs"]
+        ]
+    
+    return user_logs, user_profiles
+
+async def save_forecasts(results: Dict[str, Tuple[List[Dict], float]], days_ahead: int):
+    """Upsert forecasts into consumption_forecasts with one unordered bulk write"""
+    if not results:
+        return
+    
+    db = get_database()
+    generated_at = datetime.now()
+    
+    operations = [
+        UpdateOne(
+            {"userId": user_id},
+            {"$set": {
+                "userId": user_id,
+                "predictions": predictions,
+                "confidence": round(confidence, 2),
+                "days_ahead": days_ahead,
+                "generated_at": generated_at
+            }},
+            upsert=True
+        )
+        for user_id, (predictions, confidence) in results.items()
+    ]
+    
+    await db.consumption_forecasts.bulk_write(operations, ordered=False)
+
+async def run_batch_forecast(ml_models: MLModels, user_ids: List[str], days_ahead: int = 30,
+                             persist: bool = True) -> Dict:
+    """
+    Forecast consumption for many users, FORECAST_BATCH_SIZE users at a time
+    Each chunk costs two reads, one model pass and (optionally) one bulk write
+    """
+    forecasted = 0
+    skipped = []
+    forecasts = {}
+    
+    for start in range(0, len(user_ids), FORECAST_BATCH_SIZE):
+        chunk = user_ids[start:start + FORECAST_BATCH_SIZE]
+        user_logs, user_profiles = await load_forecast_inputs(chunk)
+        
+        # Same eligibility rules as the single-user endpoint
+        eligible = {
+            user_id: logs
+            for user_id, logs in user_logs.items()
+            if user_id in user_profiles and len(logs) >= MIN_LOGS
+        }
+        skipped.extend(user_id for user_id in chunk if user_id not in eligible)
+        
+        results = await model_executor.run(ml_models.predict_consumption_batch, eligible, user_profiles, days_ahead)
+        forecasted += len(results)
+        
+        if persist:
+            await save_forecasts(results, days_ahead)
+        else:
+            forecasts.update({
+                user_id: {"predictions": predictions, "confidence": round(confidence, 2)}
+                for user_id, (predictions, confidence) in results.items()
+            })
+    
+    return {
+        "requested": len(user_ids),
+        "forecasted": forecasted,
+        "skipped": skipped,
+        "forecasts": None if persist else forecasts
+    }
+
+REFRESH_OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+async def acquire_refresh_lease() -> Optional[Dict]:
+    """Take or renew the forecast refresh lease in forecast_state; returns the state document when held"""
+    db = get_database()
+    now = datetime.now()
+    try:
+        return await db.forecast_state.find_one_and_update(
+            {"_id": "refresh", "$or": [{"owner": REFRESH_OWNER}, {"lease_expires": {"$lt": now}}]},
+            {"$set": {"owner": REFRESH_OWNER, "lease_expires": now + timedelta(seconds=FORECAST_LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        return None  # Held by another worker
+
+async def hold_refresh_lease():
+    """Renew the lease while a refresh runs (cancelled when it finishes)"""
+    while True:
+        await asyncio.sleep(FORECAST_LEASE_SECONDS / 3)
+        if await acquire_refresh_lease() is None:
+            print("⚠️  Forecast refresh lease lost")
+            return
+
+async def next_refresh_delay() -> float:
+    """Seconds until FORECAST_REFRESH_HOURS after the last completed refresh (0 if none ran yet)"""
+    db = get_database()
+    state = await db.forecast_state.find_one({"_id": "refresh"}, {"last_completed_at": 1})
+    if not state or state.get("last_completed_at") is None:
+        return 0.0
+    due = state["last_completed_at"] + timedelta(hours=FORECAST_REFRESH_HOURS)
+    return max((due - datetime.now()).total_seconds(), 0.0)
+
+async def forecast_refresh_loop(days_ahead: int = 30):
+    """
+    Background job refreshing stored forecasts of all active users
+    
+    Runs FORECAST_REFRESH_HOURS hours after the last completed refresh (recorded in
+    forecast_state), so restarts don't postpone it; disabled when set to 0. Workers compete
+    for a lease like the rollup updater, so one refresh runs at a time across the cluster.
+    """
+    if FORECAST_REFRESH_HOURS <= 0:
+        return
+    
+    db = get_database()
+    while True:
+        try:
+            delay = await next_refresh_delay()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue  # Another worker may have refreshed meanwhile
+            
+            if await acquire_refresh_lease() is None:
+                await asyncio.sleep(FORECAST_LEASE_SECONDS)
+                continue
+            
+            renewal = asyncio.create_task(hold_refresh_lease())
+            try:
+                user_ids = await find_active_user_ids()
+                summary = await run_batch_forecast(get_models(), user_ids, days_ahead)
+            finally:
+                renewal.cancel()
+            
+            now = datetime.now()
+            await db.forecast_state.update_one(
+                {"_id": "refresh", "owner": REFRESH_OWNER},
+                {"$set": {"last_completed_at": now, "lease_expires": now}}
+            )
+            print(f"✅ Forecasts refreshed for {summary['forecasted']} users ({len(summary['skipped'])} skipped)")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"❌ Forecast refresh failed: {e}")
+            await asyncio.sleep(FORECAST_LEASE_SECONDS)
@@ -0,0 +1,271 @@
+"""
+Insights Engine
+Computes a user's period summary in one MongoDB aggregation so only the summary crosses the wire
+
+Reads the daily rollups (app.rollups) by default, so cost grows with the days in the period
+rather than the number of logs. Raw oil_logs are scanned instead with INSIGHTS_FROM_ROLLUPS=false,
+and whenever no worker is applying the change stream to the rollups (see rollups_live).
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from app.database import get_database
+from app.hll import HyperLogLog
+from app.rollups import day_of, rollups_live
+
+INSIGHTS_FROM_ROLLUPS = os.getenv("INSIGHTS_FROM_ROLLUPS", "true").lower() == "true"
+
+async def use_rollups() -> bool:
+    """Whether rollups are enabled and currently kept up to date"""
+    return INSIGHTS_FROM_ROLLUPS and await rollups_live()
+
+def period_bounds(days: int, now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """[start, end) of the last `days` whole days, today included; both data sources cover exactly these"""
+    end_date = day_of(now or datetime.now()) + timedelta(days=1)
+    return end_date - timedelta(days=days), end_date
+
+def rewards_facet(user_id: str) -> List[Dict]:
+    """$facet branch fetching the user's rewards document via $lookup"""
+    return [
+        {"$limit": 1},
+        {"$lookup": {
+            "from": "rewards",
+            "pipeline": [
+                {"$match": {"userId": user_id}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "badges": 1, "currentStreak": 1}}
+            ],
+            "as": "rewards"
+        }},
+        {"$project": {"_id": 0, "rewards": 1}}
+    ]
+
+def build_user_insights_pipeline(user_id: str, start_date: datetime, end_date: datetime) -> List[Dict]:
+    """
+    $facet pipeline over a user's logs in [start_date, end_date)
+    totals: total, count and the average of each date-ordered half (for the trend)
+    peak_days: top 3 days by summed amount, earlier day first on ties
+    rewards: the user's rewards document via $lookup
+    """
+    return [
+        {"$match": {"userId": user_id, "date": {"$gte": start_date, "$lt": end_date}}},
+        {"$sort": {"date": 1}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": "$amount"},
+                    "count": {"$sum": 1},
+                    "amounts": {"$push": "$amount"}
+                }},
+                {"$addFields": {"mid": {"$toInt": {"$floor": {"$divide": ["$count", 2]}}}}},
+                {"$project": {
+                    "_id": 0,
+                    "total": 1,
+                    "count": 1,
+                    "first_half_avg": {"$avg": {"$slice": ["$amounts", "$mid"]}},
+                    "second_half_avg": {"$avg": {"$slice": ["$amounts", "$mid", "$count"]}}
+                }}
+            ],
+            "peak_days": [
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}},
+                    "total": {"$sum": "$amount"}
+                }},
+                {"$sort": {"total": -1, "_id": 1}},
+                {"$limit": 3}
+            ],
+            "rewards": rewards_facet(user_id)
+        }}
+    ]
+
+def build_user_rollup_insights_pipeline(user_id: str, start_date: datetime, end_date: datetime) -> List[Dict]:
+    """
+    Same $facet summary as build_user_insights_pipeline, over oil_log_daily
+    
+    start_date and end_date must be day boundaries (see period_bounds), so the days read
+    hold exactly the logs the raw pipeline would match. Halves split the date-ordered logs at count // 2
+    as before; the day holding the split point contributes its average amount per log to
+    each side, which is exact unless that day's logs differ in amount.
+    """
+    return [
+        {"$match": {"userId": user_id, "day": {"$gte": start_date, "$lt": end_date}}},
+        {"$sort": {"day": 1}},
+        {"$facet": {
+            "totals": [
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": "$total"},
+                    "count": {"$sum": "$count"},
+                    "days": {"$push": {"total": "$total", "count": "$count"}}
+                }},
+                {"$addFields": {"mid": {"$toInt": {"$floor": {"$divide": ["$count", 2]}}}}},
+                {"$addFields": {"split": {"$reduce": {
+                    "input": "$days",
+                    "initialValue": {"seen": 0, "sum": 0},
+                    "in": {
+                        "seen": {"$add": ["$$value.seen", "$$this.count"]},
+                        "sum": {"$add": ["$$value.sum", {"$multiply": [
+                            "$$this.total",
+                            {"$divide": [
+                                {"$min": [{"$max": [{"$subtract": ["$mid", "$$value.seen"]}, 0]}, "$$this.count"]},
+                                "$$this.count"
+                            ]}
+                        ]}]}
+                    }
+                }}}},
+                {"$project": {
+                    "_id": 0,
+                    "total": 1,
+                    "count": 1,
+                    "first_half_avg": {"$cond": [
+                        {"$gt": ["$mid", 0]}, {"$divide": ["$split.sum", "$mid"]}, None
+                    ]},
+                    "second_half_avg": {"$divide": [
+                        {"$subtract": ["$total", "$split.sum"]},
+                        {"$subtract": ["$count", "$mid"]}
+                    ]}
+                }}
+            ],
+            "peak_days": [
+                {"$sort": {"total": -1, "day": 1}},
+                {"$limit": 3},
+                {"$project": {"_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$day"}}, "total": 1}}
+            ],
+            "rewards": rewards_facet(user_id)
+        }}
+    ]
+
+async def fetch_user_insight_summary(user_id: str, start_date: datetime, end_date: datetime) -> Optional[Dict]:
+    """
+    Summary of a user's consumption in [start_date, end_date), or None when there are no logs
+    The bounds come from period_bounds so rollups and raw logs agree
+    Returns: {total, count, first_half_avg, second_half_avg, peak_days: [(day, total)], rewards}
+    """
+    db = get_database()
+    if await use_rollups():
+        cursor = db.oil_log_daily.aggregate(build_user_rollup_insights_pipeline(user_id, start_date, end_date))
+    else:
+        cursor = db.oil_logs.aggregate(build_user_insights_pipeline(user_id, start_date, end_date))
+    result = await cursor.to_list(length=1)
+    
+    if not result or not result[0]["totals"]:
+        return None
+    
+    facets = result[0]
+    totals = facets["totals"][0]
+    rewards = facets["rewards"][0]["rewards"] if facets["rewards"] else []
+    
+    return {
+        "total": totals["total"],
+        "count": totals["count"],
+        "first_half_avg": totals["first_half_avg"],
+        "second_half_avg": totals["second_half_avg"],
+        "peak_days": [(day["_id"], day["total"]) for day in facets["peak_days"]],
+        "rewards": rewards[0] if rewards else None
+    }
+
+async def fetch_national_summary(start_date: datetime) -> Optional[Dict]:
+    """
+    National totals and per-region breakdown of logs since start_date, or None when there are none
+    Returns: {total, count, regions: [{region, total, users}]} with regions by total, largest first
+    """
+    db = get_database()
+    
+    if await use_rollups():
+        # Region totals from region_daily; distinct users counted from user_activity,
+        # one document per user, so memory is bounded by the number of regions
+        start_day = day_of(start_date)
+        region_totals, active_users = await asyncio.gather(
+            db.region_daily.aggregate([
+                {"$match": {"day": {"$gte": start_day}}},
+                {"$group": {"_id": "$region", "total": {"$sum": "$total"}, "count": {"$sum": "$count"}}}
+            ]).to_list(length=None),
+            db.user_activity.aggregate([
+                {"$match": {"last_day": {"$gte": start_day}}},
+                {"$group": {"_id": "$region", "users": {"$sum": 1}}}
+            ]).to_list(length=None)
+        )
+        users_by_region = {region["_id"]: region["users"] for region in active_users}
+        regions = [
+            {"_id": region["_id"], "total": region["total"], "users": users_by_region.get(region["_id"], 0)}
+            for region in region_totals
+            if region["count"] > 0
+        ]
+        totals = [{
+            "total": sum(region["total"] for region in region_totals),
+            "count": sum(region["count"] for region in region_totals)
+        }]
+    else:
+        totals = await db.oil_logs.aggregate([
+            {"$match": {"date": {"$gte": start_date}}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ]).to_list(length=1)
+        regions = await db.oil_logs.aggregate([
+            {"$match": {"date": {"$gte": start_date}}},
+            {"$lookup": {
+                "from": "users",
+                "localField": "userId",
+                "foreignField": "userId",
+                "as": "user"
+            }},
+            {"$unwind": "$user"},
+            {"$group": {
+                "_id": "$user.region",
+                "total": {"$sum": "$amount"},
+                "user_ids": {"$addToSet": "$userId"}
+            }},
+            {"$project": {"total": 1, "users": {"$size": "$user_ids"}}}
+        ]).to_list(length=None)
+    
+    if not totals or not totals[0]["count"]:
+        return None
+    
+    regions.sort(key=lambda region: region["total"], reverse=True)
+    
+    return {
+        "total": totals[0]["total"],
+        "count": totals[0]["count"],
+        "regions": [
+            {"region": region["_id"], "total": region["total"], "users": region["users"]}
+            for region in regions
+        ]
+    }
+
+async def fetch_region_active_users(start_date: datetime, end_date: datetime) -> List[Dict]:
+    """
+    Approximate distinct users per region who logged oil in [start_date, end_date] (whole days)
+    Unions the per-day HyperLogLog sketches in region_daily; see app.hll for the error bound.
+    Without live rollups, counts exactly from raw oil_logs.
+    Returns: [{region, active_users}] by active users, largest first
+    """
+    db = get_database()
+    
+    if not await use_rollups():
+        return await db.oil_logs.aggregate([
+            {"$match": {"date": {"$gte": day_of(start_date), "$lt": day_of(end_date) + timedelta(days=1)}}},
+            {"$group": {"_id": "$userId"}},
+            {"$lookup": {
+                "from": "users",
+                "localField": "_id",
+                "foreignField": "userId",
+                "as": "user"
+            }},
+            {"$group": {"_id": {"$ifNull": [{"$first": "$user.region"}, None]}, "active_users": {"$sum": 1}}},
+            {"$project": {"_id": 0, "region": "$_id", "active_users": 1}},
+            {"$sort": {"active_users": -1}}
+        ], allowDiskUse=True).to_list(length=None)
+    
+    sketches: Dict[Optional[str], HyperLogLog] = {}
+    async for row in db.region_daily.find(
+        {"day": {"$gte": day_of(start_date), "$lte": day_of(end_date)}},
+        {"_id": 0, "region": 1, "hll": 1}
+    ):
+        sketches.setdefault(row["region"], HyperLogLog()).merge(HyperLogLog(row.get("hll")))
+    
+    counts = [{"region": region, "active_users": sketch.count()} for region, sketch in sketches.items()]
+    counts.sort(key=lambda region: region["active_users"], reverse=True)
+    return counts
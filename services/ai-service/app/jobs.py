@@ -0,0 +1,220 @@
+"""
+Training Jobs
+Background training runs with phase progress, cancellation and a cluster-wide single-run lock
+
+training_jobs: {_id, kind, mode, status, phase, progress, active, cancel_requested,
+                owner, heartbeat, created_at, started_at, finished_at, result, error}
+"""
+
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pymongo import DESCENDING
+from pymongo.errors import DuplicateKeyError
+
+from app.database import get_database
+from app.training import run_training, run_collaborative_training, InsufficientDataError
+
+INCREMENTAL_TRAIN_MINUTES = float(os.getenv("INCREMENTAL_TRAIN_MINUTES", 0))
+TRAINING_JOB_HEARTBEAT_SECONDS = float(os.getenv("TRAINING_JOB_HEARTBEAT_SECONDS", 10))
+TRAINING_JOB_STALE_SECONDS = TRAINING_JOB_HEARTBEAT_SECONDS * 6
+
+ACTIVE_STATUSES = ["queued", "running"]
+
+class JobConflictError(RuntimeError):
+    """Another training job is already active"""
+    
+    def __init__(self, job_id: str):
+        super().__init__(f"Training job {job_id} is already running")
+        self.job_id = job_id
+
+class JobCancelledError(Exception):
+    """The job was cancelled while running"""
+
+def job_view(job: Dict) -> Dict:
+    """API representation of a job document"""
+    view = {key: value for key, value in job.items() if key not in ("_id", "active")}
+    view["id"] = job["_id"]
+    return view
+
+class TrainingJob:
+    """Progress reporter handed to the training functions for one running job"""
+    
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+    
+    async def report(self, phase: str, **progress):
+        """Record the current phase and counters; raises JobCancelledError once cancel is requested"""
+        db = get_database()
+        job = await db.training_jobs.find_one_and_update(
+            {"_id": self.job_id},
+            {"$set": {"phase": phase, "progress": progress, "heartbeat": datetime.now()}},
+            projection={"cancel_requested": 1}
+        )
+        if job is not None and job.get("cancel_requested"):
+            raise JobCancelledError()
+
+class TrainingJobs:
+    """
+    Starts training as a background task and tracks it in training_jobs
+    
+    At most one job (consumption or collaborative, since both publish a new model
+    version) is active across all workers: active jobs carry active=true under a partial
+    unique index. The running worker refreshes a heartbeat every
+    TRAINING_JOB_HEARTBEAT_SECONDS; an active job whose heartbeat is older than
+    TRAINING_JOB_STALE_SECONDS (its worker died) is marked failed and no longer blocks.
+    
+    Cancelling a job on the worker running it stops it at once; on other workers the
+    request is stored and the job stops at its next progress report.
+    """
+    
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.tasks: Dict[str, asyncio.Task] = {}
+    
+    async def start(self, kind: str, mode: Optional[str] = None) -> Dict:
+        """Register a job and run it in the background; raises JobConflictError if one is active"""
+        db = get_database()
+        now = datetime.now()
+        job = {
+            "_id": uuid.uuid4().hex,
+            "kind": kind,
+            "mode": mode,
+            "status": "queued",
+            "phase": None,
+            "progress": {},
+            "active": True,
+            "cancel_requested": False,
+            "owner": self.owner,
+            "heartbeat": now,
+            "created_at": now,
+            "started_at": None,
+            "finished_at": None,
+            "result": None,
+            "error": None
+        }
+        
+        try:
+            await db.training_jobs.insert_one(job)
+        except DuplicateKeyError:
+            active = await db.training_jobs.find_one({"active": True})
+            if active is not None and active["heartbeat"] >= now - timedelta(seconds=TRAINING_JOB_STALE_SECONDS):
+                raise JobConflictError(active["_id"])
+            if active is not None:
+                await self._finish(active["_id"], "failed", error="Worker stopped responding")
+            try:
+                await db.training_jobs.insert_one(job)
+            except DuplicateKeyError:
+                # Another worker started a job in between
+                active = await db.training_jobs.find_one({"active": True}, {"_id": 1})
+                raise JobConflictError(active["_id"] if active else "unknown")
+        
+        self.tasks[job["_id"]] = asyncio.create_task(self._run(job["_id"], kind, mode))
+        return job_view(job)
+    
+    async def _finish(self, job_id: str, status: str, result: Optional[Dict] = None, error: Optional[str] = None):
+        db = get_database()
+        await db.training_jobs.update_one(
+            {"_id": job_id, "active": True},
+            {
+                "$set": {"status": status, "finished_at": datetime.now(), "result": result, "error": error},
+                "$unset": {"active": ""}
+            }
+        )
+    
+    async def _heartbeat(self, job_id: str):
+        db = get_database()
+        while True:
+            await asyncio.sleep(TRAINING_JOB_HEARTBEAT_SECONDS)
+            await db.training_jobs.update_one({"_id": job_id}, {"$set": {"heartbeat": datetime.now()}})
+    
+    async def _run(self, job_id: str, kind: str, mode: Optional[str]):
+        db = get_database()
+        job = TrainingJob(job_id)
+        heartbeat = asyncio.create_task(self._heartbeat(job_id))
+        
+        try:
+            await db.training_jobs.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "running", "started_at": datetime.now()}}
+            )
+            if kind == "collaborative":
+                result = await run_collaborative_training(job)
+            else:
+                result = await run_training(mode or "full", job)
+            
+            await self._finish(job_id, "skipped" if result.get("status") == "skipped" else "succeeded", result=result)
+            print(f"✅ Training job {job_id} ({kind}) finished: {result.get('model_version')}")
+        except (JobCancelledError, asyncio.CancelledError):
+            await asyncio.shield(self._finish(job_id, "cancelled"))
+            print(f"⚠️  Training job {job_id} ({kind}) cancelled")
+        except InsufficientDataError as e:
+            await self._finish(job_id, "failed", error=str(e))
+        except Exception as e:
+            await self._finish(job_id, "failed", error=f"Training failed: {str(e)}")
+            print(f"❌ Training job {job_id} ({kind}) failed: {e}")
+        finally:
+            heartbeat.cancel()
+            self.tasks.pop(job_id, None)
+    
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Current state of a job"""
+        db = get_database()
+        job = await db.training_jobs.find_one({"_id": job_id})
+        return job_view(job) if job else None
+    
+    async def recent(self, limit: int = 20) -> List[Dict]:
+        """Most recently created jobs, newest first"""
+        db = get_database()
+        jobs = await db.training_jobs.find().sort("created_at", DESCENDING).limit(limit).to_list(length=limit)
+        return [job_view(job) for job in jobs]
+    
+    async def cancel(self, job_id: str) -> Optional[Dict]:
+        """Request cancellation of an active job; returns its state, or None if it doesn't exist"""
+        db = get_database()
+        await db.training_jobs.update_one(
+            {"_id": job_id, "status": {"$in": ACTIVE_STATUSES}},
+            {"$set": {"cancel_requested": True}}
+        )
+        task = self.tasks.get(job_id)
+        if task is not None:
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        else:
+            # Nobody will see the request if the worker running the job has died
+            stale = datetime.now() - timedelta(seconds=TRAINING_JOB_STALE_SECONDS)
+            job = await db.training_jobs.find_one({"_id": job_id, "active": True, "heartbeat": {"$lt": stale}})
+            if job is not None:
+                await self._finish(job_id, "cancelled")
+        return await self.get(job_id)
+    
+    async def shutdown(self):
+        """Cancel jobs running in this worker, recording them as cancelled"""
+        tasks = list(self.tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+training_jobs = TrainingJobs()
+
+async def incremental_training_loop():
+    """
+    Background job folding new oil logs into the model
+    Runs every INCREMENTAL_TRAIN_MINUTES minutes as a training job; disabled when set to 0
+    """
+    if INCREMENTAL_TRAIN_MINUTES <= 0:
+        return
+    
+    while True:
+        await asyncio.sleep(INCREMENTAL_TRAIN_MINUTES * 60)
+        try:
+            job = await training_jobs.start("consumption", "incremental")
+            print(f"✅ Incremental training job {job['id']} started")
+        except JobConflictError as e:
+            print(f"⚠️  Incremental training skipped: {e}")
+        except Exception as e:
+            print(f"❌ Incremental training failed to start: {e}")
@@ -0,0 +1,70 @@
+"""
+Oil Log Change Events
+Single change stream per collection (oil_logs, oil_log_daily) fanned out to in-process subscribers
+(feature store, result caches)
+"""
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from app.database import get_database
+
+OIL_LOG_WATCH = os.getenv("OIL_LOG_WATCH", "true").lower() == "true"
+
+ChangeHandler = Callable[[Dict], Awaitable[None]]
+
+class OilLogEvents:
+    """
+    Dispatches insert/update/replace/delete events on one collection to subscribers
+    
+    Change streams need a replica set; on a standalone MongoDB watch() logs a warning and
+    returns, and subscribers fall back to time-based expiry (see the watching flag).
+    """
+    
+    def __init__(self, collection: str = "oil_logs"):
+        self.collection = collection
+        self.handlers: List[ChangeHandler] = []
+        self.watching = False
+        self.started_at: Optional[datetime] = None
+    
+    def subscribe(self, handler: ChangeHandler):
+        """Register an async handler called with every change event"""
+        self.handlers.append(handler)
+    
+    async def watch(self):
+        """Background task reading the change stream"""
+        if not OIL_LOG_WATCH:
+            return
+        
+        db = get_database()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        
+        try:
+            async with db[self.collection].watch(pipeline, full_document="updateLookup") as stream:
+                self.started_at = datetime.now()
+                self.watching = True
+                print(f"✅ Watching {self.collection} changes")
+                async for change in stream:
+                    for handler in self.handlers:
+                        try:
+                            await handler(change)
+                        except Exception as e:
+                            print(f"❌ Error handling oil log change: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  {self.collection} change stream unavailable, caches fall back to expiry: {e}")
+        finally:
+            self.watching = False
+
+def changed_user_id(change: Dict) -> Optional[str]:
+    """User affected by a change event; None for deletes, which only carry the document _id"""
+    document = change.get("fullDocument")
+    return document["userId"] if document else None
+
+log_events = OilLogEvents()
+# Rollup writes land after the oil_logs event (see app.rollups); caches of rollup-derived results
+# are invalidated from here too
+rollup_events = OilLogEvents("oil_log_daily")
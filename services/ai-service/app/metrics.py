@@ -0,0 +1,179 @@
+"""
+Metrics
+Latency histograms, counters and gauges rendered in the Prometheus text format
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; stages of a request range from sub-millisecond cache hits to multi-second model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Monotonic count per label combination"""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, description: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values]
+
+class Histogram:
+    """Distribution of observed values per label combination, over fixed cumulative buckets"""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, description: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+    
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(key, list(counts), total, count) for key, (counts, total, count) in self._series.items()]
+        
+        lines = []
+        names = self.labels + ("le",)
+        for key, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(names, key + (_format_value(bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+class Collected:
+    """
+    Counter or gauge read from a component's own stats at scrape time
+    collect() returns (label values, value) pairs
+    """
+    
+    def __init__(self, name: str, description: str, kind: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]):
+        self.name = name
+        self.description = description
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.collect = collect
+    
+    def render(self) -> List[str]:
+        try:
+            samples = list(self.collect())
+        except Exception as e:
+            print(f"⚠️  Metric {self.name} unavailable: {e}")
+            return []
+        return [f"{self.name}{_format_labels(self.labels, tuple(key))} {_format_value(value)}" for key, value in samples]
+
+class MetricsRegistry:
+    """Metrics of this process, rendered together for GET /metrics"""
+    
+    def __init__(self):
+        self._metrics: List = []
+    
+    def counter(self, name: str, description: str, labels: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, description, labels)
+        self._metrics.append(metric)
+        return metric
+    
+    def histogram(self, name: str, description: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, description, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+    
+    def collected(self, name: str, description: str, kind: str, labels: Sequence[str],
+                  collect: Callable[[], Iterable[Tuple[Sequence[str], float]]]) -> Collected:
+        metric = Collected(name, description, kind, labels, collect)
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        """Prometheus text exposition format, version 0.0.4"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+request_seconds = metrics.histogram(
+    "ai_http_request_duration_seconds",
+    "Request latency including response serialization, by route template",
+    ("method", "route", "status")
+)
+stage_seconds = metrics.histogram(
+    "ai_stage_duration_seconds",
+    "Time spent in each stage of a request (db_fetch, features, predict, response)",
+    ("endpoint", "stage")
+)
+cache_lookups = metrics.counter(
+    "ai_cache_lookups_total",
+    "Result cache lookups by endpoint and outcome",
+    ("endpoint", "result")
+)
+
+@contextmanager
+def span(endpoint: str, stage: str):
+    """Time one stage of a request into ai_stage_duration_seconds"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, endpoint, stage)
+
+def record_cache_lookup(endpoint: str, hit: bool):
+    """Count a result cache hit or miss"""
+    if METRICS_ENABLED:
+        cache_lookups.inc(endpoint, "hit" if hit else "miss")
@@ -0,0 +1,20 @@
+"""
+Database Migration
+Creates the AI service's MongoDB indexes as a deploy step: python -m app.migrate
+"""
+
+import asyncio
+from dotenv import load_dotenv
+
+from app.database import connect_db, ensure_indexes, close_db
+
+async def migrate():
+    await connect_db()
+    try:
+        await ensure_indexes()
+    finally:
+        await close_db()
+
+if __name__ == "__main__":
+    load_dotenv()
+    asyncio.run(migrate())
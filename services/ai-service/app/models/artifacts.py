@@ -0,0 +1,113 @@
+"""
+Model Artifacts
+Pickle-free model files: raw .npy arrays plus a JSON manifest, memory-mapped read-only on load
+"""
+
+import json
+import os
+import re
+import uuid
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+MANIFEST_FILE = "manifest.json"
+ARTIFACT_FORMAT = 1
+ARRAY_FILE_PATTERN = re.compile(r"^.+\.[0-9a-f]{12}\.npy$")
+
+def _fsync_directory(path: str):
+    """Persist renames in a directory (no-op where directories can't be opened)"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def has_artifacts(path: str) -> bool:
+    """Whether a model directory holds a committed manifest"""
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+def save_artifacts(path: str, arrays: Dict[str, np.ndarray], metadata: Dict):
+    """
+    Write arrays and JSON metadata as one atomic save
+    
+    Each save writes its arrays under fresh file names (name.<generation>.npy), then
+    replaces the manifest that points at them. A crash before the rename leaves the
+    previous manifest and its files intact; files of older generations are removed
+    afterwards. Readers that already mapped them keep working on POSIX systems.
+    """
+    os.makedirs(path, exist_ok=True)
+    generation = uuid.uuid4().hex[:12]
+    entries = {}
+    
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype == object:
+            raise TypeError(f"array {name} has object dtype and would need pickle")
+        file_name = f"{name}.{generation}.npy"
+        with open(os.path.join(path, file_name), "wb") as f:
+            np.save(f, np.ascontiguousarray(array), allow_pickle=False)
+            f.flush()
+            os.fsync(f.fileno())
+        entries[name] = {"file": file_name, "dtype": array.dtype.str, "shape": list(array.shape)}
+    
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "generation": generation,
+        "saved_at": datetime.now().isoformat(),
+        "arrays": entries,
+        "metadata": metadata
+    }
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, manifest_path)
+    _fsync_directory(path)
+    
+    # Arrays of earlier saves are no longer referenced
+    current = {entry["file"] for entry in entries.values()}
+    for file_name in os.listdir(path):
+        if ARRAY_FILE_PATTERN.match(file_name) and file_name not in current:
+            try:
+                os.remove(os.path.join(path, file_name))
+            except OSError:
+                pass
+
+def load_artifacts(path: str, mmap: bool = True) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+    """
+    (arrays, metadata) of the committed save in path, or None if there is none
+    Arrays are memory-mapped read-only, so workers share the page cache instead of copies
+    """
+    manifest_path = os.path.join(path, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"unsupported model artifact format {manifest.get('format')}")
+    
+    arrays = {}
+    for name, entry in manifest["arrays"].items():
+        # Empty arrays can't be mapped
+        mmap_mode = "r" if mmap and int(np.prod(entry["shape"])) > 0 else None
+        arrays[name] = np.load(os.path.join(path, entry["file"]), mmap_mode=mmap_mode, allow_pickle=False)
+    return arrays, manifest["metadata"]
+
+def section(arrays: Dict[str, np.ndarray], prefix: str) -> Dict[str, np.ndarray]:
+    """Arrays stored under "<prefix>.", keyed without the prefix"""
+    start = f"{prefix}."
+    return {name[len(start):]: array for name, array in arrays.items() if name.startswith(start)}
+
+def prefixed(prefix: str, arrays: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Arrays keyed as "<prefix>.<name>" for save_artifacts"""
+    return {f"{prefix}.{name}": array for name, array in arrays.items()}
@@ -0,0 +1,207 @@
+"""
+Collaborative Filtering
+Implicit-feedback matrix factorization (ALS) with an inverted-file ANN index over recipe vectors
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.models.recipe_features import RecipeFeatures, top_k_indices
+from app.startup import lazy_module
+
+pd = lazy_module("pandas")
+cluster = lazy_module("sklearn.cluster")
+
+CF_FACTORS = 32
+CF_REGULARIZATION = 0.1
+CF_ALPHA = 20.0  # Confidence per unit of interaction weight
+CF_ITERATIONS = 10
+ANN_PROBES = 8
+
+def _group_rows(rows: np.ndarray, cols: np.ndarray, values: np.ndarray,
+                n_rows: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """CSR-style (indptr, cols, values) of (row, col, value) triples"""
+    order = np.argsort(rows, kind="stable")
+    indptr = np.searchsorted(rows[order], np.arange(n_rows + 1))
+    return indptr, cols[order], values[order]
+
+def _solve_side(Y: np.ndarray, grouped: Tuple[np.ndarray, np.ndarray, np.ndarray], reg: float) -> np.ndarray:
+    """One ALS half-step: least-squares factors for every row given the other side's factors"""
+    indptr, cols, confidence = grouped
+    n_factors = Y.shape[1]
+    YtY = Y.T @ Y
+    reg_eye = reg * np.eye(n_factors)
+    X = np.zeros((len(indptr) - 1, n_factors))
+    
+    for row in range(len(indptr) - 1):
+        start, end = indptr[row], indptr[row + 1]
+        if start == end:
+            continue
+        Y_row = Y[cols[start:end]]
+        c = confidence[start:end]
+        # (YtY + Yt (C - I) Y + reg I) x = Yt C p, with p = 1 on observed items
+        A = YtY + (Y_row.T * (c - 1)) @ Y_row + reg_eye
+        X[row] = np.linalg.solve(A, Y_row.T @ c)
+    
+    return X
+
+def fit_implicit_als(user_rows: np.ndarray, item_rows: np.ndarray, weights: np.ndarray,
+                     n_users: int, n_items: int, factors: int = CF_FACTORS, reg: float = CF_REGULARIZATION,
+                     alpha: float = CF_ALPHA, iterations: int = CF_ITERATIONS,
+                     seed: int = 42) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Implicit ALS (Hu, Koren & Volinsky 2008) on aggregated interactions
+    Cost per iteration is O(interactions * factors^2 + (users + items) * factors^3)
+    """
+    rng = np.random.default_rng(seed)
+    user_factors = rng.normal(0, 0.01, (n_users, factors))
+    item_factors = rng.normal(0, 0.01, (n_items, factors))
+    confidence = 1.0 + alpha * weights
+    
+    by_user = _group_rows(user_rows, item_rows, confidence, n_users)
+    by_item = _group_rows(item_rows, user_rows, confidence, n_items)
+    
+    for _ in range(iterations):
+        user_factors = _solve_side(item_factors, by_user, reg)
+        item_factors = _solve_side(user_factors, by_item, reg)
+    
+    return user_factors, item_factors
+
+class IVFIndex:
+    """
+    Inverted-file index for maximum inner product search
+    
+    Vectors are clustered into ~sqrt(n) cells; a query scores the centroids, then only
+    the vectors of the best ANN_PROBES cells (more if filters leave fewer than k), so
+    retrieval cost is about sqrt(n) + probes * sqrt(n) dot products instead of n.
+    """
+    
+    def __init__(self, vectors: np.ndarray, seed: int = 42):
+        self.vectors = vectors
+        n_lists = max(1, int(np.sqrt(len(vectors))))
+        
+        if n_lists > 1:
+            kmeans = cluster.MiniBatchKMeans(n_clusters=n_lists, random_state=seed, n_init=3)
+            assignments = kmeans.fit_predict(vectors)
+            self.centroids = kmeans.cluster_centers_
+        else:
+            assignments = np.zeros(len(vectors), dtype=np.int64)
+            self.centroids = vectors.mean(axis=0, keepdims=True)
+        
+        self.list_indptr, self.list_members, _ = _group_rows(
+            assignments, np.arange(len(vectors)), np.zeros(len(vectors)), len(self.centroids)
+        )
+    
+    @classmethod
+    def from_arrays(cls, vectors: np.ndarray, centroids: np.ndarray,
+                    list_indptr: np.ndarray, list_members: np.ndarray) -> "IVFIndex":
+        """Index from saved cells, without re-clustering"""
+        index = cls.__new__(cls)
+        index.vectors = vectors
+        index.centroids = centroids
+        index.list_indptr = list_indptr
+        index.list_members = list_members
+        return index
+    
+    def search(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None,
+               probes: int = ANN_PROBES) -> Tuple[np.ndarray, np.ndarray]:
+        """(rows, scores) of the approximate top-k vectors by inner product, restricted to allowed rows"""
+        cells = np.argsort(-(self.centroids @ query))
+        candidates = []
+        found = 0
+        
+        for probed, cell in enumerate(cells, start=1):
+            members = self.list_members[self.list_indptr[cell]:self.list_indptr[cell + 1]]
+            if allowed is not None:
+                members = members[allowed[members]]
+            candidates.append(members)
+            found += len(members)
+            if probed >= probes and found >= k:
+                break
+        
+        rows = np.concatenate(candidates) if candidates else np.empty(0, dtype=np.int64)
+        scores = self.vectors[rows] @ query
+        top = top_k_indices(scores, k)
+        return rows[top], scores[top]
+
+class CollaborativeModel:
+    """User and recipe embeddings learned from interactions, served through an IVF index"""
+    
+    def __init__(self, user_ids: List[str], recipe_ids: List[str],
+                 user_factors: np.ndarray, recipe_factors: np.ndarray, stats: Dict,
+                 index: Optional[IVFIndex] = None):
+        self.user_index = {user_id: row for row, user_id in enumerate(user_ids)}
+        self.recipe_ids = recipe_ids
+        self.recipe_index = {recipe_id: row for row, recipe_id in enumerate(recipe_ids)}
+        self.user_factors = user_factors
+        self.recipe_factors = recipe_factors
+        self.index = index if index is not None else IVFIndex(recipe_factors)
+        self.stats = stats
+        self.trained_at = datetime.now()
+        self._aligned: Optional[Tuple[RecipeFeatures, np.ndarray]] = None
+    
+    @classmethod
+    def train(cls, user_ids: List[str], recipe_ids: List[str], weights: np.ndarray) -> "CollaborativeModel":
+        """Fit embeddings from aggregated (user, recipe, weight) interactions and build the index"""
+        user_rows, users = pd.factorize(pd.Series(user_ids))
+        recipe_rows, recipes = pd.factorize(pd.Series(recipe_ids))
+        user_factors, recipe_factors = fit_implicit_als(
+            user_rows, recipe_rows, np.asarray(weights, dtype=float), len(users), len(recipes)
+        )
+        stats = {"users": len(users), "recipes": len(recipes), "interactions": len(weights)}
+        return cls(list(users), list(recipes), user_factors, recipe_factors, stats)
+    
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """(arrays, metadata) for app.models.artifacts, including the IVF cells"""
+        arrays = {
+            "user_ids": np.array(list(self.user_index), dtype=str),
+            "recipe_ids": np.array(self.recipe_ids, dtype=str),
+            "user_factors": self.user_factors,
+            "recipe_factors": self.recipe_factors,
+            "centroids": self.index.centroids,
+            "list_indptr": self.index.list_indptr,
+            "list_members": self.index.list_members
+        }
+        return arrays, {"stats": self.stats, "trained_at": self.trained_at.isoformat()}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], metadata: Dict) -> "CollaborativeModel":
+        """Rebuild a model saved with to_arrays; factors stay memory-mapped"""
+        index = IVFIndex.from_arrays(arrays["recipe_factors"], arrays["centroids"],
+                                     arrays["list_indptr"], arrays["list_members"])
+        model = cls(arrays["user_ids"].tolist(), arrays["recipe_ids"].tolist(),
+                    arrays["user_factors"], arrays["recipe_factors"], metadata["stats"], index)
+        model.trained_at = datetime.fromisoformat(metadata["trained_at"])
+        return model
+    
+    def has_user(self, user_id: str) -> bool:
+        """Whether the user had interactions when the model was trained"""
+        return user_id in self.user_index
+    
+    def _feature_row_map(self, features: RecipeFeatures) -> np.ndarray:
+        """Model row of each feature matrix row (-1 if unknown), cached per matrix"""
+        if self._aligned is None or self._aligned[0] is not features:
+            mapping = np.fromiter((self.recipe_index.get(recipe_id, -1) for recipe_id in features.ids),
+                                  dtype=np.int64, count=len(features))
+            self._aligned = (features, mapping)
+        return self._aligned[1]
+    
+    def recommend(self, user_id: str, features: RecipeFeatures, rows: np.ndarray,
+                  limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top recipes for a known user among the given feature matrix rows
+        Returns: [(recipe id, score)], best first; recipes newer than the model are not candidates
+        """
+        model_rows = self._feature_row_map(features)[rows]
+        allowed = np.zeros(len(self.recipe_ids), dtype=bool)
+        allowed[model_rows[model_rows >= 0]] = True
+        
+        found, scores = self.index.search(self.user_factors[self.user_index[user_id]], limit, allowed)
+        return [(self.recipe_ids[row], float(score)) for row, score in zip(found, scores)]
+    
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        state["_aligned"] = None
+        return state
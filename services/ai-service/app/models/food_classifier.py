@@ -0,0 +1,180 @@
+"""
+Food Image Classifier
+CPU-only ONNX dish classifier with micro-batched inference and a dish -> oil/calorie table
+"""
+
+import asyncio
+import io
+import json
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.batching import MicroBatcher
+
+FOOD_MODEL_PATH = os.getenv(
+    "FOOD_MODEL_PATH", os.path.join(os.getenv("MODEL_PATH", "./models"), "food_classifier.onnx")
+)
+FOOD_LABELS_PATH = os.getenv("FOOD_LABELS_PATH", os.path.splitext(FOOD_MODEL_PATH)[0] + ".labels.json")
+FOOD_MODEL_THREADS = int(os.getenv("FOOD_MODEL_THREADS", 2))
+FOOD_BATCH_SIZE = int(os.getenv("FOOD_BATCH_SIZE", 16))
+FOOD_BATCH_WAIT_MS = float(os.getenv("FOOD_BATCH_WAIT_MS", 10))
+FOOD_MAX_MEGAPIXELS = float(os.getenv("FOOD_MAX_MEGAPIXELS", 50))
+# PNG and WebP have no reduced-scale decode, so 16MP already takes ~50MB as RGB
+FOOD_MAX_NON_JPEG_MEGAPIXELS = float(os.getenv("FOOD_MAX_NON_JPEG_MEGAPIXELS", 16))
+
+DEFAULT_INPUT_SIZE = 224
+CROP_RATIO = 0.875  # Resize the short side to size / 0.875, then center crop
+IMAGENET_MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+IMAGENET_STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+DRAFT_FORMATS = {"JPEG", "MPO"}  # Formats Image.draft can decode at a reduced scale
+
+# Typical home-cooked serving; labels files can override or add dishes
+DISH_NUTRITION = {
+    "Paneer Butter Masala": {"oil_ml": 30, "calories": 450, "health_score": 65},
+    "Aloo Paratha": {"oil_ml": 15, "calories": 320, "health_score": 70},
+    "Samosa": {"oil_ml": 25, "calories": 280, "health_score": 40},
+    "Vegetable Salad": {"oil_ml": 5, "calories": 150, "health_score": 95},
+    "Chicken Curry": {"oil_ml": 35, "calories": 500, "health_score": 60},
+    "Dal Tadka": {"oil_ml": 10, "calories": 220, "health_score": 85},
+    "Chole Bhature": {"oil_ml": 40, "calories": 650, "health_score": 35},
+    "Masala Dosa": {"oil_ml": 15, "calories": 380, "health_score": 70},
+    "Idli Sambar": {"oil_ml": 5, "calories": 250, "health_score": 90},
+    "Poha": {"oil_ml": 10, "calories": 250, "health_score": 80},
+    "Pakora": {"oil_ml": 30, "calories": 320, "health_score": 35},
+    "Biryani": {"oil_ml": 25, "calories": 550, "health_score": 55},
+    "Roti with Sabzi": {"oil_ml": 10, "calories": 300, "health_score": 85},
+    "Jalebi": {"oil_ml": 35, "calories": 450, "health_score": 20}
+}
+UNKNOWN_NUTRITION = {"oil_ml": None, "calories": None, "health_score": None}
+
+def load_labels(path: str) -> List[Dict]:
+    """
+    Dish entries in model output order
+    The file is a JSON list of dish names or {"name", "oil_ml", "calories", "health_score"} objects
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    
+    dishes = []
+    for entry in raw:
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        dish = {**UNKNOWN_NUTRITION, **DISH_NUTRITION.get(entry["name"], {}), **entry}
+        dishes.append(dish)
+    return dishes
+
+def preprocess(data: bytes, size: int) -> np.ndarray:
+    """
+    Decode an image and return a normalized 3 x size x size float32 array
+    JPEGs are decoded at the smallest DCT scale (1/2, 1/4 or 1/8) that still covers the
+    crop, so a 12MP photo is never held at full resolution; other formats decode at full
+    size and are held to the lower FOOD_MAX_NON_JPEG_MEGAPIXELS
+    """
+    from PIL import Image, ImageOps
+    
+    short_side = round(size / CROP_RATIO)
+    
+    # Only the header has been read so far
+    image = Image.open(io.BytesIO(data))
+    max_megapixels = FOOD_MAX_MEGAPIXELS if image.format in DRAFT_FORMATS else FOOD_MAX_NON_JPEG_MEGAPIXELS
+    if image.width * image.height > max_megapixels * 1_000_000:
+        raise ValueError(f"{image.format} image is {image.width}x{image.height}, over {max_megapixels:g} megapixels")
+    image.draft("RGB", (short_side, short_side))
+    image = ImageOps.exif_transpose(image).convert("RGB")
+    
+    scale = short_side / min(image.size)
+    image = image.resize((max(size, round(image.width * scale)), max(size, round(image.height * scale))),
+                         Image.BILINEAR, reducing_gap=2.0)
+    left, top = (image.width - size) // 2, (image.height - size) // 2
+    image = image.crop((left, top, left + size, top + size))
+    
+    array = (np.asarray(image, dtype=np.float32) / 255.0 - IMAGENET_MEAN) / IMAGENET_STD
+    return array.transpose(2, 0, 1)
+
+def to_probabilities(outputs: np.ndarray) -> np.ndarray:
+    """Softmax over classes, unless the model already outputs probabilities"""
+    if outputs.min() >= 0 and np.allclose(outputs.sum(axis=1), 1.0, atol=1e-3):
+        return outputs
+    shifted = np.exp(outputs - outputs.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+class FoodClassifier:
+    """
+    Dish classifier loaded once per process from FOOD_MODEL_PATH (an ONNX model, ideally
+    int8-quantized, with an N x 3 x H x W input and one output per label)
+    
+    Images are decoded and resized in a worker thread, then queued; the micro-batcher
+    stacks up to FOOD_BATCH_SIZE queued images into one forward pass, waiting at most
+    FOOD_BATCH_WAIT_MS for a batch to fill. Without a model (or onnxruntime) the
+    classifier stays unloaded and recognition reports itself unavailable.
+    """
+    
+    def __init__(self, model_path: str = FOOD_MODEL_PATH, labels_path: str = FOOD_LABELS_PATH):
+        self.model_path = model_path
+        self.labels_path = labels_path
+        self.session = None
+        self.input_name: Optional[str] = None
+        self.input_size = DEFAULT_INPUT_SIZE
+        self.dishes: List[Dict] = []
+        self.batcher = MicroBatcher(self.predict_batch, FOOD_BATCH_SIZE, FOOD_BATCH_WAIT_MS)
+    
+    def is_loaded(self) -> bool:
+        """Check if the model and labels are loaded"""
+        return self.session is not None
+    
+    def load(self):
+        """Load the ONNX model and labels (blocking; call from a thread)"""
+        if not os.path.exists(self.model_path) or not os.path.exists(self.labels_path):
+            print(f"⚠️  Food classifier not found at {self.model_path}, image recognition disabled")
+            return
+        
+        try:
+            import onnxruntime as ort
+            
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = FOOD_MODEL_THREADS
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(self.model_path, options, providers=["CPUExecutionProvider"])
+            
+            model_input = session.get_inputs()[0]
+            batch_dim, _, height, _ = model_input.shape
+            if isinstance(height, int):
+                self.input_size = height
+            if isinstance(batch_dim, int):
+                # Exported with a fixed batch size; batches can't be larger
+                self.batcher.max_batch_size = min(self.batcher.max_batch_size, batch_dim)
+            
+            dishes = load_labels(self.labels_path)
+            n_classes = session.get_outputs()[0].shape[-1]
+            if isinstance(n_classes, int) and n_classes != len(dishes):
+                raise ValueError(f"model has {n_classes} classes but labels list {len(dishes)} dishes")
+            
+            self.input_name = model_input.name
+            self.dishes = dishes
+            self.session = session
+            print(f"✅ Food classifier loaded ({len(dishes)} dishes, {self.input_size}px)")
+        except Exception as e:
+            print(f"❌ Error loading food classifier: {e}")
+    
+    def predict_batch(self, images: List[np.ndarray]) -> List[np.ndarray]:
+        """Class probabilities for each preprocessed image, in one forward pass"""
+        batch = np.stack(images).astype(np.float32, copy=False)
+        outputs = self.session.run(None, {self.input_name: batch})[0]
+        return list(to_probabilities(outputs.reshape(len(images), -1)))
+    
+    async def classify(self, data: bytes, top_k: int = 3) -> List[Tuple[Dict, float]]:
+        """Top-k (dish, probability) predictions for an encoded image, best first"""
+        image = await asyncio.to_thread(preprocess, data, self.input_size)
+        probabilities = await self.batcher.submit(image)
+        best = np.argsort(-probabilities)[:top_k]
+        return [(self.dishes[index], float(probabilities[index])) for index in best]
+    
+    async def run(self):
+        """Background task running batched inference while a model is loaded"""
+        if self.is_loaded():
+            await self.batcher.run()
+
+food_classifier = FoodClassifier()
@@ -0,0 +1,130 @@
+"""
+Linear Model Sufficient Statistics
+Mergeable statistics that let StandardScaler + Ridge be fitted without holding the training set
+"""
+
+from __future__ import annotations
+
+import numpy as np
+from typing import Dict, Tuple
+
+from app.startup import lazy_module
+
+linear_model = lazy_module("sklearn.linear_model")
+preprocessing = lazy_module("sklearn.preprocessing")
+
+class RidgeStats:
+    """
+    Running means and centered co-moments of (X, y)
+    
+    Chunks are folded in with the pairwise update of Chan et al., which stays
+    numerically stable where raw X^T X sums would not. The result is enough to
+    reproduce StandardScaler.fit + Ridge.fit on the concatenated data exactly
+    (up to floating point), plus the training RMSE and R2.
+    """
+    
+    def __init__(self, n_features: int):
+        self.n = 0
+        self.mean_x = np.zeros(n_features)
+        self.mean_y = 0.0
+        self.cxx = np.zeros((n_features, n_features))  # sum (x - mean_x)(x - mean_x)^T
+        self.cxy = np.zeros(n_features)                # sum (x - mean_x)(y - mean_y)
+        self.syy = 0.0                                 # sum (y - mean_y)^2
+    
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """(arrays, metadata) for app.models.artifacts"""
+        arrays = {"mean_x": self.mean_x, "cxx": self.cxx, "cxy": self.cxy}
+        return arrays, {"n": int(self.n), "mean_y": float(self.mean_y), "syy": float(self.syy)}
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray], metadata: Dict) -> "RidgeStats":
+        """Statistics saved with to_arrays, copied into writable memory"""
+        stats = cls(len(arrays["mean_x"]))
+        stats.n = metadata["n"]
+        stats.mean_x = np.array(arrays["mean_x"])
+        stats.mean_y = metadata["mean_y"]
+        stats.cxx = np.array(arrays["cxx"])
+        stats.cxy = np.array(arrays["cxy"])
+        stats.syy = metadata["syy"]
+        return stats
+    
+    def update(self, X: np.ndarray, y: np.ndarray):
+        """Fold a chunk of rows into the statistics"""
+        if len(X) == 0:
+            return
+        
+        X = np.asarray(X, dtype=float)
+        y = np.asarray(y, dtype=float)
+        
+        chunk = RidgeStats(X.shape[1])
+        chunk.n = len(X)
+        chunk.mean_x = X.mean(axis=0)
+        chunk.mean_y = float(y.mean())
+        Xc = X - chunk.mean_x
+        yc = y - chunk.mean_y
+        chunk.cxx = Xc.T @ Xc
+        chunk.cxy = Xc.T @ yc
+        chunk.syy = float(yc @ yc)
+        
+        self.merge(chunk)
+    
+    def merge(self, other: "RidgeStats"):
+        """Combine with statistics computed over a disjoint set of rows"""
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean_x, self.mean_y = other.n, other.mean_x.copy(), other.mean_y
+            self.cxx, self.cxy, self.syy = other.cxx.copy(), other.cxy.copy(), other.syy
+            return
+        
+        n = self.n + other.n
+        weight = self.n * other.n / n
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        
+        self.cxx = self.cxx + other.cxx + weight * np.outer(delta_x, delta_x)
+        self.cxy = self.cxy + other.cxy + weight * delta_x * delta_y
+        self.syy = self.syy + other.syy + weight * delta_y * delta_y
+        self.mean_x = self.mean_x + delta_x * (other.n / n)
+        self.mean_y = self.mean_y + delta_y * (other.n / n)
+        self.n = n
+    
+    def fit(self, alpha: float = 1.0) -> Tuple[preprocessing.StandardScaler, linear_model.Ridge, Dict[str, float]]:
+        """
+        Fitted StandardScaler and Ridge equivalent to fitting on all folded rows
+        Returns: (scaler, model, {"rmse", "r2"})
+        """
+        if self.n == 0:
+            raise ValueError("No training data available")
+        
+        n_features = len(self.mean_x)
+        var = np.diag(self.cxx) / self.n
+        scale = np.sqrt(var)
+        scale[scale < 10 * np.finfo(scale.dtype).eps] = 1.0  # Same zero-variance handling as sklearn
+        
+        scaler = preprocessing.StandardScaler()
+        scaler.mean_ = self.mean_x.copy()
+        scaler.var_ = var
+        scaler.scale_ = scale
+        scaler.n_samples_seen_ = self.n
+        scaler.n_features_in_ = n_features
+        
+        # Ridge on standardized features: scaled columns are already centered
+        A = self.cxx / np.outer(scale, scale) + alpha * np.eye(n_features)
+        b = self.cxy / scale
+        coef = np.linalg.solve(A, b)
+        
+        model = linear_model.Ridge(alpha=alpha)
+        model.coef_ = coef
+        model.intercept_ = self.mean_y
+        model.n_features_in_ = n_features
+        
+        # Residual sum of squares from the co-moments, in original feature units
+        w = coef / scale
+        sse = max(self.syy - 2 * w @ self.cxy + w @ self.cxx @ w, 0.0)
+        metrics = {
+            "rmse": float(np.sqrt(sse / self.n)),
+            "r2": float(1 - sse / self.syy) if self.syy > 0 else 0.0
+        }
+        
+        return scaler, model, metrics
@@ -3,104 +3,242 @@ Machine Learning Models Manager
 Handles loading, training, and prediction for consumption and recommendation models
 """
 
+from __future__ import annotations
+
 import os
-import joblib
 import numpy as np
-import pandas as pd
 from datetime import datetime, timedelta
-from sklearn.linear_model import Ridge, LinearRegression
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from typing import Dict, List, Tuple, Optional
 import asyncio
 
+from app.startup import lazy_module
+
+from app.models.linear_stats import RidgeStats
+from app.models.recipe_features import RecipeFeatures, top_k_indices
+from app.models.collaborative import CollaborativeModel
+from app.models.artifacts import has_artifacts, load_artifacts, save_artifacts, section, prefixed
+from app.executor import model_executor
+
+# Imported on first use (or during warm-up) to keep cold start fast
+joblib = lazy_module("joblib")
+pd = lazy_module("pandas")
+linear_model = lazy_module("sklearn.linear_model")
+preprocessing = lazy_module("sklearn.preprocessing")
+sklearn_metrics = lazy_module("sklearn.metrics")
+
+# Feature columns of the consumption model, in training order
+CONSUMPTION_FEATURES = ['day_of_week', 'day_of_month', 'month', 'family_size',
+                        'age', 'is_weekend', 'prev_day_consumption', '7_day_avg', '30_day_avg']
+PREV_DAY_INDEX = CONSUMPTION_FEATURES.index('prev_day_consumption')
+
 class MLModels:
     """Manager for all ML models"""
     
-    def __init__(self):
+    def __init__(self, model_path: Optional[str] = None, version: Optional[str] = None):
         self.consumption_model = None
         self.scaler = None
-        self.recipe_features = None
-        self.model_path = os.getenv("MODEL_PATH", "./models")
-        self._loaded = False
-        
-        # Create model directory if it doesn't exist
-        os.makedirs(self.model_path, exist_ok=True)
+        self.collaborative_model = None  # Optional, trained from recipe interactions
+        self.training_state = None  # Sufficient statistics and watermark for incremental training
+        self.model_path = model_path or os.getenv("MODEL_PATH", "./models")
+        self.version = version or os.getenv("MODEL_VERSION", "v1.0.0")
+        self._loaded = False  # model_path is created by the first save
     
     def is_loaded(self) -> bool:
         """Check if models are loaded"""
         return self._loaded
     
+    def __getstate__(self) -> Dict:
+        # Copies sent to executor worker processes only need the consumption model
+        state = self.__dict__.copy()
+        state["collaborative_model"] = None
+        state["training_state"] = None
+        return state
+    
     async def load_models(self):
         """Load pre-trained models from disk"""
         try:
-            consumption_model_path = os.path.join(self.model_path, "consumption_model.pkl")
-            scaler_path = os.path.join(self.model_path, "scaler.pkl")
-            recipe_features_path = os.path.join(self.model_path, "recipe_features.pkl")
-            
-            if os.path.exists(consumption_model_path):
-                self.consumption_model = joblib.load(consumption_model_path)
-                print("✅ Consumption prediction model loaded")
+            if has_artifacts(self.model_path):
+                self.load_artifacts()
             else:
-                print("⚠️  Consumption model not found, initializing new model")
-                self.consumption_model = Ridge(alpha=1.0)
-            
-            if os.path.exists(scaler_path):
-                self.scaler = joblib.load(scaler_path)
-                print("✅ Scaler loaded")
-            else:
-                print("⚠️  Scaler not found, initializing new scaler")
-                self.scaler = StandardScaler()
-            
-            if os.path.exists(recipe_features_path):
-                self.recipe_features = joblib.load(recipe_features_path)
-                print("✅ Recipe features loaded")
-            else:
-                print("⚠️  Recipe features not found, will compute on demand")
-                self.recipe_features = None
-            
+                self.load_legacy_pickles()
             self._loaded = True
             
         except Exception as e:
             print(f"❌ Error loading models: {e}")
             # Initialize default models
-            self.consumption_model = Ridge(alpha=1.0)
-            self.scaler = StandardScaler()
-            self.recipe_features = None
+            self.consumption_model = linear_model.Ridge(alpha=1.0)
+            self.scaler = preprocessing.StandardScaler()
+            self.collaborative_model = None
+            self.training_state = None
             self._loaded = True
     
+    def load_artifacts(self):
+        """Map the manifest and arrays written by save_models (see app.models.artifacts)"""
+        arrays, metadata = load_artifacts(self.model_path)
+        
+        self.consumption_model = linear_model.Ridge(alpha=metadata.get("consumption", {}).get("alpha", 1.0))
+        if "consumption" in metadata:
+            self.consumption_model.coef_ = arrays["consumption.coef"]
+            self.consumption_model.intercept_ = metadata["consumption"]["intercept"]
+            self.consumption_model.n_features_in_ = len(arrays["consumption.coef"])
+            print("✅ Consumption prediction model loaded")
+        else:
+            print("⚠️  Consumption model not found, initializing new model")
+        
+        self.scaler = preprocessing.StandardScaler()
+        if "scaler" in metadata:
+            self.scaler.mean_ = arrays["scaler.mean"]
+            self.scaler.var_ = arrays["scaler.var"]
+            self.scaler.scale_ = arrays["scaler.scale"]
+            self.scaler.n_samples_seen_ = metadata["scaler"]["n_samples_seen"]
+            self.scaler.n_features_in_ = len(arrays["scaler.mean"])
+            print("✅ Scaler loaded")
+        else:
+            print("⚠️  Scaler not found, initializing new scaler")
+        
+        if "collaborative" in metadata:
+            self.collaborative_model = CollaborativeModel.from_arrays(section(arrays, "collaborative"),
+                                                                      metadata["collaborative"])
+            print("✅ Collaborative filtering model loaded")
+        else:
+            self.collaborative_model = None
+        
+        if "training_state" in metadata:
+            state = metadata["training_state"]
+            self.training_state = {
+                "stats": RidgeStats.from_arrays(section(arrays, "training_state.stats"), state["stats"]),
+                "users_count": state["users_count"],
+                "training_samples": state["training_samples"],
+                "watermark": datetime.fromisoformat(state["watermark"]) if state["watermark"] else None
+            }
+            print("✅ Training state loaded")
+        else:
+            self.training_state = None
+    
+    def load_legacy_pickles(self):
+        """Load joblib pickles written before the artifact format; the next save converts them"""
+        consumption_model_path = os.path.join(self.model_path, "consumption_model.pkl")
+        scaler_path = os.path.join(self.model_path, "scaler.pkl")
+        collaborative_model_path = os.path.join(self.model_path, "collaborative_model.pkl")
+        training_state_path = os.path.join(self.model_path, "training_state.pkl")
+        
+        if os.path.exists(consumption_model_path):
+            self.consumption_model = joblib.load(consumption_model_path)
+            print("✅ Consumption prediction model loaded")
+        else:
+            print("⚠️  Consumption model not found, initializing new model")
+            self.consumption_model = linear_model.Ridge(alpha=1.0)
+        
+        if os.path.exists(scaler_path):
+            self.scaler = joblib.load(scaler_path)
+            print("✅ Scaler loaded")
+        else:
+            print("⚠️  Scaler not found, initializing new scaler")
+            self.scaler = preprocessing.StandardScaler()
+        
+        if os.path.exists(collaborative_model_path):
+            self.collaborative_model = joblib.load(collaborative_model_path)
+            print("✅ Collaborative filtering model loaded")
+        else:
+            self.collaborative_model = None
+        
+        if os.path.exists(training_state_path):
+            self.training_state = joblib.load(training_state_path)
+            print("✅ Training state loaded")
+        else:
+            self.training_state = None
+    
+    def new_version(self, model_path: str, version: str, refit_consumption: bool = True) -> "MLModels":
+        """
+        Copy of these models for training a new version
+        The consumption model starts unfitted unless refit_consumption is False; the
+        collaborative model is carried over either way
+        """
+        models = MLModels(model_path, version)
+        if refit_consumption:
+            models.consumption_model = linear_model.Ridge(alpha=1.0)
+            models.scaler = preprocessing.StandardScaler()
+        else:
+            models.consumption_model = self.consumption_model
+            models.scaler = self.scaler
+            models.training_state = self.training_state
+        models.collaborative_model = self.collaborative_model
+        models._loaded = True
+        return models
+    
     async def save_models(self):
-        """Save trained models to disk"""
+        """Save trained models to disk (file writes run in a worker thread)"""
+        await asyncio.to_thread(self.write_models)
+    
+    def write_models(self):
+        """Save trained models to disk, blocking"""
         try:
-            consumption_model_path = os.path.join(self.model_path, "consumption_model.pkl")
-            scaler_path = os.path.join(self.model_path, "scaler.pkl")
-            recipe_features_path = os.path.join(self.model_path, "recipe_features.pkl")
-            
-            joblib.dump(self.consumption_model, consumption_model_path)
-            joblib.dump(self.scaler, scaler_path)
-            if self.recipe_features is not None:
-                joblib.dump(self.recipe_features, recipe_features_path)
-            
+            save_artifacts(self.model_path, *self.to_arrays())
             print("✅ Models saved successfully")
             
         except Exception as e:
             print(f"❌ Error saving models: {e}")
     
-    def prepare_consumption_features(self, oil_logs: List[Dict], user_profile: Dict) -> pd.DataFrame:
+    def to_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict]:
+        """Every fitted component as named arrays plus JSON metadata"""
+        arrays, metadata = {}, {}
+        
+        if hasattr(self.consumption_model, "coef_"):
+            arrays["consumption.coef"] = np.ravel(self.consumption_model.coef_)
+            metadata["consumption"] = {
+                "alpha": float(self.consumption_model.alpha),
+                "intercept": float(self.consumption_model.intercept_)
+            }
+        
+        if getattr(self.scaler, "mean_", None) is not None:
+            arrays.update({
+                "scaler.mean": self.scaler.mean_,
+                "scaler.var": self.scaler.var_,
+                "scaler.scale": self.scaler.scale_
+            })
+            metadata["scaler"] = {"n_samples_seen": int(np.max(self.scaler.n_samples_seen_))}
+        
+        if self.collaborative_model is not None:
+            collaborative_arrays, metadata["collaborative"] = self.collaborative_model.to_arrays()
+            arrays.update(prefixed("collaborative", collaborative_arrays))
+        
+        if self.training_state is not None:
+            stats_arrays, stats_metadata = self.training_state["stats"].to_arrays()
+            arrays.update(prefixed("training_state.stats", stats_arrays))
+            watermark = self.training_state["watermark"]
+            metadata["training_state"] = {
+                "stats": stats_metadata,
+                "users_count": self.training_state["users_count"],
+                "training_samples": self.training_state["training_samples"],
+                "watermark": watermark.isoformat() if watermark else None
+            }
+        
+        return arrays, metadata
+    
+    def logs_to_frame(self, user_logs: Dict[str, List[Dict]]) -> pd.DataFrame:
+        """Long-format (userId, date, amount) frame of many users' logs"""
+        user_ids = list(user_logs.keys())
+        return pd.DataFrame({
+            'userId': np.repeat(user_ids, [len(user_logs[user_id]) for user_id in user_ids]),
+            'date': [log['date'] for user_id in user_ids for log in user_logs[user_id]],
+            'amount': [log['amount'] for user_id in user_ids for log in user_logs[user_id]]
+        })
+    
+    def prepare_consumption_features_bulk(self, logs_df: pd.DataFrame, user_profiles: Dict[str, Dict]) -> pd.DataFrame:
         """
-        Prepare features for consumption prediction
-        Features: day_of_week, day_of_month, month, family_size, age, is_weekend, 
-                 previous_day_consumption, 7_day_avg, 30_day_avg
+        Prepare consumption features for many users in one pass
+        Takes a long-format frame with userId, date and amount columns. Rows come back grouped
+        by user (in order of first appearance) and sorted by date, equal dates keeping their order.
         """
-        df = pd.DataFrame(oil_logs)
-        
-        if len(df) == 0:
+        if len(logs_df) == 0:
             return pd.DataFrame()
         
-        # Convert date strings to datetime
+        df = logs_df[['userId', 'date', 'amount']].copy()
         df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date')
+        
+        # Group rows per user without reordering users; stable so equal dates keep their order
+        df['_user'] = pd.factorize(df['userId'])[0]
+        df = df.sort_values(['_user', 'date'], kind='stable').reset_index(drop=True)
         
         # Extract time features
         df['day_of_week'] = df['date'].dt.dayofweek
@@ -109,191 +247,198 @@ class MLModels:
         df['is_weekend'] = df['day_of_week'].isin([5, 6]).astype(int)
         
         # User features
-        df['family_size'] = user_profile.get('familySize', 1)
-        df['age'] = user_profile.get('age', 30)
-        
-        # Lagging features
-        df['prev_day_consumption'] = df['amount'].shift(1).fillna(df['amount'].mean())
-        df['7_day_avg'] = df['amount'].rolling(window=7, min_periods=1).mean()
-        df['30_day_avg'] = df['amount'].rolling(window=30, min_periods=1).mean()
-        
-        return df
+        user_ids = df['userId'].unique()
+        family_sizes = {user_id: user_profiles.get(user_id, {}).get('familySize', 1) for user_id in user_ids}
+        ages = {user_id: user_profiles.get(user_id, {}).get('age', 30) for user_id in user_ids}
+        df['family_size'] = df['userId'].map(family_sizes)
+        df['age'] = df['userId'].map(ages)
+        
+        # Lagging features, computed per user with grouped operations
+        amounts = df.groupby('_user', sort=False)['amount']
+        df['prev_day_consumption'] = amounts.shift(1).fillna(amounts.transform('mean'))
+        df['7_day_avg'] = amounts.rolling(window=7, min_periods=1).mean().reset_index(level=0, drop=True)
+        df['30_day_avg'] = amounts.rolling(window=30, min_periods=1).mean().reset_index(level=0, drop=True)
+        
+        return df.drop(columns='_user')
+    
+    def build_consumption_features(self, user_logs: Dict[str, List[Dict]], user_profiles: Dict) -> pd.DataFrame:
+        """Feature rows of many users' logs; a single call suited to model_executor"""
+        return self.prepare_consumption_features_bulk(self.logs_to_frame(user_logs), user_profiles)
     
-    async def train_consumption_model(self, training_data: List[Dict], user_profiles: Dict) -> Dict[str, float]:
+    def fit_consumption_stats(self, stats: RidgeStats) -> Dict[str, float]:
         """
-        Train consumption prediction model
-        Returns metrics: MAE, RMSE, R2
+        Fit the scaler and consumption model from streamed sufficient statistics
+        Returns exact RMSE and R2 over every folded row
         """
-        all_features = []
-        all_targets = []
-        
-        # Prepare features for all users
-        for user_id, logs in training_data.items():
-            user_profile = user_profiles.get(user_id, {})
-            features_df = self.prepare_consumption_features(logs, user_profile)
-            
-            if len(features_df) > 0:
-                feature_cols = ['day_of_week', 'day_of_month', 'month', 'family_size', 
-                               'age', 'is_weekend', 'prev_day_consumption', '7_day_avg', '30_day_avg']
-                
-                X = features_df[feature_cols].values
-                y = features_df['amount'].values
-                
-                all_features.append(X)
-                all_targets.append(y)
-        
-        if len(all_features) == 0:
-            raise ValueError("No training data available")
-        
-        # Combine all data
-        X_train = np.vstack(all_features)
-        y_train = np.concatenate(all_targets)
-        
-        # Scale features
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        
-        # Train model
-        self.consumption_model.fit(X_train_scaled, y_train)
-        
-        # Calculate metrics
-        y_pred = self.consumption_model.predict(X_train_scaled)
-        metrics = {
-            "mae": float(mean_absolute_error(y_train, y_pred)),
-            "rmse": float(np.sqrt(mean_squared_error(y_train, y_pred))),
-            "r2": float(r2_score(y_train, y_pred))
-        }
-        
-        # Save models
-        await self.save_models()
-        
-        return metrics
+        self.scaler, self.consumption_model, metrics = stats.fit(alpha=1.0)
+        return {"rmse": metrics["rmse"], "r2": metrics["r2"]}
     
-    async def predict_consumption(self, user_id: str, oil_logs: List[Dict], 
-                                  user_profile: Dict, days_ahead: int = 30) -> Tuple[List[Dict], float]:
+    def sample_mae(self, eval_X: np.ndarray, eval_y: np.ndarray) -> float:
+        """Mean absolute error of the consumption model on an evaluation sample"""
+        if len(eval_y) == 0:
+            return 0.0
+        y_pred = self.consumption_model.predict(self.scaler.transform(eval_X))
+        return float(sklearn_metrics.mean_absolute_error(eval_y, y_pred))
+    
+    def predict_consumption_from_state(self, state: Dict, user_profile: Dict,
+                                       days_ahead: int = 30) -> Tuple[List[Dict], float]:
         """
-        Predict future oil consumption for a user
+        Predict future oil consumption from a compact per-user feature state (see app.feature_store)
+        Gives the same result as predict_consumption_batch over the user's latest 90 logs
+        CPU-bound; call through model_executor from the event loop
         Returns: (predictions, confidence)
         """
-        if len(oil_logs) < 7:
-            # Not enough data for prediction, return average-based prediction
-            avg_consumption = sum(log['amount'] for log in oil_logs) / len(oil_logs) if oil_logs else 50.0
-            predictions = []
-            last_date = datetime.fromisoformat(oil_logs[-1]['date'].replace('Z', '+00:00')) if oil_logs else datetime.now()
-            
-            for i in range(1, days_ahead + 1):
-                pred_date = last_date + timedelta(days=i)
-                predictions.append({
-                    "date": pred_date.isoformat(),
-                    "predicted_amount": round(avg_consumption, 2)
-                })
-            
-            return predictions, 0.3  # Low confidence
+        window = state['window']
+        log_count = min(state['log_count'], 90)
+        
+        if log_count < 7:
+            # The window holds every log; pass them newest first like the router does
+            oil_logs = [
+                {"amount": entry['amount'], "date": pd.Timestamp(entry['date']).isoformat()}
+                for entry in reversed(window)
+            ]
+            return self.average_forecast(oil_logs, days_ahead), 0.3  # Low confidence
+        
+        amounts = np.array([entry['amount'] for entry in window], dtype=float)
+        last_row = pd.Series({
+            'date': pd.Timestamp(window[-1]['date']),
+            'amount': amounts[-1],
+            '7_day_avg': amounts[-7:].mean(),
+            '30_day_avg': amounts[-30:].mean()
+        })
+        
+        predictions = self.forecast_from_last_row(last_row, user_profile, days_ahead)
+        confidence = min(0.9, 0.5 + (log_count / 100))  # Increases with more data
         
-        # Prepare features
-        features_df = self.prepare_consumption_features(oil_logs, user_profile)
+        return predictions, confidence
+    
+    def forecast_from_last_row(self, last_row: pd.Series, user_profile: Dict, days_ahead: int) -> List[Dict]:
+        """Model forecast for one user from the last row of their features"""
+        dates, X = self.build_forecast_matrix(last_row, user_profile, days_ahead)
+        amounts = self.forecast_amounts(X[np.newaxis], np.array([last_row['amount']], dtype=float))[0]
+        
+        return [
+            {"date": pred_date.isoformat(), "predicted_amount": float(amount)}
+            for pred_date, amount in zip(dates, amounts)
+        ]
+    
+    def predict_consumption_batch(self, user_logs: Dict[str, List[Dict]], user_profiles: Dict[str, Dict],
+                                  days_ahead: int = 30) -> Dict[str, Tuple[List[Dict], float]]:
+        """
+        Predict future oil consumption for many users at once
+        Horizon matrices of all users are stacked so the model runs once for the whole batch
+        Returns: {user_id: (predictions, confidence)}
+        """
+        results = {}
+        user_ids = []
+        all_dates = []
+        all_X = []
+        last_amounts = []
+        
+        model_logs = {}
+        for user_id, oil_logs in user_logs.items():
+            if len(oil_logs) < 7:
+                results[user_id] = (self.average_forecast(oil_logs, days_ahead), 0.3)
+            else:
+                model_logs[user_id] = oil_logs
         
-        if len(features_df) == 0:
-            raise ValueError("Unable to prepare features")
+        features_df = self.prepare_consumption_features_bulk(self.logs_to_frame(model_logs), user_profiles)
         
-        # Get last known values
-        last_row = features_df.iloc[-1]
-        last_date = last_row['date']
+        if len(features_df) > 0:
+            for user_id, last_row in features_df.groupby('userId', sort=False).tail(1).set_index('userId').iterrows():
+                dates, X = self.build_forecast_matrix(last_row, user_profiles.get(user_id, {}), days_ahead)
+                user_ids.append(user_id)
+                all_dates.append(dates)
+                all_X.append(X)
+                last_amounts.append(last_row['amount'])
         
+        if user_ids:
+            amounts = self.forecast_amounts(np.stack(all_X), np.array(last_amounts, dtype=float))
+            
+            for user_id, dates, user_amounts in zip(user_ids, all_dates, amounts):
+                predictions = [
+                    {"date": pred_date.isoformat(), "predicted_amount": float(amount)}
+                    for pred_date, amount in zip(dates, user_amounts)
+                ]
+                confidence = min(0.9, 0.5 + (len(user_logs[user_id]) / 100))
+                results[user_id] = (predictions, confidence)
+        
+        return results
+    
+    def average_forecast(self, oil_logs: List[Dict], days_ahead: int) -> List[Dict]:
+        """Flat forecast at the historical average, used when there is too little data for the model"""
+        avg_consumption = sum(log['amount'] for log in oil_logs) / len(oil_logs) if oil_logs else 50.0
         predictions = []
+        last_date = datetime.fromisoformat(oil_logs[-1]['date'].replace('Z', '+00:00')) if oil_logs else datetime.now()
         
-        # Predict future days
         for i in range(1, days_ahead + 1):
             pred_date = last_date + timedelta(days=i)
-            
-            # Create feature vector for prediction
-            features = {
-                'day_of_week': pred_date.dayofweek,
-                'day_of_month': pred_date.day,
-                'month': pred_date.month,
-                'family_size': user_profile.get('familySize', 1),
-                'age': user_profile.get('age', 30),
-                'is_weekend': 1 if pred_date.dayofweek in [5, 6] else 0,
-                'prev_day_consumption': last_row['amount'] if i == 1 else predictions[-1]['predicted_amount'],
-                '7_day_avg': last_row['7_day_avg'],
-                '30_day_avg': last_row['30_day_avg']
-            }
-            
-            X = np.array([[features[col] for col in ['day_of_week', 'day_of_month', 'month', 
-                                                      'family_size', 'age', 'is_weekend', 
-                                                      'prev_day_consumption', '7_day_avg', '30_day_avg']]])
-            
-            X_scaled = self.scaler.transform(X)
-            predicted_amount = self.consumption_model.predict(X_scaled)[0]
-            
             predictions.append({
                 "date": pred_date.isoformat(),
-                "predicted_amount": round(max(0, predicted_amount), 2)  # Ensure non-negative
+                "predicted_amount": round(avg_consumption, 2)
             })
         
-        # Calculate confidence based on recent prediction accuracy
-        confidence = min(0.9, 0.5 + (len(oil_logs) / 100))  # Increases with more data
-        
-        return predictions, confidence
+        return predictions
     
-    def calculate_recipe_similarity(self, user_preferences: Dict, recipe: Dict) -> float:
+    def build_forecast_matrix(self, last_row: pd.Series, user_profile: Dict,
+                              days_ahead: int) -> Tuple[pd.DatetimeIndex, np.ndarray]:
         """
-        Calculate similarity score between user preferences and recipe
-        Uses content-based filtering with weighted features
+        Build the feature matrix for the whole forecast horizon at once
+        The prev_day_consumption column is left at 0 and filled by forecast_amounts
         """
-        score = 0.0
-        
-        # Oil amount preference (lower is better)
-        oil_amount = recipe.get('oilAmount', 50)
-        if oil_amount < 20:
-            score += 30
-        elif oil_amount < 40:
-            score += 20
-        elif oil_amount < 60:
-            score += 10
-        
-        # Dietary habit match
-        user_diet = user_preferences.get('dietaryHabit', 'vegetarian')
-        recipe_tags = recipe.get('tags', [])
-        
-        if user_diet in ['vegetarian', 'vegan'] and 'vegetarian' in recipe_tags:
-            score += 25
-        elif user_diet == 'vegan' and 'vegan' in recipe_tags:
-            score += 30
-        
-        # Cuisine preference (if provided)
-        preferred_cuisines = user_preferences.get('cuisinePreference', [])
-        if recipe.get('cuisine') in preferred_cuisines:
-            score += 20
-        
-        # Health tags
-        health_conditions = user_preferences.get('healthConditions', [])
-        if 'diabetes' in health_conditions and 'low-sugar' in recipe_tags:
-            score += 15
-        if 'heart-disease' in health_conditions and 'heart-healthy' in recipe_tags:
-            score += 15
-        if 'low-calorie' in recipe_tags:
-            score += 10
-        
-        # Difficulty preference (easier recipes get slight boost)
-        if recipe.get('difficulty') == 'easy':
-            score += 5
-        
-        return score
+        dates = last_row['date'] + pd.to_timedelta(np.arange(1, days_ahead + 1), unit='D')
+        day_of_week = np.asarray(dates.dayofweek)
+        
+        X = np.zeros((days_ahead, len(CONSUMPTION_FEATURES)))
+        X[:, 0] = day_of_week
+        X[:, 1] = dates.day
+        X[:, 2] = dates.month
+        X[:, 3] = user_profile.get('familySize', 1)
+        X[:, 4] = user_profile.get('age', 30)
+        X[:, 5] = day_of_week >= 5
+        X[:, 7] = last_row['7_day_avg']
+        X[:, 8] = last_row['30_day_avg']
+        
+        return dates, X
     
-    async def recommend_recipes(self, user_id: str, user_profile: Dict, 
-                               recipes: List[Dict], limit: int = 10) -> List[Dict]:
+    def forecast_amounts(self, X: np.ndarray, last_amounts: np.ndarray) -> np.ndarray:
         """
-        Recommend recipes based on user profile and preferences
-        Uses content-based filtering
+        Roll the linear model forward over stacked horizon matrices
+        X has shape (users, days, features); returns amounts of shape (users, days)
+        
+        Everything except prev_day_consumption is known up front, so the scaler and
+        the model's coefficients are applied to all users and days in one pass. Only the
+        autoregressive term remains per day; it stays a recurrence (vectorized across
+        users) because each day feeds back the clipped, rounded amount of the day before.
         """
-        scored_recipes = []
+        n_users, n_days, n_features = X.shape
+        X_scaled = self.scaler.transform(X.reshape(-1, n_features))
+        X_scaled[:, PREV_DAY_INDEX] = 0.0
+        
+        coef = np.ravel(self.consumption_model.coef_)
+        base = (X_scaled @ coef + self.consumption_model.intercept_).reshape(n_users, n_days)
         
-        for recipe in recipes:
-            similarity_score = self.calculate_recipe_similarity(user_profile, recipe)
-            recipe['score'] = similarity_score
-            scored_recipes.append(recipe)
+        prev_mean = self.scaler.mean_[PREV_DAY_INDEX] if self.scaler.mean_ is not None else 0.0
+        prev_scale = self.scaler.scale_[PREV_DAY_INDEX] if self.scaler.scale_ is not None else 1.0
+        prev_weight = coef[PREV_DAY_INDEX] / prev_scale
         
-        # Sort by score and return top N
-        scored_recipes.sort(key=lambda x: x['score'], reverse=True)
+        amounts = np.empty((n_users, n_days))
+        prev = last_amounts
+        for day in range(n_days):
+            predicted = base[:, day] + prev_weight * (prev - prev_mean)
+            prev = np.round(np.maximum(predicted, 0), 2)  # Ensure non-negative
+            amounts[:, day] = prev
         
-        return scored_recipes[:limit]
+        return amounts
+    
+    def rank_recipes(self, user_profile: Dict, recipe_features: RecipeFeatures,
+                     rows: np.ndarray, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Top recipes among the given feature matrix rows for a user
+        Returns: [(recipe id, score)], best first
+        """
+        scores = recipe_features.score(user_profile, rows)
+        return [
+            (recipe_features.ids[rows[i]], float(scores[i]))
+            for i in top_k_indices(scores, limit)
+        ]
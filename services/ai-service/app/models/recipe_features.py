@@ -0,0 +1,206 @@
+"""
+Recipe Feature Matrix
+Precomputed per-recipe features for vectorized content-based scoring of the whole catalog
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+DEFAULT_OIL_AMOUNT = 50  # Score recipes without an oil amount as 50 ml
+
+def oil_points(oil_amounts: np.ndarray) -> np.ndarray:
+    """Oil amount preference (lower is better): 30 / 20 / 10 / 0 points; missing amounts count as 50"""
+    oil_amounts = np.where(np.isnan(oil_amounts), DEFAULT_OIL_AMOUNT, oil_amounts)
+    return np.select(
+        [oil_amounts < 20, oil_amounts < 40, oil_amounts < 60],
+        [30.0, 20.0, 10.0],
+        default=0.0
+    )
+
+class RecipeFeatures:
+    """
+    Feature matrix of a recipe catalog, one row per recipe
+    
+    oil_amounts: raw amount (NaN if missing), oil_points: oil bucket score, tags: recipe x tag
+    bitset, cuisines / difficulties: one-hot. score() computes the content-based score of
+    every row at once.
+    """
+    
+    def __init__(self, ids: List[str], oil_amounts: np.ndarray, tag_names: List[str], tags: np.ndarray,
+                 cuisine_names: List[str], cuisines: np.ndarray,
+                 difficulty_names: List[str], difficulties: np.ndarray):
+        self.ids = ids
+        self.id_index = {recipe_id: row for row, recipe_id in enumerate(ids)}
+        self.oil_amounts = oil_amounts
+        self.oil_points = oil_points(oil_amounts)
+        self.tag_names = tag_names
+        self.tag_index = {tag: column for column, tag in enumerate(tag_names)}
+        self.tags = tags
+        self.cuisine_names = cuisine_names
+        self.cuisine_index = {cuisine: column for column, cuisine in enumerate(cuisine_names)}
+        self.cuisines = cuisines
+        self.difficulty_names = difficulty_names
+        self.difficulty_index = {difficulty: column for column, difficulty in enumerate(difficulty_names)}
+        self.difficulties = difficulties
+        self.easy = self.has_difficulty("easy")
+        self.filters = RecipeFilterIndex(self)
+        self.built_at = datetime.now()
+    
+    @classmethod
+    def from_recipes(cls, recipes: List[Dict]) -> "RecipeFeatures":
+        """Build the matrix from recipe dicts with id, oilAmount, tags, cuisine and difficulty"""
+        tag_names = sorted({tag for recipe in recipes for tag in recipe.get("tags", [])})
+        cuisine_names, cuisines = one_hot([recipe.get("cuisine") for recipe in recipes])
+        difficulty_names, difficulties = one_hot([recipe.get("difficulty") for recipe in recipes])
+        tag_index = {tag: column for column, tag in enumerate(tag_names)}
+        
+        tags = np.zeros((len(recipes), len(tag_names)), dtype=bool)
+        for row, recipe in enumerate(recipes):
+            tags[row, [tag_index[tag] for tag in recipe.get("tags", [])]] = True
+        
+        return cls(
+            ids=[recipe["id"] for recipe in recipes],
+            oil_amounts=np.array([recipe.get("oilAmount") for recipe in recipes], dtype=float),
+            tag_names=tag_names,
+            tags=tags,
+            cuisine_names=cuisine_names,
+            cuisines=cuisines,
+            difficulty_names=difficulty_names,
+            difficulties=difficulties
+        )
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    def has_tag(self, tag: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Boolean column of recipes carrying a tag"""
+        column = self.tag_index.get(tag)
+        n = len(self) if rows is None else len(rows)
+        if column is None:
+            return np.zeros(n, dtype=bool)
+        return self.tags[:, column] if rows is None else self.tags[rows, column]
+    
+    def has_cuisine(self, cuisine: str) -> np.ndarray:
+        """Boolean column of recipes of a cuisine"""
+        column = self.cuisine_index.get(cuisine)
+        return self.cuisines[:, column] if column is not None else np.zeros(len(self), dtype=bool)
+    
+    def has_difficulty(self, difficulty: str) -> np.ndarray:
+        """Boolean column of recipes of a difficulty"""
+        column = self.difficulty_index.get(difficulty)
+        return self.difficulties[:, column] if column is not None else np.zeros(len(self), dtype=bool)
+    
+    def score(self, user_preferences: Dict, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Content-based score of every recipe (or the given rows) for one user"""
+        select = slice(None) if rows is None else rows
+        scores = self.oil_points[select].copy()
+        
+        # Dietary habit match
+        user_diet = user_preferences.get('dietaryHabit', 'vegetarian')
+        if user_diet in ['vegetarian', 'vegan']:
+            vegetarian = self.has_tag('vegetarian', rows)
+            diet_points = np.where(vegetarian, 25.0, 0.0)
+            if user_diet == 'vegan':
+                diet_points[~vegetarian & self.has_tag('vegan', rows)] = 30.0
+            scores += diet_points
+        
+        # Cuisine preference
+        preferred = [self.cuisine_index[cuisine] for cuisine in user_preferences.get('cuisinePreference', [])
+                     if cuisine in self.cuisine_index]
+        if preferred:
+            scores += 20.0 * self.cuisines[select][:, preferred].any(axis=1)
+        
+        # Health tags
+        health_conditions = user_preferences.get('healthConditions', [])
+        if 'diabetes' in health_conditions:
+            scores += 15.0 * self.has_tag('low-sugar', rows)
+        if 'heart-disease' in health_conditions:
+            scores += 15.0 * self.has_tag('heart-healthy', rows)
+        scores += 10.0 * self.has_tag('low-calorie', rows)
+        
+        # Difficulty preference
+        scores += 5.0 * self.easy[select]
+        
+        return scores
+
+class RecipeFilterIndex:
+    """
+    Inverted index over a feature matrix for request filters
+    
+    Tag, cuisine and difficulty values map to packed row bitmaps (one bit per recipe), so a
+    filter combination is a few byte-wise ANDs over n/8 bytes. oilAmount is kept sorted
+    with its row order, so "at most x ml" is a binary search.
+    """
+    
+    def __init__(self, features: RecipeFeatures):
+        self.n = len(features)
+        self.tags = self._pack(features.tags, features.tag_index)
+        self.cuisines = self._pack(features.cuisines, features.cuisine_index)
+        self.difficulties = self._pack(features.difficulties, features.difficulty_index)
+        self.empty = np.zeros((self.n + 7) // 8, dtype=np.uint8)
+        
+        # NaN (missing amount) sorts last and never passes a range filter
+        self.oil_order = np.argsort(features.oil_amounts, kind="stable")
+        self.oil_sorted = features.oil_amounts[self.oil_order]
+    
+    @staticmethod
+    def _pack(matrix: np.ndarray, index: Dict[str, int]) -> Dict[str, np.ndarray]:
+        """Value -> packed bitmap of the rows where its one-hot/bitset column is set"""
+        packed = np.ascontiguousarray(np.packbits(matrix, axis=0).T)
+        return {value: packed[column] for value, column in index.items()}
+    
+    def oil_at_most(self, max_amount: float) -> np.ndarray:
+        """Packed bitmap of recipes using at most max_amount ml of oil"""
+        mask = np.zeros(self.n, dtype=bool)
+        mask[self.oil_order[:np.searchsorted(self.oil_sorted, max_amount, side="right")]] = True
+        return np.packbits(mask)
+    
+    def match(self, tags: Optional[List[str]] = None, cuisine: Optional[str] = None, difficulty: Optional[str] = None,
+              max_oil_amount: Optional[float] = None) -> np.ndarray:
+        """Rows carrying every tag and matching cuisine, difficulty and max oil amount when given"""
+        bitmaps = [self.tags.get(tag, self.empty) for tag in tags or []]
+        if cuisine is not None:
+            bitmaps.append(self.cuisines.get(cuisine, self.empty))
+        if difficulty is not None:
+            bitmaps.append(self.difficulties.get(difficulty, self.empty))
+        if max_oil_amount is not None:
+            bitmaps.append(self.oil_at_most(max_oil_amount))
+        
+        if not bitmaps:
+            return np.arange(self.n)
+        
+        bitmap = bitmaps[0].copy()
+        for other in bitmaps[1:]:
+            np.bitwise_and(bitmap, other, out=bitmap)
+        return np.flatnonzero(np.unpackbits(bitmap, count=self.n))
+
+def one_hot(values: List[Optional[str]]) -> Tuple[List[str], np.ndarray]:
+    """(sorted distinct values, one-hot matrix) of a categorical column; None stays all-False"""
+    names = sorted({value for value in values if value is not None})
+    index = {name: column for column, name in enumerate(names)}
+    matrix = np.zeros((len(values), len(names)), dtype=bool)
+    for row, value in enumerate(values):
+        if value is not None:
+            matrix[row, index[value]] = True
+    return names, matrix
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first
+    Ties keep input order (like a stable sort), including ties at the cut-off
+    """
+    n = len(scores)
+    if k <= 0 or n == 0:
+        return np.empty(0, dtype=np.int64)
+    
+    if k < n:
+        kth_score = scores[np.argpartition(-scores, k - 1)[k - 1]]
+        above = np.flatnonzero(scores > kth_score)
+        ties = np.flatnonzero(scores == kth_score)[:k - len(above)]
+        candidates = np.concatenate([above, ties])
+    else:
+        candidates = np.arange(n)
+    
+    return candidates[np.lexsort((candidates, -scores[candidates]))]
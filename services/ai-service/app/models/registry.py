@@ -0,0 +1,135 @@
+"""
+Model Registry
+Process-wide holder of the active, versioned MLModels instance with atomic hot-swap
+"""
+
+import asyncio
+import os
+import shutil
+from datetime import datetime
+from typing import List, Optional
+
+from app.models.ml_models import MLModels
+from app.models.artifacts import has_artifacts
+
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", 30))
+MODEL_VERSIONS_KEEP = int(os.getenv("MODEL_VERSIONS_KEEP", 5))  # 0 keeps every version
+
+class ModelRegistry:
+    """
+    Serves one fitted MLModels snapshot to every router
+    
+    Artifacts live in MODEL_PATH/versions/<version>/ and MODEL_PATH/CURRENT names the
+    active version. Handlers take a reference with current() once per request, so a
+    swap never changes the model under an in-flight request; new requests see the new
+    version immediately. Other workers pick up a published version via watch().
+    
+    A version's directory is only created when it is saved, and publish() prunes all but
+    the newest MODEL_VERSIONS_KEEP versions (never the active one).
+    """
+    
+    def __init__(self, model_path: Optional[str] = None):
+        self.model_path = model_path or os.getenv("MODEL_PATH", "./models")
+        self.versions_path = os.path.join(self.model_path, "versions")
+        self.pointer_path = os.path.join(self.model_path, "CURRENT")
+        self._current: Optional[MLModels] = None
+        self._lock = asyncio.Lock()
+        
+        os.makedirs(self.versions_path, exist_ok=True)
+    
+    def current(self) -> MLModels:
+        """Active models; callers should hold on to the result for the whole request"""
+        if self._current is None:
+            raise RuntimeError("Model registry not loaded")
+        return self._current
+    
+    def is_loaded(self) -> bool:
+        """Check if an active version is loaded"""
+        return self._current is not None and self._current.is_loaded()
+    
+    def active_version(self) -> Optional[str]:
+        """Version named by the CURRENT pointer on disk, if any"""
+        if not os.path.exists(self.pointer_path):
+            return None
+        with open(self.pointer_path) as f:
+            return f.read().strip() or None
+    
+    async def load(self):
+        """Load the version named by CURRENT, falling back to legacy files in MODEL_PATH"""
+        version = self.active_version()
+        if version:
+            models = MLModels(os.path.join(self.versions_path, version), version)
+        else:
+            models = MLModels(self.model_path)
+        
+        await models.load_models()
+        self._current = models
+        print(f"✅ Model version {models.version} active")
+    
+    def create_version(self, refit_consumption: bool = True) -> MLModels:
+        """Models for a new version, to be trained and then published (nothing is written yet)"""
+        version = datetime.now().strftime("v%Y%m%d%H%M%S%f")
+        return self.current().new_version(os.path.join(self.versions_path, version), version, refit_consumption)
+    
+    async def publish(self, models: MLModels):
+        """Make a trained and saved version active in this process and on disk"""
+        if not has_artifacts(models.model_path):
+            # Drop whatever a failed save left behind
+            await asyncio.to_thread(shutil.rmtree, models.model_path, True)
+            raise RuntimeError(f"Model version {models.version} has no saved artifacts")
+        
+        async with self._lock:
+            tmp_path = f"{self.pointer_path}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(models.version)
+            os.replace(tmp_path, self.pointer_path)
+            
+            self._current = models
+        
+        print(f"✅ Model version {models.version} published")
+        
+        removed = await asyncio.to_thread(self.prune)
+        if removed:
+            print(f"✅ Pruned {len(removed)} old model versions")
+    
+    def prune(self, keep: int = MODEL_VERSIONS_KEEP) -> List[str]:
+        """
+        Delete all but the newest keep version directories, never the active one
+        Version names sort by creation time. Returns the removed versions.
+        """
+        if keep <= 0:
+            return []
+        
+        active = self.active_version()
+        versions = sorted(
+            (name for name in os.listdir(self.versions_path)
+             if os.path.isdir(os.path.join(self.versions_path, name))),
+            reverse=True
+        )
+        removed = []
+        for version in versions[keep:]:
+            if version != active:
+                shutil.rmtree(os.path.join(self.versions_path, version), ignore_errors=True)
+                removed.append(version)
+        return removed
+    
+    async def watch(self):
+        """Background task swapping in versions published by other workers"""
+        while True:
+            await asyncio.sleep(MODEL_REFRESH_SECONDS)
+            try:
+                version = self.active_version()
+                if version and self._current is not None and version != self._current.version:
+                    async with self._lock:
+                        models = MLModels(os.path.join(self.versions_path, version), version)
+                        await models.load_models()
+                        self._current = models
+                    print(f"✅ Model version {version} hot-swapped")
+            except Exception as e:
+                print(f"❌ Error refreshing models: {e}")
+
+registry = ModelRegistry()
+
+def get_models() -> MLModels:
+    """Get the active models"""
+    return registry.current()
@@ -0,0 +1,117 @@
+"""
+Popular Recipes Leaderboard
+Top low-oil recipes by view count, kept in memory as pre-serialized JSON
+"""
+
+import asyncio
+import json
+import os
+from typing import Dict, List, Optional
+
+from app.database import get_database
+from app.recipe_index import recipe_index
+
+POPULAR_MAX_OIL_AMOUNT = 40  # ml
+POPULAR_RECIPES_CAP = int(os.getenv("POPULAR_RECIPES_CAP", 100))
+POPULAR_REFRESH_SECONDS = float(os.getenv("POPULAR_REFRESH_SECONDS", 60))
+
+POPULAR_FIELDS = {
+    "name": 1, "nameHindi": 1, "nameTamil": 1, "description": 1, "oilAmount": 1,
+    "cuisine": 1, "difficulty": 1, "cookingTime": 1, "imageUrl": 1, "viewCount": 1
+}
+
+def leaderboard_item(recipe: Dict) -> Dict:
+    """Response entry of a recipe"""
+    return {
+        "id": str(recipe["_id"]),
+        "name": recipe["name"],
+        "nameHindi": recipe.get("nameHindi", ""),
+        "nameTamil": recipe.get("nameTamil", ""),
+        "description": recipe["description"],
+        "oilAmount": recipe["oilAmount"],
+        "cuisine": recipe["cuisine"],
+        "difficulty": recipe["difficulty"],
+        "cookingTime": recipe["cookingTime"],
+        "imageUrl": recipe.get("imageUrl"),
+        "viewCount": recipe.get("viewCount", 0)
+    }
+
+def serialize(item: Dict) -> bytes:
+    """Compact JSON, as FastAPI's JSONResponse renders it"""
+    return json.dumps(item, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class PopularRecipes:
+    """
+    Top POPULAR_RECIPES_CAP recipes with oilAmount <= POPULAR_MAX_OIL_AMOUNT by viewCount
+    
+    Each entry is serialized once, so serving any limit up to the cap only joins bytes.
+    Recipe change events update the board in place. Removals that leave it short of the
+    cap, and periods without a change stream, are covered by a refresh every
+    POPULAR_REFRESH_SECONDS.
+    """
+    
+    def __init__(self):
+        self.items: List[Dict] = []
+        self.serialized: List[bytes] = []
+        self.stale = True
+        recipe_index.subscribe(self.handle_change)
+    
+    async def refresh(self):
+        """Reload the board from MongoDB (viewCount index, stops after the cap)"""
+        db = get_database()
+        recipes = await db.recipes.find(
+            {"oilAmount": {"$lte": POPULAR_MAX_OIL_AMOUNT}},
+            POPULAR_FIELDS
+        ).sort("viewCount", -1).limit(POPULAR_RECIPES_CAP).to_list(length=POPULAR_RECIPES_CAP)
+        
+        self._publish([leaderboard_item(recipe) for recipe in recipes])
+        self.stale = False
+    
+    def _publish(self, items: List[Dict]):
+        items.sort(key=lambda item: item["viewCount"], reverse=True)
+        self.items = items[:POPULAR_RECIPES_CAP]
+        self.serialized = [serialize(item) for item in self.items]
+    
+    async def get(self, limit: int) -> Optional[bytes]:
+        """JSON body of the top limit recipes, or None when there are none"""
+        if not self.serialized:
+            await self.refresh()
+        if not self.serialized:
+            return None
+        return b'{"recipes":[' + b",".join(self.serialized[:limit]) + b"]}"
+    
+    def handle_change(self, change: Dict):
+        """Fold a recipes change event into the board"""
+        recipe_id = str(change["documentKey"]["_id"])
+        recipe = change.get("fullDocument")
+        items = [item for item in self.items if item["id"] != recipe_id]
+        removed = len(items) < len(self.items)
+        
+        qualifies = (
+            recipe is not None
+            and recipe.get("oilAmount") is not None
+            and recipe["oilAmount"] <= POPULAR_MAX_OIL_AMOUNT
+        )
+        if qualifies:
+            item = leaderboard_item(recipe)
+            full = len(items) >= POPULAR_RECIPES_CAP
+            if removed or not full or item["viewCount"] > items[-1]["viewCount"]:
+                self._publish(items + [item])
+                return
+        
+        if removed:
+            # The board may now be missing a recipe below the old cut-off
+            self._publish(items)
+            self.stale = True
+    
+    async def refresh_loop(self):
+        """Background task refreshing the board when stale or without a change stream"""
+        while True:
+            try:
+                if self.stale or not recipe_index.watching:
+                    await self.refresh()
+            except Exception as e:
+                print(f"❌ Popular recipes refresh failed: {e}")
+            await asyncio.sleep(POPULAR_REFRESH_SECONDS)
+
+popular_recipes = PopularRecipes()
@@ -0,0 +1,83 @@
+"""
+Sampling Profiler
+On-demand stack sampling of the service's threads, reported as collapsed stacks for flame graphs
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict
+
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() == "true"
+PROFILER_MAX_SECONDS = float(os.getenv("PROFILER_MAX_SECONDS", 30))
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", 5))
+
+class ProfilerBusyError(RuntimeError):
+    """A profile is already being taken"""
+
+def frame_stack(frame) -> str:
+    """Collapsed stack of a frame, outermost call first"""
+    calls = []
+    while frame is not None:
+        code = frame.f_code
+        calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(calls))
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread (event loop, model executor, classifier batches)
+    at a fixed interval from a background thread
+    
+    Nothing runs between profiles, and sampling only reads frames, so the overhead is
+    one stack walk per thread per interval while a profile is taken. Work sent to
+    MODEL_EXECUTOR=process workers is not visible.
+    """
+    
+    def __init__(self):
+        self.running = False
+    
+    def sample(self, seconds: float, interval: float) -> Dict:
+        """Sample all threads other than this one for the given duration (blocking)"""
+        own_thread = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        
+        while time.perf_counter() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_thread:
+                    stacks[f"{names.get(thread_id, thread_id)};{frame_stack(frame)}"] += 1
+            samples += 1
+            time.sleep(interval)
+        
+        return {"samples": samples, "stacks": stacks}
+    
+    async def profile(self, seconds: float, interval_ms: float = PROFILER_INTERVAL_MS) -> Dict:
+        """Profile for seconds (capped at PROFILER_MAX_SECONDS); raises ProfilerBusyError if one is running"""
+        if self.running:
+            raise ProfilerBusyError("A profile is already being taken")
+        
+        self.running = True
+        try:
+            seconds = min(max(seconds, 0.1), PROFILER_MAX_SECONDS)
+            result = await asyncio.to_thread(self.sample, seconds, max(interval_ms, 1) / 1000)
+        finally:
+            self.running = False
+        
+        return {
+            "seconds": seconds,
+            "interval_ms": interval_ms,
+            "samples": result["samples"],
+            "stacks": result["stacks"]
+        }
+
+def collapsed(profile: Dict) -> str:
+    """Profile as "stack count" lines, the input format of flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+profiler = SamplingProfiler()
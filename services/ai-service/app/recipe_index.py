@@ -0,0 +1,181 @@
+"""
+Recipe Index
+In-memory projection of the full recipe catalog, kept current from MongoDB, for filtering and scoring
+"""
+
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.database import get_database
+from app.models.recipe_features import RecipeFeatures
+from app.executor import model_executor
+
+RECIPE_INDEX_REFRESH_SECONDS = float(os.getenv("RECIPE_INDEX_REFRESH_SECONDS", 300))
+
+# Only what filtering and scoring need; full documents are fetched for the final top-k
+RECIPE_INDEX_FIELDS = {"oilAmount": 1, "tags": 1, "cuisine": 1, "difficulty": 1}
+
+def project_recipe(recipe: Dict) -> Dict:
+    """Index entry of a recipe document"""
+    entry = {field: recipe[field] for field in RECIPE_INDEX_FIELDS if field in recipe}
+    entry["_id"] = recipe["_id"]
+    entry["id"] = str(recipe["_id"])
+    return entry
+
+def changed_fields(change: Dict) -> Optional[List[str]]:
+    """Top-level fields changed by an update event; None when the whole document may have changed"""
+    description = change.get("updateDescription")
+    if description is None:
+        return None
+    changed = list(description.get("updatedFields", {})) + list(description.get("removedFields", []))
+    return [field.split(".")[0] for field in changed]
+
+def touches_index(change: Dict) -> bool:
+    """Whether an update event changes any indexed field (view count bumps don't)"""
+    fields = changed_fields(change)
+    return fields is None or any(field in RECIPE_INDEX_FIELDS for field in fields)
+
+class RecipeIndex:
+    """
+    Projected entries of every recipe plus the feature matrix built from them
+    
+    A change stream on recipes applies inserts, updates and deletes one document at a
+    time; without one (standalone MongoDB) the projection is reloaded every
+    RECIPE_INDEX_REFRESH_SECONDS. The matrix is rebuilt lazily on the first read after
+    a change, so a burst of edits costs one rebuild. The build runs off the event loop;
+    a matrix whose entries changed while it was being built is not kept. Other
+    in-process views of the catalog subscribe to the same change events.
+    
+    version increases whenever recipe content may have changed (anything but a view
+    count bump), so results derived from the catalog can be cached against it.
+    """
+    
+    def __init__(self):
+        self.entries: Dict[str, Dict] = {}
+        self.version = 0
+        self.handlers: List[Callable[[Dict], None]] = []
+        self.watching = False
+        self._loaded = False
+        self._features: Optional[RecipeFeatures] = None
+        self._generation = 0  # Bumped whenever entries change, so builds can detect they are stale
+        self._lock = asyncio.Lock()
+    
+    def is_loaded(self) -> bool:
+        """Check if the catalog has been loaded"""
+        return self._loaded
+    
+    async def load(self):
+        """Replace the index with a fresh projection of the whole catalog"""
+        db = get_database()
+        entries = {}
+        async for recipe in db.recipes.find({}, RECIPE_INDEX_FIELDS):
+            entry = project_recipe(recipe)
+            entries[entry["id"]] = entry
+        
+        self.entries = entries
+        self._invalidate()
+        self._loaded = True
+        self.version += 1
+    
+    async def features(self) -> RecipeFeatures:
+        """Feature matrix of the current catalog, loading or rebuilding it if needed"""
+        async with self._lock:
+            if not self._loaded:
+                await self.load()
+            if self._features is not None:
+                return self._features
+            
+            generation = self._generation
+            features = await model_executor.run(RecipeFeatures.from_recipes, list(self.entries.values()))
+            if generation == self._generation:
+                self._features = features
+            # Otherwise entries changed during the build: serve this matrix once, rebuild on the next read
+            return features
+    
+    def _invalidate(self):
+        self._features = None
+        self._generation += 1
+    
+    def subscribe(self, handler: Callable[[Dict], None]):
+        """Register a handler called with every recipes change event"""
+        self.handlers.append(handler)
+    
+    def apply_change(self, change: Dict):
+        """Apply one recipes change event"""
+        if changed_fields(change) != ["viewCount"]:
+            self.version += 1
+        if change["operationType"] == "update" and not touches_index(change):
+            return
+        if change["operationType"] == "delete":
+            self.entries.pop(str(change["documentKey"]["_id"]), None)
+        elif change.get("fullDocument") is not None:
+            entry = project_recipe(change["fullDocument"])
+            self.entries[entry["id"]] = entry
+        else:
+            return
+        self._invalidate()
+    
+    def match(self, features: RecipeFeatures, filters: Optional[Dict[str, Any]],
+              dietary_habit: Optional[str] = None) -> np.ndarray:
+        """
+        Rows passing the request filters (cuisine, difficulty, maxOilAmount) and, for
+        vegetarian/vegan users, carrying their dietary tag
+        Answered from the matrix's inverted bitmap index without a database query
+        """
+        filters = filters or {}
+        max_oil_amount = filters.get("maxOilAmount")
+        
+        return features.filters.match(
+            tags=[dietary_habit] if dietary_habit in ["vegetarian", "vegan"] else [],
+            cuisine=filters.get("cuisine"),
+            difficulty=filters.get("difficulty"),
+            max_oil_amount=float(max_oil_amount) if max_oil_amount is not None else None
+        )
+    
+    async def fetch(self, recipe_ids: List[str]) -> Dict[str, Dict]:
+        """Full documents of the given recipes, by id; recipes deleted meanwhile are missing"""
+        object_ids = [self.entries[recipe_id]["_id"] for recipe_id in recipe_ids if recipe_id in self.entries]
+        if not object_ids:
+            return {}
+        
+        db = get_database()
+        recipes = await db.recipes.find({"_id": {"$in": object_ids}}).to_list(length=len(object_ids))
+        return {str(recipe["_id"]): recipe for recipe in recipes}
+    
+    async def watch(self):
+        """Background task following recipe changes, or reloading periodically without a change stream"""
+        db = get_database()
+        
+        try:
+            async with db.recipes.watch(full_document="updateLookup") as stream:
+                self.watching = True
+                await self.load()  # Changes before the stream opened
+                print("✅ Watching recipe changes")
+                async for change in stream:
+                    self.apply_change(change)
+                    for handler in self.handlers:
+                        try:
+                            handler(change)
+                        except Exception as e:
+                            print(f"❌ Error handling recipe change: {e}")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️  recipes change stream unavailable, reloading periodically: {e}")
+        finally:
+            self.watching = False
+        
+        if RECIPE_INDEX_REFRESH_SECONDS <= 0:
+            return
+        
+        while True:
+            await asyncio.sleep(RECIPE_INDEX_REFRESH_SECONDS)
+            try:
+                await self.load()
+            except Exception as e:
+                print(f"❌ Recipe index reload failed: {e}")
+
+recipe_index = RecipeIndex()
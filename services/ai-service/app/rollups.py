@@ -0,0 +1,313 @@
+"""
+Daily Rollups
+Per-user and per-region daily totals of oil_logs, maintained incrementally and backfilled in batches
+
+oil_log_daily:  {userId, day, region, total, count}
+region_daily:   {region, day, total, count, hll}  (hll: active user sketch, see app.hll)
+user_activity:  {userId, region, last_day}
+"""
+
+import asyncio
+import os
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.cache import LRUCache
+from app.database import get_database
+from app.hll import HyperLogLog, sketch_update
+
+ROLLUP_UPDATER = os.getenv("ROLLUP_UPDATER", "true").lower() == "true"
+ROLLUP_LEASE_SECONDS = float(os.getenv("ROLLUP_LEASE_SECONDS", 30))
+ROLLUP_BACKFILL_BATCH_DAYS = int(os.getenv("ROLLUP_BACKFILL_BATCH_DAYS", 7))
+ROLLUP_LIVE_CHECK_SECONDS = float(os.getenv("ROLLUP_LIVE_CHECK_SECONDS", 5))
+
+class LeaseLostError(RuntimeError):
+    """Another worker holds the updater lease"""
+
+def day_of(value: datetime) -> datetime:
+    """Midnight (UTC, naive like MongoDB dates) of the day a timestamp falls on"""
+    return datetime(value.year, value.month, value.day)
+
+class RollupUpdater:
+    """
+    Keeps the rollup collections in step with oil_logs
+    
+    Rollups use $inc, so exactly one worker may apply each change: workers compete for a
+    lease in rollup_state and only the holder reads the change stream, resuming from the
+    stored token after a failover. Each change is applied in the same transaction that
+    stores its resume token, so a replayed change is never counted twice. Inserts are
+    folded in directly; updates recompute the affected user-day from raw logs. Deletes
+    carry no user or date, so they are corrected by backfilling the affected range.
+    
+    While the stream is open the holder keeps streaming_until ahead of the clock; readers
+    use it (rollups_live) to tell whether the rollups are being kept up to date.
+    """
+    
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.regions = LRUCache(100000, ttl=3600)
+    
+    async def acquire_lease(self, streaming: bool = False) -> Optional[Dict]:
+        """Take or renew the updater lease; returns the state document when held"""
+        db = get_database()
+        now = datetime.now()
+        lease_expires = now + timedelta(seconds=ROLLUP_LEASE_SECONDS)
+        update = {"owner": self.owner, "lease_expires": lease_expires}
+        if streaming:
+            update["streaming_until"] = lease_expires
+        try:
+            return await db.rollup_state.find_one_and_update(
+                {"_id": "oil_logs", "$or": [{"owner": self.owner}, {"lease_expires": {"$lt": now}}]},
+                {"$set": update},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            return None  # Held by another worker
+    
+    async def user_region(self, user_id: str) -> Optional[str]:
+        """Region of a user at write time"""
+        region = self.regions.get(user_id, default=False)
+        if region is False:
+            db = get_database()
+            user = await db.users.find_one({"userId": user_id}, {"region": 1})
+            region = user.get("region") if user else None
+            self.regions.set(user_id, region)
+        return region
+    
+    async def apply_insert(self, log: Dict, session=None):
+        """Fold one new log into both rollups"""
+        db = get_database()
+        day = day_of(log["date"])
+        region = await self.user_region(log["userId"])
+        
+        await db.oil_log_daily.update_one(
+            {"userId": log["userId"], "day": day},
+            {"$inc": {"total": log["amount"], "count": 1}, "$setOnInsert": {"region": region}},
+            upsert=True,
+            session=session
+        )
+        await db.region_daily.update_one(
+            {"region": region, "day": day},
+            {"$inc": {"total": log["amount"], "count": 1}, "$max": sketch_update(log["userId"])},
+            upsert=True,
+            session=session
+        )
+        await db.user_activity.update_one(
+            {"userId": log["userId"]},
+            {"$max": {"last_day": day}, "$set": {"region": region}},
+            upsert=True,
+            session=session
+        )
+    
+    async def recompute_user_day(self, user_id: str, day: datetime, session=None):
+        """Rebuild one user-day from raw logs and shift its region row by the difference"""
+        db = get_database()
+        result = await db.oil_logs.aggregate([
+            {"$match": {"userId": user_id, "date": {"$gte": day, "$lt": day + timedelta(days=1)}}},
+            {"$group": {"_id": None, "total": {"$sum": "$amount"}, "count": {"$sum": 1}}}
+        ], session=session).to_list(length=1)
+        total, count = (result[0]["total"], result[0]["count"]) if result else (0, 0)
+        
+        previous = await db.oil_log_daily.find_one({"userId": user_id, "day": day}, session=session)
+        region = previous["region"] if previous else await self.user_region(user_id)
+        old_total, old_count = (previous["total"], previous["count"]) if previous else (0, 0)
+        
+        if count:
+            await db.oil_log_daily.update_one(
+                {"userId": user_id, "day": day},
+                {"$set": {"total": total, "count": count, "region": region}},
+                upsert=True,
+                session=session
+            )
+            await db.user_activity.update_one(
+                {"userId": user_id},
+                {"$max": {"last_day": day}, "$setOnInsert": {"region": region}},
+                upsert=True,
+                session=session
+            )
+        else:
+            await db.oil_log_daily.delete_one({"userId": user_id, "day": day}, session=session)
+        
+        region_update = {"$inc": {"total": total - old_total, "count": count - old_count}}
+        if count:
+            region_update["$max"] = sketch_update(user_id)
+        await db.region_daily.update_one({"region": region, "day": day}, region_update, upsert=True, session=session)
+    
+    async def handle_change(self, change: Dict, session=None):
+        """Apply one oil_logs change event"""
+        document = change.get("fullDocument")
+        if change["operationType"] == "insert":
+            await self.apply_insert(document, session)
+        elif document is not None:
+            # The previous date is unknown, so rebuild the day the log is on now
+            await self.recompute_user_day(document["userId"], day_of(document["date"]), session)
+    
+    async def apply_change(self, change: Dict):
+        """
+        Apply one change event and store its resume token in one transaction
+        Raises LeaseLostError (and applies nothing) if another worker has taken the lease
+        """
+        db = get_database()
+        
+        async def apply(session):
+            await self.handle_change(change, session)
+            result = await db.rollup_state.update_one(
+                {"_id": "oil_logs", "owner": self.owner},
+                {"$set": {"resume_token": change["_id"]}},
+                session=session
+            )
+            if result.matched_count == 0:
+                raise LeaseLostError("Rollup updater lease taken by another worker")
+        
+        # Change streams need a replica set, so transactions are always available here
+        async with await db.client.start_session() as session:
+            await session.with_transaction(apply)
+    
+    async def run(self):
+        """Background task: hold the lease and apply the change stream"""
+        if not ROLLUP_UPDATER:
+            return
+        
+        db = get_database()
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace"]}}}]
+        
+        while True:
+            try:
+                state = await self.acquire_lease()
+                if state is None:
+                    await asyncio.sleep(ROLLUP_LEASE_SECONDS / 2)
+                    continue
+                
+                async with db.oil_logs.watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    resume_after=state.get("resume_token"),
+                    max_await_time_ms=int(ROLLUP_LEASE_SECONDS * 250)
+                ) as stream:
+                    print("✅ Rollup updater active")
+                    while stream.alive:
+                        if await self.acquire_lease(streaming=True) is None:
+                            break  # Lease lost, another worker took over
+                        change = await stream.try_next()
+                        if change is not None:
+                            await self.apply_change(change)
+            except asyncio.CancelledError:
+                raise
+            except LeaseLostError:
+                continue
+            except Exception as e:
+                print(f"⚠️  Rollup updater stopped, retrying: {e}")
+                await asyncio.sleep(ROLLUP_LEASE_SECONDS)
+
+rollup_status = LRUCache(1, ttl=ROLLUP_LIVE_CHECK_SECONDS)
+
+async def rollups_live() -> bool:
+    """
+    Whether some worker is applying the oil_logs change stream to the rollups right now
+    
+    False on a standalone MongoDB (no change streams) or with ROLLUP_UPDATER=false on every
+    worker; readers then fall back to raw oil_logs. Checked at most every
+    ROLLUP_LIVE_CHECK_SECONDS.
+    """
+    live = rollup_status.get("live")
+    if live is None:
+        db = get_database()
+        state = await db.rollup_state.find_one({"_id": "oil_logs"}, {"streaming_until": 1})
+        live = bool(state and state.get("streaming_until") and state["streaming_until"] > datetime.now())
+        rollup_status.set("live", live)
+    return live
+
+async def backfill_rollups(start_date: datetime, end_date: datetime) -> Dict:
+    """
+    Rebuild both rollups for [start_date, end_date], ROLLUP_BACKFILL_BATCH_DAYS days at a time
+    Each batch replaces its days with values aggregated from raw logs
+    """
+    db = get_database()
+    day = day_of(start_date)
+    last_day = day_of(end_date)
+    batches = 0
+    
+    while day <= last_day:
+        batch_end = min(day + timedelta(days=ROLLUP_BACKFILL_BATCH_DAYS), last_day + timedelta(days=1))
+        
+        await db.oil_log_daily.delete_many({"day": {"$gte": day, "$lt": batch_end}})
+        await db.oil_logs.aggregate([
+            {"$match": {"date": {"$gte": day, "$lt": batch_end}}},
+            {"$group": {
+                "_id": {
+                    "userId": "$userId",
+                    "day": {"$dateFromString": {
+                        "dateString": {"$dateToString": {"format": "%Y-%m-%d", "date": "$date"}}
+                    }}
+                },
+                "total": {"$sum": "$amount"},
+                "count": {"$sum": 1}
+            }},
+            {"$lookup": {
+                "from": "users",
+                "localField": "_id.userId",
+                "foreignField": "userId",
+                "as": "user"
+            }},
+            {"$project": {
+                "_id": 0,
+                "userId": "$_id.userId",
+                "day": "$_id.day",
+                "region": {"$ifNull": [{"$first": "$user.region"}, None]},
+                "total": 1,
+                "count": 1
+            }},
+            {"$merge": {"into": "oil_log_daily", "on": ["userId", "day"], "whenMatched": "replace"}}
+        ], allowDiskUse=True).to_list(length=None)
+        
+        await db.region_daily.delete_many({"day": {"$gte": day, "$lt": batch_end}})
+        await db.oil_log_daily.aggregate([
+            {"$match": {"day": {"$gte": day, "$lt": batch_end}}},
+            {"$group": {
+                "_id": {"region": "$region", "day": "$day"},
+                "total": {"$sum": "$total"},
+                "count": {"$sum": "$count"}
+            }},
+            {"$project": {"_id": 0, "region": "$_id.region", "day": "$_id.day", "total": 1, "count": 1}},
+            {"$merge": {"into": "region_daily", "on": ["region", "day"], "whenMatched": "replace"}}
+        ], allowDiskUse=True).to_list(length=None)
+        
+        # Sketches need a stable hash of userId, which aggregation can't compute
+        sketches: Dict[tuple, HyperLogLog] = {}
+        async for row in db.oil_log_daily.find(
+            {"day": {"$gte": day, "$lt": batch_end}},
+            {"_id": 0, "userId": 1, "region": 1, "day": 1}
+        ):
+            sketches.setdefault((row.get("region"), row["day"]), HyperLogLog()).add(row["userId"])
+        if sketches:
+            await db.region_daily.bulk_write([
+                UpdateOne({"region": region, "day": sketch_day}, {"$set": {"hll": sketch.to_document()}})
+                for (region, sketch_day), sketch in sketches.items()
+            ], ordered=False)
+        
+        await db.oil_log_daily.aggregate([
+            {"$match": {"day": {"$gte": day, "$lt": batch_end}}},
+            {"$sort": {"day": 1}},
+            {"$group": {"_id": "$userId", "last_day": {"$last": "$day"}, "region": {"$last": "$region"}}},
+            {"$project": {"_id": 0, "userId": "$_id", "last_day": 1, "region": 1}},
+            {"$merge": {
+                "into": "user_activity",
+                "on": "userId",
+                "whenMatched": [{"$set": {
+                    "region": {"$cond": [{"$gte": ["$$new.last_day", "$last_day"]}, "$$new.region", "$region"]},
+                    "last_day": {"$max": ["$last_day", "$$new.last_day"]}
+                }}]
+            }}
+        ], allowDiskUse=True).to_list(length=None)
+        
+        batches += 1
+        day = batch_end
+    
+    return {"start_day": day_of(start_date), "end_day": last_day, "batches": batches}
+
+rollup_updater = RollupUpdater()
@@ -3,64 +3,97 @@ Insights Router
 Provides AI-driven insights and analytics
 """
 
-from fastapi import APIRouter, HTTPException, status
-from datetime import datetime, timedelta
+from fastapi import APIRouter, HTTPException, Query, status
+from datetime import datetime, date
+from typing import Dict, Optional
+import asyncio
+import os
 import statistics
 
-from app.schemas import InsightRequest, InsightResponse
+from app.schemas import InsightRequest, InsightResponse, json_response
 from app.database import get_database
+from app.cache import LRUCache
+from app.insights_engine import fetch_user_insight_summary, fetch_region_active_users, period_bounds
+from app.snapshots import national_snapshot
+from app.rollups import backfill_rollups
+from app.log_events import log_events, rollup_events, changed_user_id
+from app.metrics import span, record_cache_lookup
 
 router = APIRouter()
 
 ICMR_MONTHLY_LIMIT = 1000  # ml per person per month
+INSIGHT_PERIODS = ("week", "month", "quarter", "year")
+
+# Results keyed by (userId, period, day); dropped when the user logs oil and again once the log
+# reaches the rollups (applied later, by the lease holder), TTL covers missed events
+insights_cache = LRUCache(
+    int(os.getenv("INSIGHTS_CACHE_SIZE", 50000)),
+    ttl=float(os.getenv("INSIGHTS_CACHE_TTL_SECONDS", 300))
+)
+
+async def invalidate_user_insights(change: Dict):
+    """Drop cached insights of the user whose oil logs or daily rollups changed"""
+    user_id = changed_user_id(change)
+    if user_id is None:
+        # Deletes don't say whose log it was
+        insights_cache.clear()
+        return
+    
+    today = date.today()
+    for period in INSIGHT_PERIODS:
+        insights_cache.delete((user_id, period, today))
+
+log_events.subscribe(invalidate_user_insights)
+rollup_events.subscribe(invalidate_user_insights)
 
 @router.post("/user", response_model=InsightResponse)
 async def get_user_insights(request: InsightRequest):
     """
     Get AI-driven insights for a user's consumption patterns
     """
+    cache_key = (request.userId, request.period, date.today())
+    cached = insights_cache.get(cache_key)
+    record_cache_lookup("insights.user", cached is not None)
+    if cached is not None:
+        return json_response(cached)
+    
     try:
         db = get_database()
         
-        # Fetch user profile
-        user = await db.users.find_one({"userId": request.userId})
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
-        
-        family_size = user.get("familySize", 1)
-        
-        # Calculate date range based on period
-        end_date = datetime.now()
+        # Period is whole days, today included
         if request.period == "week":
-            start_date = end_date - timedelta(days=7)
             days_in_period = 7
         elif request.period == "month":
-            start_date = end_date - timedelta(days=30)
             days_in_period = 30
         elif request.period == "quarter":
-            start_date = end_date - timedelta(days=90)
             days_in_period = 90
         else:  # year
-            start_date = end_date - timedelta(days=365)
             days_in_period = 365
+        start_date, end_date = period_bounds(days_in_period)
         
-        # Fetch oil logs for period
-        oil_logs = await db.oil_logs.find({
-            "userId": request.userId,
-            "date": {"$gte": start_date, "$lte": end_date}
-        }).sort("date", 1).to_list(length=None)
+        # Fetch user profile and the period summary (one aggregation) concurrently
+        with span("insights.user", "db_fetch"):
+            user, summary = await asyncio.gather(
+                db.users.find_one({"userId": request.userId}),
+                fetch_user_insight_summary(request.userId, start_date, end_date)
+            )
         
-        if len(oil_logs) == 0:
+        if not user:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found"
+            )
+        
+        if summary is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"No consumption data found for the {request.period}"
             )
         
+        family_size = user.get("familySize", 1)
+        
         # Calculate total consumption
-        total_consumption = sum(log["amount"] for log in oil_logs)
+        total_consumption = summary["total"]
         average_daily = total_consumption / days_in_period
         
         # Calculate ICMR comparison
@@ -76,10 +109,9 @@ async def get_user_insights(request: InsightRequest):
             health_status = "healthy"
         
         # Calculate trend
-        if len(oil_logs) >= 14:
-            mid_point = len(oil_logs) // 2
-            first_half_avg = sum(log["amount"] for log in oil_logs[:mid_point]) / mid_point
-            second_half_avg = sum(log["amount"] for log in oil_logs[mid_point:]) / (len(oil_logs) - mid_point)
+        if summary["count"] >= 14:
+            first_half_avg = summary["first_half_avg"]
+            second_half_avg = summary["second_half_avg"]
             
             change_percentage = ((second_half_avg - first_half_avg) / first_half_avg) * 100
             
@@ -92,16 +124,8 @@ async def get_user_insights(request: InsightRequest):
         else:
             trend = "stable"
         
-        # Find peak consumption days
-        daily_consumption = {}
-        for log in oil_logs:
-            date_str = log["date"].strftime("%Y-%m-%d") if hasattr(log["date"], "strftime") else str(log["date"])[:10]
-            if date_str not in daily_consumption:
-                daily_consumption[date_str] = 0
-            daily_consumption[date_str] += log["amount"]
-        
-        peak_days = sorted(daily_consumption.items(), key=lambda x: x[1], reverse=True)[:3]
-        peak_consumption_days = [f"{day[0]} ({day[1]:.0f}ml)" for day in peak_days]
+        # Peak consumption days
+        peak_consumption_days = [f"{day} ({total:.0f}ml)" for day, total in summary["peak_days"]]
         
         # Generate recommendations
         recommendations = []
@@ -123,8 +147,8 @@ async def get_user_insights(request: InsightRequest):
         elif trend == "decreasing":
             recommendations.append("📉 Great progress! You're successfully reducing oil consumption.")
         
-        # Fetch user achievements
-        rewards = await db.rewards.find_one({"userId": request.userId})
+        # User achievements
+        rewards = summary["rewards"]
         achievements = []
         
         if rewards:
@@ -134,19 +158,24 @@ async def get_user_insights(request: InsightRequest):
             if rewards.get("currentStreak", 0) >= 7:
                 achievements.append(f"🔥 {rewards['currentStreak']}-day logging streak!")
         
-        return InsightResponse(
-            userId=request.userId,
-            period=request.period,
-            total_consumption=round(total_consumption, 2),
-            average_daily=round(average_daily, 2),
-            trend=trend,
-            health_status=health_status,
-            comparison_to_average=round(comparison_percentage, 2),
-            peak_consumption_days=peak_consumption_days,
-            recommendations=recommendations,
-            achievements=achievements,
-            generated_at=datetime.now()
-        )
+        with span("insights.user", "response"):
+            response = InsightResponse(
+                userId=request.userId,
+                period=request.period,
+                total_consumption=round(total_consumption, 2),
+                average_daily=round(average_daily, 2),
+                trend=trend,
+                health_status=health_status,
+                comparison_to_average=round(comparison_percentage, 2),
+                peak_consumption_days=peak_consumption_days,
+                recommendations=recommendations,
+                achievements=achievements,
+                generated_at=datetime.now()
+            )
+            rendered = json_response(response)
+        
+        insights_cache.set(cache_key, response)
+        return rendered
         
     except HTTPException:
         raise
@@ -156,84 +185,30 @@ async def get_user_insights(request: InsightRequest):
             detail=f"Failed to generate insights: {str(e)}"
         )
 
+@router.get("/cache/stats")
+async def get_insights_cache_stats():
+    """
+    Hit/miss counters of the user insights cache
+    """
+    return {
+        "user_insights": insights_cache.stats(),
+        "invalidation": "change_stream" if log_events.watching else "ttl"
+    }
+
 @router.get("/national")
-async def get_national_insights():
+async def get_national_insights(refresh: bool = Query(False)):
     """
     Get national-level consumption insights
+    Served from a periodically refreshed snapshot; refresh=true rebuilds it first
     Admin endpoint
     """
     try:
-        db = get_database()
-        
-        # Get total users
-        total_users = await db.users.count_documents({})
-        
-        # Get consumption data from last 30 days
-        thirty_days_ago = datetime.now() - timedelta(days=30)
-        
-        pipeline = [
-            {"$match": {"date": {"$gte": thirty_days_ago}}},
-            {"$group": {
-                "_id": None,
-                "total_consumption": {"$sum": "$amount"},
-                "avg_consumption": {"$avg": "$amount"},
-                "log_count": {"$sum": 1}
-            }}
-        ]
-        
-        result = await db.oil_logs.aggregate(pipeline).to_list(length=1)
-        
-        if not result:
-            return {
-                "message": "No consumption data available",
-                "total_users": total_users
-            }
-        
-        stats = result[0]
-        
-        # Get regional breakdown
-        regional_pipeline = [
-            {"$match": {"date": {"$gte": thirty_days_ago}}},
-            {"$lookup": {
-                "from": "users",
-                "localField": "userId",
-                "foreignField": "userId",
-                "as": "user"
-            }},
-            {"$unwind": "$user"},
-            {"$group": {
-                "_id": "$user.region",
-                "total_consumption": {"$sum": "$amount"},
-                "user_count": {"$addToSet": "$userId"}
-            }},
-            {"$project": {
-                "region": "$_id",
-                "total_consumption": 1,
-                "user_count": {"$size": "$user_count"},
-                "avg_per_user": {"$divide": ["$total_consumption", {"$size": "$user_count"}]}
-            }},
-            {"$sort": {"total_consumption": -1}}
-        ]
-        
-        regional_data = await db.oil_logs.aggregate(regional_pipeline).to_list(length=None)
+        snapshot = await national_snapshot.get(refresh=refresh)
         
         return {
-            "total_users": total_users,
-            "last_30_days": {
-                "total_consumption_liters": round(stats["total_consumption"] / 1000, 2),
-                "average_per_log_ml": round(stats["avg_consumption"], 2),
-                "total_logs": stats["log_count"]
-            },
-            "regional_breakdown": [
-                {
-                    "region": region["region"],
-                    "total_consumption_ml": round(region["total_consumption"], 2),
-                    "active_users": region["user_count"],
-                    "avg_per_user_ml": round(region["avg_per_user"], 2)
-                }
-                for region in regional_data
-            ],
-            "generated_at": datetime.now().isoformat()
+            **snapshot,
+            "generated_at": snapshot["generated_at"].isoformat(),
+            "staleness_seconds": round((datetime.now() - snapshot["generated_at"]).total_seconds(), 1)
         }
         
     except Exception as e:
@@ -241,3 +216,71 @@ async def get_national_insights():
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate national insights: {str(e)}"
         )
+
+@router.get("/regions/active-users")
+async def get_region_active_users(
+    start_date: date = Query(...),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Approximate distinct active users per region over any date range (default: through today)
+    Estimates are within about 3.3% of the exact count 95% of the time
+    Admin endpoint
+    """
+    end_date = end_date or date.today()
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    
+    try:
+        regions = await fetch_region_active_users(
+            datetime.combine(start_date, datetime.min.time()),
+            datetime.combine(end_date, datetime.min.time())
+        )
+        return {
+            "start_date": start_date.isoformat(),
+            "end_date": end_date.isoformat(),
+            "regions": regions,
+            "approximate": True
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to count active users: {str(e)}"
+        )
+
+@router.post("/rollups/backfill")
+async def backfill_daily_rollups(
+    start_date: date = Query(...),
+    end_date: Optional[date] = Query(None)
+):
+    """
+    Rebuild the daily oil log rollups from raw logs for a date range (default: through today)
+    Admin endpoint
+    """
+    end_date = end_date or date.today()
+    if end_date < start_date:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="end_date must not be before start_date"
+        )
+    
+    try:
+        result = await backfill_rollups(
+            datetime.combine(start_date, datetime.min.time()),
+            datetime.combine(end_date, datetime.min.time())
+        )
+        insights_cache.clear()
+        return {
+            "message": "Rollups rebuilt",
+            "start_date": result["start_day"].date().isoformat(),
+            "end_date": result["end_day"].date().isoformat(),
+            "batches": result["batches"]
+        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to backfill rollups: {str(e)}"
+        )
@@ -3,16 +3,20 @@ Predictions Router
 Handles oil consumption predictions
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, status
 from datetime import datetime
 from typing import List
 
-from app.schemas import PredictionRequest, PredictionResponse
+from app.schemas import PredictionRequest, PredictionResponse, BatchPredictionRequest, BatchPredictionResponse, json_response
 from app.database import get_database
-from app.models.ml_models import MLModels
+from app.models.registry import get_models
+from app.feature_store import feature_store
+from app.forecasting import find_active_user_ids, run_batch_forecast
+from app.jobs import training_jobs, JobConflictError
+from app.executor import model_executor, ExecutorBusyError
+from app.metrics import span
 
 router = APIRouter()
-ml_models = MLModels()
 
 @router.post("/consumption", response_model=PredictionResponse)
 async def predict_consumption(request: PredictionRequest):
@@ -21,37 +25,27 @@ async def predict_consumption(request: PredictionRequest):
     """
     try:
         db = get_database()
+        ml_models = get_models()
         
         # Fetch user profile
-        user = await db.users.find_one({"userId": request.userId})
+        with span("predictions.consumption", "db_fetch"):
+            user = await db.users.find_one({"userId": request.userId})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        # Fetch oil logs
-        oil_logs = await db.oil_logs.find(
-            {"userId": request.userId}
-        ).sort("date", -1).limit(90).to_list(length=90)
+        # Fetch compact feature state instead of the raw log history
+        with span("predictions.consumption", "features"):
+            feature_state = await feature_store.get(request.userId)
         
-        if len(oil_logs) < 3:
+        if feature_state["log_count"] < 3:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Insufficient data for prediction. Need at least 3 days of oil logs."
             )
         
-        # Convert MongoDB documents to dicts
-        oil_logs = [
-            {
-                "userId": log["userId"],
-                "amount": log["amount"],
-                "date": log["date"].isoformat() if hasattr(log["date"], "isoformat") else log["date"],
-                "oilType": log.get("oilType", "other")
-            }
-            for log in oil_logs
-        ]
-        
         user_profile = {
             "familySize": user.get("familySize", 1),
             "age": user.get("age", 30),
@@ -59,13 +53,14 @@ async def predict_consumption(request: PredictionRequest):
             "healthConditions": user.get("healthConditions", [])
         }
         
-        # Make prediction
-        predictions, confidence = await ml_models.predict_consumption(
-            request.userId,
-            oil_logs,
-            user_profile,
-            request.days_ahead
-        )
+        # Make prediction (includes the wait for an executor worker)
+        with span("predictions.consumption", "predict"):
+            predictions, confidence = await model_executor.try_run(
+                ml_models.predict_consumption_from_state,
+                feature_state,
+                user_profile,
+                request.days_ahead
+            )
         
         # Generate recommendations based on prediction
         total_predicted = sum(p["predicted_amount"] for p in predictions)
@@ -86,75 +81,113 @@ async def predict_consumption(request: PredictionRequest):
             recommendations.append("✅ Great! Your predicted consumption is within healthy limits")
             recommendations.append("💡 Keep up the good work!")
         
-        return PredictionResponse(
-            userId=request.userId,
-            predictions=predictions,
-            confidence=round(confidence, 2),
-            recommendations=recommendations,
-            generated_at=datetime.now()
-        )
+        with span("predictions.consumption", "response"):
+            return json_response(PredictionResponse(
+                userId=request.userId,
+                predictions=predictions,
+                confidence=round(confidence, 2),
+                recommendations=recommendations,
+                generated_at=datetime.now()
+            ))
         
     except HTTPException:
         raise
+    except ExecutorBusyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Prediction failed: {str(e)}"
         )
 
-@router.post("/train")
-async def train_model():
+@router.post("/consumption/batch", response_model=BatchPredictionResponse)
+async def predict_consumption_batch(request: BatchPredictionRequest):
     """
-    Train the consumption prediction model with all available data
+    Predict future oil consumption for many users in one call
+    Omitting userIds forecasts every active user (optionally limited to a region)
     Admin endpoint - should be protected in production
     """
     try:
-        db = get_database()
-        
-        # Fetch all users
-        users = await db.users.find().to_list(length=None)
-        user_profiles = {user["userId"]: user for user in users}
-        
-        # Fetch all oil logs grouped by user
-        training_data = {}
-        for user_id in user_profiles.keys():
-            logs = await db.oil_logs.find(
-                {"userId": user_id}
-            ).sort("date", 1).to_list(length=None)
-            
-            if len(logs) >= 7:  # Need at least a week of data
-                training_data[user_id] = [
-                    {
-                        "userId": log["userId"],
-                        "amount": log["amount"],
-                        "date": log["date"].isoformat() if hasattr(log["date"], "isoformat") else log["date"],
-                        "oilType": log.get("oilType", "other")
-                    }
-                    for log in logs
-                ]
-        
-        if len(training_data) < 10:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail=f"Insufficient training data. Need at least 10 users with 7+ days of logs. Found: {len(training_data)}"
-            )
+        user_ids = request.userIds
+        if user_ids is None:
+            user_ids = await find_active_user_ids(request.region)
+        
+        summary = await run_batch_forecast(
+            get_models(),
+            list(dict.fromkeys(user_ids)),
+            request.days_ahead,
+            request.persist
+        )
         
-        # Train model
-        metrics = await ml_models.train_consumption_model(training_data, user_profiles)
+        return BatchPredictionResponse(
+            **summary,
+            generated_at=datetime.now()
+        )
         
-        return {
-            "status": "success",
-            "message": "Model trained successfully",
-            "metrics": metrics,
-            "training_samples": sum(len(logs) for logs in training_data.values()),
-            "users_count": len(training_data),
-            "trained_at": datetime.now().isoformat()
-        }
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Batch prediction failed: {str(e)}"
+        )
+
+@router.post("/train", status_code=status.HTTP_202_ACCEPTED)
+async def train_model(mode: str = Query("full", pattern="^(full|incremental)$")):
+    """
+    Start training the consumption prediction model in the background
+    full: rebuild from all available data
+    incremental: fold in only oil logs created since the last training
+    Returns the job at once; poll GET /train/jobs/{job_id} for progress and the result
+    Admin endpoint - should be protected in production
+    """
+    try:
+        return await training_jobs.start("consumption", mode)
         
-    except HTTPException:
-        raise
+    except JobConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "job_id": e.job_id}
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Training failed: {str(e)}"
+            detail=f"Failed to start training: {str(e)}"
+        )
+
+@router.get("/train/jobs")
+async def list_training_jobs(limit: int = Query(20, ge=1, le=100)):
+    """
+    Recent training jobs (consumption and collaborative), newest first
+    Admin endpoint - should be protected in production
+    """
+    return {"jobs": await training_jobs.recent(limit)}
+
+@router.get("/train/jobs/{job_id}")
+async def get_training_job(job_id: str):
+    """
+    Status, phase (loading, features, fit, evaluate, save), progress and result of a training job
+    Admin endpoint - should be protected in production
+    """
+    job = await training_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training job not found"
+        )
+    return job
+
+@router.post("/train/jobs/{job_id}/cancel")
+async def cancel_training_job(job_id: str):
+    """
+    Cancel a queued or running training job; the active model version is left unchanged
+    Admin endpoint - should be protected in production
+    """
+    job = await training_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Training job not found"
         )
+    return job
@@ -1,39 +1,118 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import random
+from fastapi import APIRouter, UploadFile, File, HTTPException, status
+from typing import Dict, Optional
+import os
+
+from app.models.food_classifier import food_classifier
+from app.metrics import span
 
 router = APIRouter()
 
+UPLOAD_MAX_BYTES = int(float(os.getenv("RECOGNITION_UPLOAD_MAX_MB", 10)) * 1024 * 1024)
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """Image format from the leading magic bytes, if it is one the classifier decodes"""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+async def read_upload(file: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> bytearray:
+    """
+    Read an image upload chunk by chunk, rejecting it as soon as the first chunk
+    is not an image or the total passes max_bytes
+    """
+    data = bytearray()
+    chunk = await file.read(UPLOAD_CHUNK_BYTES)
+    if sniff_image_type(chunk) is None:
+        raise HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="File must be a JPEG, PNG or WebP image"
+        )
+    
+    while chunk:
+        if len(data) + len(chunk) > max_bytes:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"Image must be at most {max_bytes // (1024 * 1024)}MB"
+            )
+        data.extend(chunk)
+        chunk = await file.read(UPLOAD_CHUNK_BYTES)
+    
+    return data
+
+def oil_recommendation(oil_ml: Optional[float]) -> str:
+    """Advice for a dish by its typical oil content"""
+    if oil_ml is None:
+        return "Measure oil with a spoon instead of pouring to keep track of how much you use."
+    if oil_ml >= 25:
+        return "Consider using an air fryer or reducing oil by 50% for a healthier version."
+    if oil_ml >= 10:
+        return "Try a non-stick pan and measured teaspoons of oil to cut this by a third."
+    return "Great low-oil choice! Keep it up."
+
+def dish_summary(dish: Dict) -> Dict:
+    """Response fields of a recognized dish"""
+    return {
+        "dish_name": dish["name"],
+        "estimated_oil_content": f"{dish['oil_ml']}ml" if dish["oil_ml"] is not None else None,
+        "calories": dish["calories"],
+        "health_score": dish["health_score"]
+    }
+
 @router.post("/food", summary="Analyze food image for oil content")
 async def analyze_food_image(file: UploadFile = File(...)):
     """
     Analyze an uploaded food image to estimate oil content and calories.
     """
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="File must be an image")
+    if not food_classifier.is_loaded():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Food recognition model is not available"
+        )
     
-    # Mock AI Analysis Logic
-    # In a real implementation, this would pass the image to a TensorFlow/PyTorch model
+    with span("recognition.food", "upload"):
+        data = await read_upload(file)
     
-    # Simulated results
-    dishes = [
-        {"name": "Paneer Butter Masala", "oil_content": "30ml", "calories": 450, "health_score": 65},
-        {"name": "Aloo Paratha", "oil_content": "15ml", "calories": 320, "health_score": 70},
-        {"name": "Samosa", "oil_content": "25ml", "calories": 280, "health_score": 40},
-        {"name": "Vegetable Salad", "oil_content": "5ml", "calories": 150, "health_score": 95},
-        {"name": "Chicken Curry", "oil_content": "35ml", "calories": 500, "health_score": 60}
-    ]
+    try:
+        # Preprocessing and the batched forward pass, including the wait for a batch to fill
+        with span("recognition.food", "predict"):
+            predictions = await food_classifier.classify(data)
+    except (OSError, ValueError) as e:
+        # PIL raises these for truncated or unsupported images
+        raise HTTPException(status_code=400, detail=f"Could not decode image: {str(e)}")
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Food recognition failed: {str(e)}"
+        )
     
-    result = random.choice(dishes)
+    dish, confidence = predictions[0]
     
     return {
         "success": True,
         "analysis": {
-            "dish_name": result["name"],
-            "estimated_oil_content": result["oil_content"],
-            "calories": result["calories"],
-            "health_score": result["health_score"],
-            "confidence": 0.85 + (random.random() * 0.1)
+            **dish_summary(dish),
+            "confidence": round(confidence, 4)
         },
-        "recommendation": "Consider using an air fryer or reducing oil by 50% for a healthier version."
+        "alternatives": [
+            {**dish_summary(other), "confidence": round(probability, 4)}
+            for other, probability in predictions[1:]
+        ],
+        "recommendation": oil_recommendation(dish["oil_ml"])
+    }
+
+@router.get("/stats", summary="Food recognition batching statistics")
+async def get_recognition_stats():
+    """
+    Model status and micro-batching counters
+    """
+    return {
+        "model_loaded": food_classifier.is_loaded(),
+        "dishes": len(food_classifier.dishes),
+        "input_size": food_classifier.input_size,
+        "batching": food_classifier.batcher.stats()
     }
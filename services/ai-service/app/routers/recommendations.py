@@ -3,15 +3,104 @@ Recommendations Router
 Handles personalized recipe recommendations
 """
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, HTTPException, Query, Response, status
 from datetime import datetime
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
 
-from app.schemas import RecommendationRequest, RecommendationResponse, Recipe
+from app.schemas import RecommendationRequest, RecommendationResponse, Recipe, RecipeInteraction, json_response
 from app.database import get_database
-from app.models.ml_models import MLModels
+from app.models.registry import get_models
+from app.recipe_index import recipe_index
+from app.popular import popular_recipes, POPULAR_RECIPES_CAP
+from app.jobs import training_jobs, JobConflictError
+from app.cache import LRUCache
+from app.metrics import span, record_cache_lookup
 
 router = APIRouter()
-ml_models = MLModels()
+
+# Recommended recipes keyed by (profile fingerprint, catalog version); users with the same
+# profile share entries. Capped by count and by approximate serialized size.
+recommendation_cache = LRUCache(
+    int(os.getenv("RECOMMENDATION_CACHE_SIZE", 20000)),
+    max_bytes=int(float(os.getenv("RECOMMENDATION_CACHE_MAX_MB", 64)) * 1024 * 1024),
+    sizeof=lambda recipes: sum(len(recipe.model_dump_json()) for recipe in recipes)
+)
+
+def recommendation_fingerprint(user_profile: Dict, request: RecommendationRequest,
+                               collaborative_version: Optional[str] = None) -> str:
+    """Hash of every input a recommendation depends on besides the recipe catalog"""
+    inputs = {
+        "dietaryHabit": user_profile["dietaryHabit"],
+        "healthConditions": sorted(user_profile["healthConditions"] or []),
+        "cuisinePreference": sorted(user_profile["cuisinePreference"] or []),
+        "filters": request.filters or {},
+        "limit": request.limit,
+        # Collaborative results are specific to the user and the trained model
+        "collaborative": [request.userId, collaborative_version] if collaborative_version else None
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+def use_collaborative(models, request: RecommendationRequest) -> bool:
+    """
+    Whether a request is served by the collaborative engine
+    Falls back to content-based scoring without a trained model or for users it has not seen
+    """
+    collaborative = models.collaborative_model
+    return (
+        request.engine == "collaborative"
+        and collaborative is not None
+        and collaborative.has_user(request.userId)
+    )
+
+async def compute_recommendations(models, request: RecommendationRequest, user_profile: Dict,
+                                  use_collaborative: bool) -> List[Recipe]:
+    """Filter the catalog index, score it, and fetch full documents for the top N"""
+    # Apply filters and dietary preference to the whole catalog index
+    with span("recommendations.recipes", "features"):
+        features = await recipe_index.features()
+        rows = recipe_index.match(features, request.filters, user_profile["dietaryHabit"])
+    
+    if len(rows) == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="No recipes found matching criteria"
+        )
+    
+    # Score every matching recipe, then fetch full documents for the top N only
+    with span("recommendations.recipes", "predict"):
+        if use_collaborative:
+            ranked = models.collaborative_model.recommend(request.userId, features, rows, request.limit)
+        else:
+            ranked = models.rank_recipes(user_profile, features, rows, request.limit)
+    with span("recommendations.recipes", "db_fetch"):
+        documents = await recipe_index.fetch([recipe_id for recipe_id, _ in ranked])
+    
+    # Convert to Recipe schema
+    return [
+        Recipe(
+            id=recipe_id,
+            name=recipe["name"],
+            nameHindi=recipe.get("nameHindi", ""),
+            nameTamil=recipe.get("nameTamil", ""),
+            description=recipe["description"],
+            oilAmount=recipe["oilAmount"],
+            cuisine=recipe["cuisine"],
+            difficulty=recipe["difficulty"],
+            cookingTime=recipe["cookingTime"],
+            servings=recipe["servings"],
+            tags=recipe.get("tags", []),
+            ingredients=recipe.get("ingredients", []),
+            instructions=recipe.get("instructions", []),
+            nutritionInfo=recipe.get("nutritionInfo", {}),
+            imageUrl=recipe.get("imageUrl"),
+            score=score
+        )
+        for recipe_id, score in ranked
+        if (recipe := documents.get(recipe_id)) is not None
+    ]
 
 @router.post("/recipes", response_model=RecommendationResponse)
 async def recommend_recipes(request: RecommendationRequest):
@@ -20,63 +109,17 @@ async def recommend_recipes(request: RecommendationRequest):
     """
     try:
         db = get_database()
+        models = get_models()
         
         # Fetch user profile
-        user = await db.users.find_one({"userId": request.userId})
+        with span("recommendations.recipes", "db_fetch"):
+            user = await db.users.find_one({"userId": request.userId})
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        # Build recipe query
-        recipe_query = {}
-        
-        # Apply filters if provided
-        if request.filters:
-            if "cuisine" in request.filters:
-                recipe_query["cuisine"] = request.filters["cuisine"]
-            if "difficulty" in request.filters:
-                recipe_query["difficulty"] = request.filters["difficulty"]
-            if "maxOilAmount" in request.filters:
-                recipe_query["oilAmount"] = {"$lte": float(request.filters["maxOilAmount"])}
-        
-        # Apply dietary preference filter
-        dietary_habit = user.get("dietaryHabit", "vegetarian")
-        if dietary_habit in ["vegetarian", "vegan"]:
-            recipe_query["tags"] = {"$in": [dietary_habit]}
-        
-        # Fetch recipes
-        recipes = await db.recipes.find(recipe_query).to_list(length=100)
-        
-        if len(recipes) == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="No recipes found matching criteria"
-            )
-        
-        # Convert MongoDB documents to dicts
-        recipes = [
-            {
-                "id": str(recipe["_id"]),
-                "name": recipe["name"],
-                "nameHindi": recipe.get("nameHindi", ""),
-                "nameTamil": recipe.get("nameTamil", ""),
-                "description": recipe["description"],
-                "oilAmount": recipe["oilAmount"],
-                "cuisine": recipe["cuisine"],
-                "difficulty": recipe["difficulty"],
-                "cookingTime": recipe["cookingTime"],
-                "servings": recipe["servings"],
-                "tags": recipe.get("tags", []),
-                "ingredients": recipe.get("ingredients", []),
-                "instructions": recipe.get("instructions", []),
-                "nutritionInfo": recipe.get("nutritionInfo", {}),
-                "imageUrl": recipe.get("imageUrl")
-            }
-            for recipe in recipes
-        ]
-        
         # Get user profile for recommendation
         user_profile = {
             "dietaryHabit": user.get("dietaryHabit", "vegetarian"),
@@ -84,31 +127,34 @@ async def recommend_recipes(request: RecommendationRequest):
             "cuisinePreference": user.get("preferences", {}).get("cuisinePreference", [])
         }
         
-        # Get recommendations
-        recommended_recipes = await ml_models.recommend_recipes(
-            request.userId,
-            user_profile,
-            recipes,
-            request.limit
-        )
+        collaborative = use_collaborative(models, request)
         
-        # Convert to Recipe schema
-        recipe_objects = [
-            Recipe(**recipe)
-            for recipe in recommended_recipes
-        ]
+        # Results depend only on the profile, filters and catalog, so check the shared cache first
+        cache_key = (
+            recommendation_fingerprint(user_profile, request, models.version if collaborative else None),
+            recipe_index.version
+        )
+        recipe_objects = recommendation_cache.get(cache_key)
+        record_cache_lookup("recommendations.recipes", recipe_objects is not None)
+        if recipe_objects is None:
+            recipe_objects = await compute_recommendations(models, request, user_profile, collaborative)
+            recommendation_cache.set(cache_key, recipe_objects)
         
         # Generate reason
-        reason = "Personalized recommendations based on your dietary preferences, health goals, and cooking habits."
+        if collaborative:
+            reason = "Recipes enjoyed by people who cook like you, matched to your dietary preferences."
+        else:
+            reason = "Personalized recommendations based on your dietary preferences, health goals, and cooking habits."
         if user_profile.get("healthConditions"):
             reason += f" Optimized for: {', '.join(user_profile['healthConditions'])}."
         
-        return RecommendationResponse(
-            userId=request.userId,
-            recipes=recipe_objects,
-            reason=reason,
-            generated_at=datetime.now()
-        )
+        with span("recommendations.recipes", "response"):
+            return json_response(RecommendationResponse(
+                userId=request.userId,
+                recipes=recipe_objects,
+                reason=reason,
+                generated_at=datetime.now()
+            ))
         
     except HTTPException:
         raise
@@ -118,43 +164,96 @@ async def recommend_recipes(request: RecommendationRequest):
             detail=f"Recommendation failed: {str(e)}"
         )
 
-@router.get("/popular")
-async def get_popular_recipes(limit: int = 10):
+@router.get("/cache/stats")
+async def get_recommendation_cache_stats():
     """
-    Get most popular low-oil recipes
+    Hit/miss counters and memory use of the recommendation cache
+    """
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "catalog_version": recipe_index.version
+    }
+
+@router.post("/interactions", status_code=status.HTTP_201_CREATED)
+async def record_interaction(interaction: RecipeInteraction):
+    """
+    Record that a user viewed or cooked a recipe
+    Training data for the collaborative engine; the mobile app records a view when a recipe
+    card is opened and a cook from its "I cooked this" button
     """
     try:
         db = get_database()
+        await db.recipe_interactions.insert_one({**interaction.model_dump(), "createdAt": datetime.now()})
+        return {"message": "Interaction recorded"}
         
-        # Get recipes with low oil amount, sorted by popularity (view count)
-        recipes = await db.recipes.find(
-            {"oilAmount": {"$lte": 40}}
-        ).sort("viewCount", -1).limit(limit).to_list(length=limit)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to record interaction: {str(e)}"
+        )
+
+@router.post("/collaborative/train", status_code=status.HTTP_202_ACCEPTED)
+async def train_collaborative_model():
+    """
+    Start training the collaborative filtering model from recorded interactions
+    Runs as a background training job; poll /ai/predictions/train/jobs/{job_id}
+    Admin endpoint
+    """
+    try:
+        return await training_jobs.start("collaborative")
+        
+    except JobConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(e), "job_id": e.job_id}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to start collaborative training: {str(e)}"
+        )
+
+@router.post("/features/rebuild")
+async def rebuild_recipe_features():
+    """
+    Reload the recipe index from the full catalog and rebuild its in-memory feature matrix
+    Model versions are not touched; the matrix is always derived from the live catalog
+    Admin endpoint
+    """
+    try:
+        await recipe_index.load()
+        features = await recipe_index.features()
+        
+        return {
+            "message": "Recipe features rebuilt",
+            "recipes": len(features),
+            "tags": len(features.tag_names),
+            "cuisines": len(features.cuisine_names),
+            "built_at": features.built_at.isoformat()
+        }
         
-        if len(recipes) == 0:
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to rebuild recipe features: {str(e)}"
+        )
+
+@router.get("/popular")
+async def get_popular_recipes(limit: int = Query(10, ge=1, le=POPULAR_RECIPES_CAP)):
+    """
+    Get most popular low-oil recipes
+    Served from the in-memory leaderboard
+    """
+    try:
+        body = await popular_recipes.get(limit)
+        
+        if body is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="No recipes found"
             )
         
-        return {
-            "recipes": [
-                {
-                    "id": str(recipe["_id"]),
-                    "name": recipe["name"],
-                    "nameHindi": recipe.get("nameHindi", ""),
-                    "nameTamil": recipe.get("nameTamil", ""),
-                    "description": recipe["description"],
-                    "oilAmount": recipe["oilAmount"],
-                    "cuisine": recipe["cuisine"],
-                    "difficulty": recipe["difficulty"],
-                    "cookingTime": recipe["cookingTime"],
-                    "imageUrl": recipe.get("imageUrl"),
-                    "viewCount": recipe.get("viewCount", 0)
-                }
-                for recipe in recipes
-            ]
-        }
+        return Response(content=body, media_type="application/json")
         
     except HTTPException:
         raise
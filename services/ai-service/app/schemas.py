@@ -2,11 +2,20 @@
 Pydantic schemas for request/response validation
 """
 
+from fastapi import Response
 from pydantic import BaseModel, Field, validator
 from typing import List, Optional, Dict
 from datetime import datetime
 from enum import Enum
 
+def json_response(model: BaseModel) -> Response:
+    """
+    Serialize a response model to JSON right away
+    FastAPI returns a Response as is, so the model is not validated and encoded again after the
+    handler; routers call this inside their "response" span so the span covers serialization
+    """
+    return Response(content=model.model_dump_json(), media_type="application/json")
+
 class OilType(str, Enum):
     sunflower = "sunflower"
     coconut = "coconut"
@@ -35,10 +44,30 @@ class PredictionResponse(BaseModel):
     recommendations: List[str]
     generated_at: datetime
 
+class BatchPredictionRequest(BaseModel):
+    userIds: Optional[List[str]] = Field(default=None, max_length=100000, description="Omit to forecast all active users")
+    region: Optional[str] = None
+    days_ahead: int = Field(default=30, ge=1, le=90, description="Number of days to predict ahead")
+    persist: bool = Field(default=True, description="Store forecasts in consumption_forecasts instead of returning them")
+
+class BatchPredictionResponse(BaseModel):
+    requested: int
+    forecasted: int
+    skipped: List[str]
+    forecasts: Optional[Dict[str, Dict]] = None
+    generated_at: datetime
+
 class RecommendationRequest(BaseModel):
     userId: str = Field(..., min_length=1)
     limit: int = Field(default=10, ge=1, le=50)
     filters: Optional[Dict[str, str]] = None
+    engine: str = Field(default="content", pattern="^(content|collaborative)$",
+                        description="collaborative falls back to content for users without interactions")
+
+class RecipeInteraction(BaseModel):
+    userId: str = Field(..., min_length=1)
+    recipeId: str = Field(..., min_length=1)
+    type: str = Field(..., pattern="^(view|cook)$", description="cook: the recipe was cooked and logged")
 
 class Recipe(BaseModel):
     id: str
@@ -0,0 +1,99 @@
+"""
+National Snapshot
+Periodically materialized national/regional summary served by /ai/insights/national
+"""
+
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from app.database import get_database
+from app.insights_engine import fetch_national_summary
+
+NATIONAL_SNAPSHOT_MINUTES = float(os.getenv("NATIONAL_SNAPSHOT_MINUTES", 15))
+NATIONAL_WINDOW_DAYS = 30
+
+async def build_national_snapshot() -> Dict:
+    """Compute the national summary and store it in insight_snapshots"""
+    db = get_database()
+    generated_at = datetime.now()
+    
+    total_users, summary = await asyncio.gather(
+        db.users.count_documents({}),
+        fetch_national_summary(generated_at - timedelta(days=NATIONAL_WINDOW_DAYS))
+    )
+    
+    if summary is None:
+        snapshot = {
+            "message": "No consumption data available",
+            "total_users": total_users
+        }
+    else:
+        snapshot = {
+            "total_users": total_users,
+            "last_30_days": {
+                "total_consumption_liters": round(summary["total"] / 1000, 2),
+                "average_per_log_ml": round(summary["total"] / summary["count"], 2),
+                "total_logs": summary["count"]
+            },
+            "regional_breakdown": [
+                {
+                    "region": region["region"],
+                    "total_consumption_ml": round(region["total"], 2),
+                    "active_users": region["users"],
+                    "avg_per_user_ml": round(region["total"] / region["users"], 2) if region["users"] else 0.0
+                }
+                for region in summary["regions"]
+            ]
+        }
+    snapshot["generated_at"] = generated_at
+    
+    await db.insight_snapshots.replace_one({"_id": "national"}, {"_id": "national", **snapshot}, upsert=True)
+    return snapshot
+
+class NationalSnapshot:
+    """
+    Latest national snapshot, held in memory and shared across workers via insight_snapshots
+    
+    Every worker runs the refresh loop, but only rebuilds when the stored snapshot is older
+    than NATIONAL_SNAPSHOT_MINUTES, so one rebuild per interval is the common case.
+    Setting it to 0 disables the loop and rebuilds on every request.
+    """
+    
+    def __init__(self):
+        self.latest: Optional[Dict] = None
+    
+    def _is_fresh(self, snapshot: Optional[Dict]) -> bool:
+        if snapshot is None or NATIONAL_SNAPSHOT_MINUTES <= 0:
+            return False
+        return datetime.now() - snapshot["generated_at"] < timedelta(minutes=NATIONAL_SNAPSHOT_MINUTES)
+    
+    async def get(self, refresh: bool = False) -> Dict:
+        """Current snapshot, rebuilt when forced, missing or older than the refresh interval"""
+        if not refresh and self._is_fresh(self.latest):
+            return self.latest
+        
+        snapshot = None
+        if not refresh:
+            db = get_database()
+            snapshot = await db.insight_snapshots.find_one({"_id": "national"}, {"_id": 0})
+        if not self._is_fresh(snapshot):
+            snapshot = await build_national_snapshot()
+        
+        self.latest = snapshot
+        return snapshot
+    
+    async def refresh_loop(self):
+        """Background task keeping the snapshot within NATIONAL_SNAPSHOT_MINUTES of now"""
+        if NATIONAL_SNAPSHOT_MINUTES <= 0:
+            return
+        
+        while True:
+            try:
+                await self.get()
+            except Exception as e:
+                print(f"❌ National snapshot refresh failed: {e}")
+            await asyncio.sleep(NATIONAL_SNAPSHOT_MINUTES * 60)
+
+national_snapshot = NationalSnapshot()
@@ -0,0 +1,119 @@
+"""
+Startup Report
+Import and warm-up phase timings, readiness checks, and lazy imports of heavy libraries
+"""
+
+import importlib
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+class StartupReport:
+    """
+    Timings of the service's startup, from the first import of this module
+    
+    phase() times a named step (imports, connect_db, models, ...). Heavy libraries loaded
+    through lazy_module record their own import time on first use. Readiness checks are
+    registered up front and marked done (or failed) by the warm-up; the service is ready
+    once every check is done.
+    """
+    
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: List[Dict] = []
+        self.imports: Dict[str, float] = {}
+        self.checks: Dict[str, Dict] = {}
+        self.ready_after: Optional[float] = None
+    
+    def elapsed(self) -> float:
+        """Seconds since startup began"""
+        return time.perf_counter() - self.started
+    
+    @contextmanager
+    def phase(self, name: str):
+        """Time a startup step"""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            self.phases.append({
+                "phase": name,
+                "started_at": round(start - self.started, 4),
+                "seconds": round(time.perf_counter() - start, 4),
+                "error": error
+            })
+    
+    def record_import(self, module: str, seconds: float):
+        self.imports[module] = round(seconds, 4)
+    
+    def require(self, *checks: str):
+        """Register readiness checks that must pass before the service reports ready"""
+        for check in checks:
+            self.checks.setdefault(check, {"done": False, "error": None})
+    
+    def done(self, check: str):
+        """Mark a readiness check as passed"""
+        self.checks[check] = {"done": True, "error": None}
+        if self.ready_after is None and self.is_ready():
+            self.ready_after = round(self.elapsed(), 4)
+    
+    def failed(self, check: str, error: str):
+        """Mark a readiness check as failed (the service stays not ready)"""
+        self.checks[check] = {"done": False, "error": error}
+    
+    def is_ready(self) -> bool:
+        """Whether every readiness check has passed"""
+        return all(check["done"] for check in self.checks.values())
+    
+    def summary(self) -> Dict:
+        """Full report"""
+        return {
+            "ready": self.is_ready(),
+            "ready_after_seconds": self.ready_after,
+            "uptime_seconds": round(self.elapsed(), 4),
+            "checks": self.checks,
+            "phases": self.phases,
+            "lazy_imports": self.imports
+        }
+    
+    def print_summary(self):
+        phases = ", ".join(f"{phase['phase']} {phase['seconds']:.2f}s" for phase in self.phases)
+        print(f"✅ Ready after {self.ready_after:.2f}s ({phases})")
+
+startup_report = StartupReport()
+
+class LazyModule:
+    """Stand-in for a module that is imported on first attribute access"""
+    
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+    
+    def load(self):
+        """Import the module now (safe from any thread), recording how long it took"""
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self._name)
+            startup_report.record_import(self._name, time.perf_counter() - start)
+            self._module = module
+        return self._module
+    
+    def __getattr__(self, attribute: str):
+        return getattr(self.load(), attribute)
+
+lazy_modules: List[LazyModule] = []
+
+def lazy_module(name: str) -> LazyModule:
+    """Module that is imported on first use instead of at import time"""
+    module = LazyModule(name)
+    lazy_modules.append(module)
+    return module
+
+def preload_lazy_modules():
+    """Import every lazy module (blocking; run in a thread during warm-up)"""
+    for module in lazy_modules:
+        module.load()
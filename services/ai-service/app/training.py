@@ -0,0 +1,378 @@
+"""
+Training Data Loader
+Streams oil logs from MongoDB in one sorted cursor and builds consumption features in fixed-size chunks
+Supports full retraining and incremental training from stored sufficient statistics
+Training functions report phase progress to an optional job (see app.jobs)
+"""
+
+import copy
+import os
+import numpy as np
+from datetime import datetime, timedelta, timezone
+from pymongo import ASCENDING, DESCENDING
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.database import get_database
+from app.models.ml_models import MLModels, CONSUMPTION_FEATURES
+from app.models.linear_stats import RidgeStats
+from app.models.collaborative import CollaborativeModel
+from app.models.registry import registry
+from app.executor import model_executor
+
+TRAINING_CHUNK_USERS = int(os.getenv("TRAINING_CHUNK_USERS", 500))
+TRAINING_CURSOR_BATCH = int(os.getenv("TRAINING_CURSOR_BATCH", 5000))
+EVAL_SAMPLE_SIZE = int(os.getenv("EVAL_SAMPLE_SIZE", 50000))
+TRAINING_WRITE_LAG_SECONDS = float(os.getenv("TRAINING_WRITE_LAG_SECONDS", 5))
+MIN_TRAINING_LOGS = 7  # Need at least a week of data
+MIN_TRAINING_USERS = 10
+CONTEXT_LOGS = 29  # Logs preceding new data needed to rebuild lag and 30-day rolling features
+INTERACTION_WEIGHTS = {"view": 1, "cook": 3}  # A recipe cooked and logged counts more than a view
+MIN_INTERACTION_USERS = 10
+
+class InsufficientDataError(ValueError):
+    """Not enough users with enough logs to train"""
+
+async def report(job: Optional[Any], phase: str, **progress):
+    """Report phase progress to a training job, if any (raises when the job was cancelled)"""
+    if job is not None:
+        await job.report(phase, **progress)
+
+async def iter_user_logs(query: Optional[Dict] = None) -> AsyncIterator[Tuple[str, List[Dict]]]:
+    """
+    Yield (user_id, logs) for every user matching query, logs in date order
+    Only one user's logs are held in memory at a time
+    """
+    db = get_database()
+    
+    # (userId desc, date asc) walks the (userId, date desc) index backwards, so no in-memory sort
+    cursor = db.oil_logs.find(
+        query or {},
+        {"_id": 0, "userId": 1, "amount": 1, "date": 1},
+        allow_disk_use=True
+    ).sort([("userId", DESCENDING), ("date", ASCENDING)]).batch_size(TRAINING_CURSOR_BATCH)
+    
+    current_user = None
+    logs = []
+    async for log in cursor:
+        if log["userId"] != current_user:
+            if logs:
+                yield current_user, logs
+            current_user = log["userId"]
+            logs = []
+        logs.append({"amount": log["amount"], "date": log["date"]})
+    
+    if logs:
+        yield current_user, logs
+
+async def iter_user_chunks(query: Optional[Dict] = None, min_logs: int = 1) -> AsyncIterator[Dict[str, List[Dict]]]:
+    """Group iter_user_logs into chunks of up to TRAINING_CHUNK_USERS users"""
+    chunk = {}
+    async for user_id, logs in iter_user_logs(query):
+        if len(logs) < min_logs:
+            continue
+        chunk[user_id] = logs
+        
+        if len(chunk) >= TRAINING_CHUNK_USERS:
+            yield chunk
+            chunk = {}
+    
+    if chunk:
+        yield chunk
+
+async def load_profiles(user_ids: List[str]) -> Dict[str, Dict]:
+    """Profiles of a chunk of users in one query"""
+    db = get_database()
+    users = await db.users.find(
+        {"userId": {"$in": user_ids}},
+        {"userId": 1, "familySize": 1, "age": 1}
+    ).to_list(length=None)
+    return {user["userId"]: user for user in users}
+
+async def load_context_logs(user_ids: List[str], watermark: datetime) -> Dict[str, List[Dict]]:
+    """Latest CONTEXT_LOGS already-trained logs per user, in date order"""
+    db = get_database()
+    pipeline = [
+        {"$match": {"userId": {"$in": user_ids}, "createdAt": {"$not": {"$gt": watermark}}}},
+        # $topN keeps only CONTEXT_LOGS logs per user while grouping, not the user's whole history
+        {"$group": {
+            "_id": "$userId",
+            "logs": {"$topN": {
+                "n": CONTEXT_LOGS,
+                "sortBy": {"date": -1},
+                "output": {"amount": "$amount", "date": "$date"}
+            }}
+        }}
+    ]
+    
+    context = {}
+    async for doc in db.oil_logs.aggregate(pipeline, allowDiskUse=True):
+        context[doc["_id"]] = list(reversed(doc["logs"]))
+    return context
+
+def scan_bound() -> datetime:
+    """
+    createdAt upper bound of a training scan, fixed before the scan starts and stored as the
+    next watermark
+    
+    The cursor is not a snapshot: a log written while it runs may or may not be returned,
+    whatever its createdAt. Bounding the scan means every log after the bound is left to
+    the next run. TRAINING_WRITE_LAG_SECONDS covers logs stamped just before the bound but
+    committed after the scan has passed them. createdAt is stored in UTC.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=TRAINING_WRITE_LAG_SECONDS)
+
+class EvaluationSample:
+    """Fixed-size uniform reservoir sample of training rows, used for metrics needing predictions"""
+    
+    def __init__(self, size: int, n_features: int, seed: int = 42):
+        self.size = size
+        self.seen = 0
+        self.X = np.empty((size, n_features))
+        self.y = np.empty(size)
+        self._rng = np.random.default_rng(seed)
+    
+    def add(self, X: np.ndarray, y: np.ndarray):
+        """Offer a chunk of rows to the reservoir"""
+        # Fill the reservoir first
+        fill = min(max(self.size - self.seen, 0), len(X))
+        self.X[self.seen:self.seen + fill] = X[:fill]
+        self.y[self.seen:self.seen + fill] = y[:fill]
+        
+        # Then row t replaces a random slot with probability size / (t + 1)
+        positions = np.arange(self.seen + fill, self.seen + len(X))
+        if len(positions):
+            slots = self._rng.integers(0, positions + 1)
+            keep = slots < self.size
+            self.X[slots[keep]] = X[fill:][keep]
+            self.y[slots[keep]] = y[fill:][keep]
+        
+        self.seen += len(X)
+    
+    def rows(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Sampled (X, y)"""
+        count = min(self.seen, self.size)
+        return self.X[:count], self.y[:count]
+
+async def collect_training_stats(ml_models: MLModels, job: Optional[Any] = None) -> Dict:
+    """
+    Single streaming pass over oil_logs
+    Memory is bounded by one chunk plus the evaluation sample, whatever the size of the collection
+    """
+    stats = RidgeStats(len(CONSUMPTION_FEATURES))
+    sample = EvaluationSample(EVAL_SAMPLE_SIZE, len(CONSUMPTION_FEATURES))
+    users_count = 0
+    training_samples = 0
+    logs_read = 0
+    # Logs without createdAt predate incremental training and belong to every full pass
+    watermark = scan_bound()
+    query = {"createdAt": {"$not": {"$gt": watermark}}}
+    
+    logs_total = await get_database().oil_logs.estimated_document_count()
+    await report(job, "loading", logs_read=0, logs_total=logs_total)
+    
+    async for chunk in iter_user_chunks(query, min_logs=MIN_TRAINING_LOGS):
+        logs_read += sum(len(logs) for logs in chunk.values())
+        user_profiles = await load_profiles(list(chunk.keys()))
+        chunk = {user_id: logs for user_id, logs in chunk.items() if user_id in user_profiles}
+        if not chunk:
+            continue
+        
+        features_df = await model_executor.run(ml_models.build_consumption_features, chunk, user_profiles)
+        X = features_df[CONSUMPTION_FEATURES].values
+        y = features_df['amount'].values
+        
+        stats.update(X, y)
+        sample.add(X, y)
+        users_count += len(chunk)
+        training_samples += len(features_df)
+        await report(job, "features", logs_read=logs_read, logs_total=logs_total,
+                     users=users_count, samples=training_samples)
+    
+    return {
+        "stats": stats,
+        "sample": sample,
+        "users_count": users_count,
+        "training_samples": training_samples,
+        "watermark": watermark
+    }
+
+async def collect_incremental_stats(ml_models: MLModels, state: Dict, job: Optional[Any] = None) -> Dict:
+    """
+    Fold only logs created after the stored watermark (up to a new scan bound, which becomes
+    the next watermark) into a copy of the stored statistics
+    
+    Each user's new logs are prefixed with their latest CONTEXT_LOGS trained logs so lag and
+    rolling features match a full rebuild; only the new rows are added. Users that first reach
+    MIN_TRAINING_LOGS are folded in with their whole (short) history. Back-dated logs shift
+    which rows count as new, and the mean used to fill a user's first lag is not revisited;
+    a periodic full retrain corrects both.
+    """
+    stats = copy.deepcopy(state["stats"])
+    sample = EvaluationSample(EVAL_SAMPLE_SIZE, len(CONSUMPTION_FEATURES))
+    users_count = state["users_count"]
+    watermark = scan_bound()
+    query = {"createdAt": {"$gt": state["watermark"], "$lte": watermark}}
+    new_samples = 0
+    logs_read = 0
+    
+    logs_total = await get_database().oil_logs.count_documents(query)
+    await report(job, "loading", logs_read=0, logs_total=logs_total)
+    
+    async for new_logs in iter_user_chunks(query):
+        logs_read += sum(len(logs) for logs in new_logs.values())
+        user_ids = list(new_logs.keys())
+        user_profiles = await load_profiles(user_ids)
+        context = await load_context_logs(user_ids, state["watermark"])
+        
+        chunk = {}
+        new_counts = {}
+        for user_id, logs in new_logs.items():
+            history = context.get(user_id, [])
+            if user_id not in user_profiles or len(history) + len(logs) < MIN_TRAINING_LOGS:
+                continue  # Picked up again as context once the user has enough logs
+            
+            chunk[user_id] = history + logs
+            if len(history) < MIN_TRAINING_LOGS:
+                # Context holds the user's whole history, none of which was trained on yet
+                new_counts[user_id] = len(history) + len(logs)
+                users_count += 1
+            else:
+                new_counts[user_id] = len(logs)
+        
+        if not chunk:
+            continue
+        
+        features_df = await model_executor.run(ml_models.build_consumption_features, chunk, user_profiles)
+        from_end = features_df.groupby('userId', sort=False).cumcount(ascending=False)
+        features_df = features_df[from_end < features_df['userId'].map(new_counts)]
+        
+        X = features_df[CONSUMPTION_FEATURES].values
+        y = features_df['amount'].values
+        
+        stats.update(X, y)
+        sample.add(X, y)
+        new_samples += len(features_df)
+        await report(job, "features", logs_read=logs_read, logs_total=logs_total,
+                     users=users_count, samples=new_samples)
+    
+    return {
+        "stats": stats,
+        "sample": sample,
+        "users_count": users_count,
+        "training_samples": state["training_samples"] + new_samples,
+        "new_samples": new_samples,
+        "watermark": watermark
+    }
+
+async def run_training(mode: str = "full", job: Optional[Any] = None) -> Dict:
+    """
+    Train and publish a new consumption model version
+    Incremental mode falls back to a full pass when no training state or watermark is stored
+    Phases: loading, features, fit, evaluate, save
+    """
+    state = registry.current().training_state
+    if mode == "incremental" and (state is None or state["watermark"] is None):
+        mode = "full"
+    
+    ml_models = registry.create_version()
+    
+    if mode == "incremental":
+        training = await collect_incremental_stats(ml_models, state, job)
+        if training["new_samples"] == 0:
+            return {
+                "status": "skipped",
+                "message": "No new oil logs since last training",
+                "mode": mode,
+                "model_version": registry.current().version
+            }
+    else:
+        training = await collect_training_stats(ml_models, job)
+    
+    if training["users_count"] < MIN_TRAINING_USERS:
+        raise InsufficientDataError(
+            f"Insufficient training data. Need at least {MIN_TRAINING_USERS} users with "
+            f"{MIN_TRAINING_LOGS}+ days of logs. Found: {training['users_count']}"
+        )
+    
+    # Fit, evaluate, save, and make the new version active
+    await report(job, "fit", users=training["users_count"], samples=training["training_samples"])
+    fit_metrics = ml_models.fit_consumption_stats(training["stats"])
+    
+    eval_X, eval_y = training["sample"].rows()
+    await report(job, "evaluate", sample_size=len(eval_y))
+    metrics = {"mae": await model_executor.run(ml_models.sample_mae, eval_X, eval_y), **fit_metrics}
+    
+    await report(job, "save", model_version=ml_models.version)
+    ml_models.training_state = {
+        "stats": training["stats"],
+        "users_count": training["users_count"],
+        "training_samples": training["training_samples"],
+        "watermark": training["watermark"]
+    }
+    await ml_models.save_models()
+    await registry.publish(ml_models)
+    
+    return {
+        "status": "success",
+        "message": "Model trained successfully",
+        "mode": mode,
+        "metrics": metrics,
+        "training_samples": training["training_samples"],
+        "users_count": training["users_count"],
+        "model_version": ml_models.version,
+        "trained_at": datetime.now().isoformat()
+    }
+
+async def load_interactions() -> Tuple[List[str], List[str], np.ndarray]:
+    """Interaction weight per (user, recipe), summed in MongoDB"""
+    db = get_database()
+    weight = {"$switch": {
+        "branches": [{"case": {"$eq": ["$type", kind]}, "then": value} for kind, value in INTERACTION_WEIGHTS.items()],
+        "default": 0
+    }}
+    
+    user_ids, recipe_ids, weights = [], [], []
+    async for row in db.recipe_interactions.aggregate([
+        {"$group": {"_id": {"userId": "$userId", "recipeId": "$recipeId"}, "weight": {"$sum": weight}}},
+        {"$match": {"weight": {"$gt": 0}}}
+    ], allowDiskUse=True):
+        user_ids.append(row["_id"]["userId"])
+        recipe_ids.append(row["_id"]["recipeId"])
+        weights.append(row["weight"])
+    
+    return user_ids, recipe_ids, np.array(weights, dtype=float)
+
+async def run_collaborative_training(job: Optional[Any] = None) -> Dict:
+    """
+    Train the collaborative filtering model from recipe interactions and publish it
+    The consumption model of the active version is kept as is
+    Phases: loading, fit, save
+    """
+    await report(job, "loading")
+    user_ids, recipe_ids, weights = await load_interactions()
+    users_count = len(set(user_ids))
+    if users_count < MIN_INTERACTION_USERS:
+        raise InsufficientDataError(
+            f"Insufficient interaction data. Need at least {MIN_INTERACTION_USERS} users "
+            f"with recipe interactions. Found: {users_count}"
+        )
+    
+    ml_models = registry.create_version(refit_consumption=False)
+    
+    # ALS and index building are CPU-bound; keep the event loop serving requests
+    await report(job, "fit", users=users_count, interactions=len(weights))
+    started = datetime.now()
+    ml_models.collaborative_model = await model_executor.run(CollaborativeModel.train, user_ids, recipe_ids, weights)
+    
+    await report(job, "save", model_version=ml_models.version)
+    await ml_models.save_models()
+    await registry.publish(ml_models)
+    
+    return {
+        "status": "success",
+        "message": "Collaborative filtering model trained successfully",
+        **ml_models.collaborative_model.stats,
+        "training_seconds": round((datetime.now() - started).total_seconds(), 2),
+        "model_version": ml_models.version,
+        "trained_at": datetime.now().isoformat()
+    }
@@ -3,34 +3,128 @@ AI Service - FastAPI Application
 Provides ML-based predictions and recommendations for oil consumption
 """
 
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from contextlib import asynccontextmanager
-import uvicorn
-import os
-from dotenv import load_dotenv
-
-from app.routers import predictions, recommendations, insights, recognition
-from app.database import connect_db, close_db
-from app.models.ml_models import MLModels
+from app.startup import startup_report, preload_lazy_modules
+
+with startup_report.phase("imports"):
+    from fastapi import FastAPI, HTTPException, Request
+    from fastapi.middleware.cors import CORSMiddleware
+    from fastapi.responses import JSONResponse, PlainTextResponse
+    from contextlib import asynccontextmanager
+    import asyncio
+    import uvicorn
+    import os
+    import time
+    from typing import Optional
+    from dotenv import load_dotenv
+    
+    from app.routers import predictions, recommendations, insights, recognition
+    from app.routers.recommendations import recommendation_cache
+    from app.routers.insights import insights_cache
+    from app.database import connect_db, close_db, ensure_indexes, ping_db, DB_INDEXES
+    from app.models.registry import registry
+    from app.forecasting import forecast_refresh_loop
+    from app.jobs import incremental_training_loop, training_jobs
+    from app.log_events import log_events, rollup_events
+    from app.insights_engine import INSIGHTS_FROM_ROLLUPS
+    from app.rollups import rollup_updater
+    from app.snapshots import national_snapshot
+    from app.recipe_index import recipe_index
+    from app.popular import popular_recipes
+    from app.models.food_classifier import food_classifier
+    from app.routers.recognition import UPLOAD_MAX_BYTES
+    from app.executor import model_executor
+    from app.metrics import metrics, request_seconds, METRICS_ENABLED
+    from app.profiler import profiler, collapsed, ProfilerBusyError, PROFILER_ENABLED
 
 load_dotenv()
 
-# Initialize ML models
-ml_models = MLModels()
+# Serve (and pass /health) before models and the recipe catalog are warm; /ready flips once they are
+FAST_START = os.getenv("FAST_START", "false").lower() == "true"
+READY_PING_TIMEOUT_SECONDS = float(os.getenv("READY_PING_TIMEOUT_SECONDS", 2))
+
+async def warm_step(check: str, step):
+    """Run one warm-up step as a timed phase, recording it as a readiness check"""
+    try:
+        with startup_report.phase(check):
+            await step()
+        startup_report.done(check)
+    except Exception as e:
+        startup_report.failed(check, str(e))
+        print(f"❌ Warm-up step {check} failed: {e}")
+
+async def warm_up(index_task: Optional[asyncio.Task] = None):
+    """
+    Heavy imports, model loading, recipe features and the food classifier, in that order
+    pandas/sklearn are imported in a thread so the event loop keeps serving meanwhile
+    """
+    await warm_step("imports_heavy", lambda: asyncio.to_thread(preload_lazy_modules))
+    await warm_step("models", registry.load)
+    await warm_step("recipe_index", recipe_index.features)
+    await warm_step("food_classifier", lambda: asyncio.to_thread(food_classifier.load))
+    if index_task is not None:
+        await index_task
+    
+    if startup_report.is_ready():
+        startup_report.print_summary()
+    else:
+        print("⚠️  AI Service warm-up incomplete, see /startup")
+
+async def run_recognition(warmup_task: asyncio.Task):
+    """Food classifier batching, started once warm-up has loaded the model"""
+    await asyncio.wait([warmup_task])
+    await food_classifier.run()
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Lifecycle events for the application"""
     # Startup
-    await connect_db()
-    await ml_models.load_models()
-    print("✅ AI Service started successfully")
+    checks = ["imports_heavy", "models", "recipe_index", "food_classifier"]
+    if DB_INDEXES in ("startup", "background"):
+        checks.append("indexes")
+    startup_report.require(*checks)
+    
+    with startup_report.phase("connect_db"):
+        await connect_db()
+    index_task = None
+    if DB_INDEXES == "startup":
+        await warm_step("indexes", ensure_indexes)
+    elif DB_INDEXES == "background":
+        index_task = asyncio.create_task(warm_step("indexes", ensure_indexes))
+    
+    warmup_task = asyncio.create_task(warm_up(index_task))
+    if not FAST_START:
+        await warmup_task
+    watch_task = asyncio.create_task(registry.watch())
+    forecast_task = asyncio.create_task(forecast_refresh_loop())
+    training_task = asyncio.create_task(incremental_training_loop())
+    log_events_task = asyncio.create_task(log_events.watch())
+    rollup_events_task = asyncio.create_task(rollup_events.watch()) if INSIGHTS_FROM_ROLLUPS else None
+    rollup_task = asyncio.create_task(rollup_updater.run())
+    snapshot_task = asyncio.create_task(national_snapshot.refresh_loop())
+    recipe_index_task = asyncio.create_task(recipe_index.watch())
+    popular_task = asyncio.create_task(popular_recipes.refresh_loop())
+    recognition_task = asyncio.create_task(run_recognition(warmup_task))
+    print(f"✅ AI Service started successfully ({'warming up' if FAST_START else 'warm'}, {startup_report.elapsed():.2f}s)")
     
     yield
     
     # Shutdown
+    warmup_task.cancel()
+    if index_task is not None:
+        index_task.cancel()
+    forecast_task.cancel()
+    training_task.cancel()
+    log_events_task.cancel()
+    if rollup_events_task is not None:
+        rollup_events_task.cancel()
+    rollup_task.cancel()
+    snapshot_task.cancel()
+    recipe_index_task.cancel()
+    popular_task.cancel()
+    recognition_task.cancel()
+    watch_task.cancel()
+    await training_jobs.shutdown()
+    model_executor.shutdown()
     await close_db()
     print("✅ AI Service shut down gracefully")
 
@@ -50,14 +144,134 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Health check endpoint
+# Multipart framing around an uploaded image
+UPLOAD_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def limit_recognition_uploads(request: Request, call_next):
+    """Reject oversized image uploads from Content-Length, before the body is read"""
+    if request.url.path.startswith("/ai/recognition/"):
+        length = request.headers.get("content-length", "")
+        if length.isdigit() and int(length) > UPLOAD_MAX_BYTES + UPLOAD_OVERHEAD_BYTES:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Image must be at most {UPLOAD_MAX_BYTES // (1024 * 1024)}MB"}
+            )
+    return await call_next(request)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Latency of every request by route template, including response serialization"""
+    if not METRICS_ENABLED:
+        return await call_next(request)
+    start = time.perf_counter()
+    response = await call_next(request)
+    # The matched route's template, so path parameters don't become separate series
+    route = request.scope.get("route")
+    request_seconds.observe(
+        time.perf_counter() - start,
+        request.method,
+        route.path if route is not None else "unmatched",
+        str(response.status_code)
+    )
+    return response
+
+# Exported from the components' own counters at scrape time
+metrics.collected("ai_cache_hits_total", "Result cache hits", "counter", ("cache",), lambda: [
+    (("recommendations",), recommendation_cache.hits),
+    (("user_insights",), insights_cache.hits)
+])
+metrics.collected("ai_cache_misses_total", "Result cache misses", "counter", ("cache",), lambda: [
+    (("recommendations",), recommendation_cache.misses),
+    (("user_insights",), insights_cache.misses)
+])
+metrics.collected("ai_cache_entries", "Entries held by each result cache", "gauge", ("cache",), lambda: [
+    (("recommendations",), len(recommendation_cache)),
+    (("user_insights",), len(insights_cache))
+])
+metrics.collected("ai_executor_pending", "Model executor calls running or queued", "gauge", ("kind",), lambda: [
+    ((model_executor.kind,), model_executor.pending)
+])
+metrics.collected("ai_executor_capacity", "Model executor workers plus queue slots", "gauge", ("kind",), lambda: [
+    ((model_executor.kind,), model_executor.capacity)
+])
+metrics.collected("ai_executor_rejected_total", "Model executor calls rejected at capacity", "counter", ("kind",), lambda: [
+    ((model_executor.kind,), model_executor.rejected)
+])
+metrics.collected("ai_recognition_queue_depth", "Images waiting for a classifier batch", "gauge", (), lambda: [
+    ((), food_classifier.batcher.queue.qsize())
+])
+metrics.collected("ai_recognition_batches_total", "Classifier batches run", "counter", (), lambda: [
+    ((), food_classifier.batcher.batches)
+])
+metrics.collected("ai_recognition_images_total", "Images classified", "counter", (), lambda: [
+    ((), food_classifier.batcher.items)
+])
+metrics.collected("ai_model_info", "Active model version (value is always 1)", "gauge", ("version",), lambda: [
+    ((registry.current().version,), 1)
+] if registry.is_loaded() else [])
+metrics.collected("ai_ready", "Whether warm-up has finished", "gauge", (), lambda: [
+    ((), 1 if startup_report.is_ready() else 0)
+])
+
+# Health check endpoint (liveness: the process is up and serving)
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "service": "ai-service",
         "version": "1.0.0",
-        "models_loaded": ml_models.is_loaded()
+        "ready": startup_report.is_ready(),
+        "models_loaded": registry.is_loaded(),
+        "model_version": registry.current().version if registry.is_loaded() else None,
+        "food_classifier_loaded": food_classifier.is_loaded(),
+        "executor": model_executor.stats()
+    }
+
+# Readiness: warm-up finished and MongoDB reachable; send traffic only once this is 200
+@app.get("/ready")
+async def readiness_check():
+    checks = {name: check["done"] for name, check in startup_report.checks.items()}
+    try:
+        await asyncio.wait_for(ping_db(), timeout=READY_PING_TIMEOUT_SECONDS)
+        checks["database"] = True
+    except Exception:
+        checks["database"] = False
+    
+    ready = all(checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "warming_up", "checks": checks}
+    )
+
+# Startup profile: phase timings, lazy import times and readiness checks
+@app.get("/startup")
+async def startup_profile():
+    return startup_report.summary()
+
+# Prometheus scrape endpoint
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+# Sampling profiler trigger (PROFILER_ENABLED=true); format=collapsed feeds flamegraph.pl or speedscope
+@app.post("/debug/profile")
+async def take_profile(seconds: float = 10.0, interval_ms: float = 5.0, format: str = "json", top: int = 50):
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    try:
+        profile = await profiler.profile(seconds, interval_ms)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    if format == "collapsed":
+        return PlainTextResponse(collapsed(profile))
+    return {
+        **profile,
+        "stacks": [
+            {"stack": stack, "count": count}
+            for stack, count in profile["stacks"].most_common(top)
+        ]
     }
 
 # Include routers
@@ -0,0 +1,147 @@
+"""
+Test Fixtures
+In-memory stand-in for the few motor collection methods the service's data paths use, and a
+scratch MongoDB database (TEST_MONGODB_URI) for aggregation pipelines the stand-in can't run
+"""
+
+import asyncio
+import copy
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MISSING = object()
+
+def field_value(document, path):
+    value = document
+    for part in path.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return MISSING
+        value = value[part]
+    return value
+
+def matches_condition(value, condition):
+    if not isinstance(condition, dict) or not any(key.startswith("$") for key in condition):
+        return value is not MISSING and value == condition or (condition is None and value is MISSING)
+    
+    for operator, operand in condition.items():
+        if operator == "$not":
+            if matches_condition(value, operand):
+                return False
+        elif operator == "$exists":
+            if (value is not MISSING) != operand:
+                return False
+        elif operator == "$in":
+            if value is MISSING or value not in operand:
+                return False
+        elif operator == "$ne":
+            if value is not MISSING and value == operand:
+                return False
+        elif value is MISSING or value is None:
+            return False
+        elif operator == "$gt" and not value > operand:
+            return False
+        elif operator == "$gte" and not value >= operand:
+            return False
+        elif operator == "$lt" and not value < operand:
+            return False
+        elif operator == "$lte" and not value <= operand:
+            return False
+    return True
+
+def matches(document, query):
+    return all(matches_condition(field_value(document, path), condition) for path, condition in (query or {}).items())
+
+class FakeCursor:
+    """Snapshot of the matching documents at find() time, like a cursor past its first batch"""
+    
+    def __init__(self, collection, documents):
+        self.collection = collection
+        self.documents = documents
+    
+    def sort(self, keys, direction=None):
+        if isinstance(keys, str):
+            keys = [(keys, direction or 1)]
+        for key, order in reversed(keys):
+            self.documents.sort(key=lambda document: field_value(document, key), reverse=order < 0)
+        return self
+    
+    def batch_size(self, size):
+        return self
+    
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+    
+    async def to_list(self, length=None):
+        return [document async for document in self][:length]
+    
+    async def __aiter__(self):
+        for document in self.documents:
+            yield copy.deepcopy(document)
+            if self.collection.on_read is not None:
+                self.collection.on_read(document)
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+        self.on_read = None  # Called after each document a cursor hands out
+    
+    def insert_many(self, documents):
+        self.documents.extend(copy.deepcopy(document) for document in documents)
+    
+    def find(self, query=None, projection=None, **kwargs):
+        return FakeCursor(self, [document for document in self.documents if matches(document, query)])
+    
+    async def find_one(self, query=None, projection=None, **kwargs):
+        for document in self.documents:
+            if matches(document, query):
+                return copy.deepcopy(document)
+        return None
+    
+    async def count_documents(self, query, **kwargs):
+        return sum(1 for document in self.documents if matches(document, query))
+    
+    async def estimated_document_count(self):
+        return len(self.documents)
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+    
+    def __getattr__(self, name):
+        return self.collections.setdefault(name, FakeCollection())
+
+@pytest.fixture
+def fake_db():
+    return FakeDatabase()
+
+@pytest.fixture
+def mongo_db():
+    """
+    Runs an async test body against a scratch database with the service's indexes, set as app.database's
+    database; skipped unless TEST_MONGODB_URI is set. The database is dropped afterwards
+    """
+    uri = os.getenv("TEST_MONGODB_URI")
+    if not uri:
+        pytest.skip("TEST_MONGODB_URI is not set")
+    from app import database as database_module
+    
+    def run(test):
+        async def main():
+            name = f"ai_service_test_{uuid.uuid4().hex[:12]}"
+            database_module.client = database_module.AsyncIOMotorClient(uri)
+            database_module.database = database_module.client[name]
+            try:
+                await database_module.ensure_indexes()
+                return await test(database_module.database)
+            finally:
+                await database_module.client.drop_database(name)
+                database_module.client.close()
+                database_module.client = database_module.database = None
+        return asyncio.run(main())
+    return run
@@ -0,0 +1,54 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.models.collaborative import CollaborativeModel, IVFIndex
+from app.models.recipe_features import RecipeFeatures
+from app.routers.recommendations import use_collaborative
+from app.schemas import RecommendationRequest
+
+def make_model():
+    # Two cells: r1-r3 point along the user's taste, r4 away from it
+    recipe_factors = np.array([[5.0, 0.0], [4.0, 0.0], [3.0, 0.0], [-1.0, 1.0]])
+    index = IVFIndex.from_arrays(
+        recipe_factors,
+        centroids=np.array([[4.0, 0.0], [-1.0, 1.0]]),
+        list_indptr=np.array([0, 3, 4]),
+        list_members=np.array([0, 1, 2, 3])
+    )
+    stats = {"users": 1, "recipes": 4, "interactions": 4}
+    return CollaborativeModel(["u1"], ["r1", "r2", "r3", "r4"], np.array([[1.0, 0.0]]), recipe_factors, stats, index)
+
+def make_features():
+    # r5 was added to the catalog after the model was trained
+    return RecipeFeatures.from_recipes([
+        {"id": recipe_id, "oilAmount": 10, "tags": [], "cuisine": "north", "difficulty": "easy"}
+        for recipe_id in ["r1", "r2", "r3", "r4", "r5"]
+    ])
+
+def test_search_probes_further_cells_when_filters_leave_too_few():
+    model = make_model()
+    allowed = np.array([False, True, True, True])
+    
+    rows, scores = model.index.search(np.array([1.0, 0.0]), 3, allowed, probes=1)
+    
+    assert rows.tolist() == [1, 2, 3]
+    assert scores.tolist() == [4.0, 3.0, -1.0]
+
+def test_recommend_only_returns_matching_recipes_known_to_the_model():
+    model = make_model()
+    features = make_features()
+    rows = np.array([1, 2, 3, 4])  # Filters excluded r1
+    
+    ranked = model.recommend("u1", features, rows, limit=5)
+    
+    assert [recipe_id for recipe_id, _ in ranked] == ["r2", "r3", "r4"]
+
+def test_collaborative_engine_falls_back_to_content():
+    models = SimpleNamespace(collaborative_model=make_model())
+    untrained = SimpleNamespace(collaborative_model=None)
+    
+    assert use_collaborative(models, RecommendationRequest(userId="u1", engine="collaborative"))
+    assert not use_collaborative(models, RecommendationRequest(userId="u1"))
+    assert not use_collaborative(models, RecommendationRequest(userId="new-user", engine="collaborative"))
+    assert not use_collaborative(untrained, RecommendationRequest(userId="u1", engine="collaborative"))
@@ -0,0 +1,27 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import forecasting
+
+@pytest.fixture
+def forecast_db(fake_db, monkeypatch):
+    monkeypatch.setattr(forecasting, "get_database", lambda: fake_db)
+    monkeypatch.setattr(forecasting, "FORECAST_REFRESH_HOURS", 24)
+    return fake_db
+
+def test_first_refresh_is_due_immediately(forecast_db):
+    assert asyncio.run(forecasting.next_refresh_delay()) == 0
+
+def test_refresh_is_scheduled_from_last_completed_run(forecast_db):
+    forecast_db.forecast_state.insert_many([{"_id": "refresh", "last_completed_at": datetime.now() - timedelta(hours=20)}])
+    
+    delay = asyncio.run(forecasting.next_refresh_delay())
+    
+    assert 4 * 3600 - 60 < delay <= 4 * 3600
+
+def test_overdue_refresh_runs_at_once(forecast_db):
+    forecast_db.forecast_state.insert_many([{"_id": "refresh", "last_completed_at": datetime.now() - timedelta(days=3)}])
+    
+    assert asyncio.run(forecasting.next_refresh_delay()) == 0
@@ -0,0 +1,56 @@
+import statistics
+
+import pytest
+
+from app.hll import HyperLogLog, sketch_update
+
+SIZES = [100, 1000, 10000, 10240, 11000, 100000]
+
+def sketch_of(values):
+    sketch = HyperLogLog()
+    sketch.update(values)
+    return sketch
+
+def relative_error(estimate, exact):
+    return abs(estimate - exact) / exact
+
+def test_empty_sketch_counts_zero():
+    assert HyperLogLog().count() == 0
+
+@pytest.mark.parametrize("size", SIZES)
+def test_count_is_close_to_exact(size):
+    users = {f"user-{i}" for i in range(size)}
+    # Three standard errors; the hash is fixed, so this is deterministic
+    assert relative_error(sketch_of(users).count(), len(users)) < 0.05
+
+def test_count_is_unbiased_where_linear_counting_used_to_hand_over():
+    errors = []
+    for trial in range(20):
+        users = [f"{trial}:user-{i}" for i in range(10240)]
+        errors.append((sketch_of(users).count() - len(users)) / len(users))
+    assert abs(statistics.mean(errors)) < 0.01
+
+@pytest.mark.parametrize("size", SIZES)
+def test_merge_matches_sketch_of_union(size):
+    # Overlapping days, like the region_daily sketches unioned over a period
+    days = [{f"user-{i}" for i in range(start, start + size // 2)} for start in range(0, size, size // 4)]
+    union = set().union(*days)
+    
+    merged = HyperLogLog()
+    for day in days:
+        merged.merge(sketch_of(day))
+    
+    assert merged.registers == sketch_of(union).registers
+    assert relative_error(merged.count(), len(union)) < 0.05
+
+def test_stored_updates_round_trip():
+    users = [f"user-{i}" for i in range(5000)]
+    document = {}
+    for user in users:
+        # Same as {"$max": sketch_update(user)} on the region_daily document
+        for field, rank in sketch_update(user).items():
+            key = field.split(".", 1)[1]
+            document[key] = max(document.get(key, 0), rank)
+    
+    assert HyperLogLog(document).registers == sketch_of(users).registers
+    assert HyperLogLog(sketch_of(users).to_document()).count() == sketch_of(users).count()
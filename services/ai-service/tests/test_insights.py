@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import insights_engine
+from app.insights_engine import fetch_user_insight_summary, period_bounds
+from app.rollups import backfill_rollups
+
+NOW = datetime(2024, 3, 10, 15, 0)
+START, END = period_bounds(7, NOW)
+
+def make_log(user_id, at, amount):
+    return {"userId": user_id, "amount": amount, "date": at, "createdAt": at}
+
+def logs():
+    # Logs of a day share an amount, so the rollup's half split (inside the third day) is exact
+    yield make_log("u1", START - timedelta(minutes=5), 90.0)  # Day before the period
+    yield make_log("u1", START + timedelta(minutes=30), 20.0)  # Early on the first day
+    yield make_log("u1", START + timedelta(hours=9), 20.0)
+    yield make_log("u1", START + timedelta(hours=18), 20.0)
+    for day in range(1, 6):
+        for hour in (8, 13, 20)[:day % 3 + 1]:
+            yield make_log("u1", START + timedelta(days=day, hours=hour), 10.0 + day * 5)
+    yield make_log("u1", END - timedelta(minutes=10), 35.0)  # Late today
+    yield make_log("u1", END + timedelta(minutes=10), 90.0)  # Tomorrow
+    yield make_log("u2", START + timedelta(days=2), 500.0)
+
+def summarize_in_python(all_logs, user_id, start_date, end_date):
+    """The loop the router ran over the fetched logs before the $facet pipeline (9e188e2)"""
+    oil_logs = sorted(
+        (log for log in all_logs if log["userId"] == user_id and start_date <= log["date"] < end_date),
+        key=lambda log: log["date"]
+    )
+    mid_point = len(oil_logs) // 2
+    daily_consumption = {}
+    for log in oil_logs:
+        date_str = log["date"].strftime("%Y-%m-%d")
+        if date_str not in daily_consumption:
+            daily_consumption[date_str] = 0
+        daily_consumption[date_str] += log["amount"]
+    
+    return {
+        "total": sum(log["amount"] for log in oil_logs),
+        "count": len(oil_logs),
+        "first_half_avg": sum(log["amount"] for log in oil_logs[:mid_point]) / mid_point,
+        "second_half_avg": sum(log["amount"] for log in oil_logs[mid_point:]) / (len(oil_logs) - mid_point),
+        "peak_days": sorted(daily_consumption.items(), key=lambda x: x[1], reverse=True)[:3]
+    }
+
+def test_period_bounds_are_whole_days_ending_today():
+    assert (START, END) == (datetime(2024, 3, 4), datetime(2024, 3, 11))
+
+def test_rollup_summary_matches_raw_logs(mongo_db, monkeypatch):
+    async def summaries(db):
+        await db.users.insert_many([{"userId": "u1", "region": "north"}, {"userId": "u2", "region": "south"}])
+        await db.rewards.insert_one({"userId": "u1", "badges": ["first_log"], "currentStreak": 3})
+        await db.oil_logs.insert_many(list(logs()))
+        await backfill_rollups(START - timedelta(days=1), END + timedelta(days=1))
+        
+        summary = {}
+        for from_rollups in (False, True):
+            async def use_rollups(from_rollups=from_rollups):
+                return from_rollups
+            monkeypatch.setattr(insights_engine, "use_rollups", use_rollups)
+            summary[from_rollups] = await fetch_user_insight_summary("u1", START, END)
+        return summary[False], summary[True]
+    
+    raw, rollup = mongo_db(summaries)
+    
+    assert raw["count"] == 15
+    assert raw["total"] == 60.0 + 2 * 15.0 + 3 * 20.0 + 25.0 + 2 * 30.0 + 3 * 35.0 + 35.0
+    assert rollup["total"] == raw["total"] and rollup["count"] == raw["count"]
+    assert rollup["first_half_avg"] == pytest.approx(raw["first_half_avg"])
+    assert rollup["second_half_avg"] == pytest.approx(raw["second_half_avg"])
+    assert rollup["peak_days"] == raw["peak_days"]
+    assert rollup["rewards"] == raw["rewards"]
+
+def test_summary_pipeline_matches_python_loop(mongo_db, monkeypatch):
+    async def summary(db):
+        await db.users.insert_many([{"userId": "u1", "region": "north"}])
+        await db.oil_logs.insert_many(list(logs()))
+        
+        async def use_rollups():
+            return False
+        monkeypatch.setattr(insights_engine, "use_rollups", use_rollups)
+        return await fetch_user_insight_summary("u1", START, END)
+    
+    result = mongo_db(summary)
+    expected = summarize_in_python(list(logs()), "u1", START, END)
+    
+    assert result["count"] == expected["count"]
+    assert result["total"] == pytest.approx(expected["total"])
+    assert result["first_half_avg"] == pytest.approx(expected["first_half_avg"])
+    assert result["second_half_avg"] == pytest.approx(expected["second_half_avg"])
+    # Ties keep the earlier day first, as the stable sort over date-ordered days did
+    assert [day for day, _ in result["peak_days"]] == [day for day, _ in expected["peak_days"]]
+    assert [total for _, total in result["peak_days"]] == pytest.approx([total for _, total in expected["peak_days"]])
+    assert result["rewards"] is None
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from app.models.linear_stats import RidgeStats
+from app.models.ml_models import MLModels, CONSUMPTION_FEATURES
+
+T0 = datetime(2024, 1, 1)
+PROFILES = {"u1": {"familySize": 4, "age": 35}, "u2": {"familySize": 2, "age": 62}, "u3": {"familySize": 6, "age": 28}}
+
+def make_logs():
+    rng = np.random.default_rng(7)
+    return {
+        user_id: [
+            {"amount": float(round(rng.uniform(10, 60) + profile["familySize"] * 5, 1)), "date": T0 + timedelta(days=day)}
+            for day in range(10 * (index + 1) + 20)
+        ]
+        for index, (user_id, profile) in enumerate(PROFILES.items())
+    }
+
+def fitted_models(tmp_path, user_logs):
+    ml_models = MLModels(str(tmp_path))
+    features_df = ml_models.build_consumption_features(user_logs, PROFILES)
+    stats = RidgeStats(len(CONSUMPTION_FEATURES))
+    stats.update(features_df[CONSUMPTION_FEATURES].values, features_df["amount"].values)
+    ml_models.fit_consumption_stats(stats)
+    return ml_models
+
+def forecast_day_by_day(ml_models, last_row, user_profile, days_ahead):
+    """The per-day loop predict_consumption ran before the forecast was vectorized (b957a9a)"""
+    predictions = []
+    for i in range(1, days_ahead + 1):
+        pred_date = last_row['date'] + timedelta(days=i)
+        features = {
+            'day_of_week': pred_date.dayofweek,
+            'day_of_month': pred_date.day,
+            'month': pred_date.month,
+            'family_size': user_profile.get('familySize', 1),
+            'age': user_profile.get('age', 30),
+            'is_weekend': 1 if pred_date.dayofweek in [5, 6] else 0,
+            'prev_day_consumption': last_row['amount'] if i == 1 else predictions[-1]['predicted_amount'],
+            '7_day_avg': last_row['7_day_avg'],
+            '30_day_avg': last_row['30_day_avg']
+        }
+        X = np.array([[features[col] for col in CONSUMPTION_FEATURES]])
+        predicted_amount = ml_models.consumption_model.predict(ml_models.scaler.transform(X))[0]
+        predictions.append({"date": pred_date.isoformat(), "predicted_amount": round(max(0, predicted_amount), 2)})
+    return predictions
+
+def test_batch_forecast_matches_per_day_loop(tmp_path):
+    user_logs = make_logs()
+    ml_models = fitted_models(tmp_path, user_logs)
+    features_df = ml_models.build_consumption_features(user_logs, PROFILES)
+    
+    results = ml_models.predict_consumption_batch(user_logs, PROFILES, days_ahead=45)
+    
+    for user_id, last_row in features_df.groupby('userId', sort=False).tail(1).set_index('userId').iterrows():
+        expected = forecast_day_by_day(ml_models, last_row, PROFILES[user_id], 45)
+        predictions, _ = results[user_id]
+        assert [p["date"] for p in predictions] == [p["date"] for p in expected]
+        # Both round each day to 0.01 before feeding it back; allow one rounding step of drift
+        assert [p["predicted_amount"] for p in predictions] == pytest.approx(
+            [p["predicted_amount"] for p in expected], abs=0.01
+        )
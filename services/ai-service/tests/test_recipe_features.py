@@ -0,0 +1,74 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from app.models.recipe_features import RecipeFeatures
+
+def calculate_recipe_similarity(user_preferences, recipe):
+    """The per-recipe score RecipeFeatures.score replaced (MLModels before 68a101d)"""
+    score = 0.0
+    
+    oil_amount = recipe.get('oilAmount', 50)
+    if oil_amount < 20:
+        score += 30
+    elif oil_amount < 40:
+        score += 20
+    elif oil_amount < 60:
+        score += 10
+    
+    user_diet = user_preferences.get('dietaryHabit', 'vegetarian')
+    recipe_tags = recipe.get('tags', [])
+    if user_diet in ['vegetarian', 'vegan'] and 'vegetarian' in recipe_tags:
+        score += 25
+    elif user_diet == 'vegan' and 'vegan' in recipe_tags:
+        score += 30
+    
+    if recipe.get('cuisine') in user_preferences.get('cuisinePreference', []):
+        score += 20
+    
+    health_conditions = user_preferences.get('healthConditions', [])
+    if 'diabetes' in health_conditions and 'low-sugar' in recipe_tags:
+        score += 15
+    if 'heart-disease' in health_conditions and 'heart-healthy' in recipe_tags:
+        score += 15
+    if 'low-calorie' in recipe_tags:
+        score += 10
+    
+    if recipe.get('difficulty') == 'easy':
+        score += 5
+    
+    return score
+
+def make_recipes():
+    tag_sets = [[], ["vegetarian"], ["vegan"], ["vegetarian", "vegan", "low-calorie"], ["low-sugar", "heart-healthy"]]
+    oil_amounts = [5, 19.5, 20, 39, 40, 59.9, 60, 120, None]
+    cuisines = ["north", "south", None]
+    difficulties = ["easy", "medium", None]
+    recipes = []
+    for index, (tags, oil, cuisine, difficulty) in enumerate(itertools.product(tag_sets, oil_amounts, cuisines, difficulties)):
+        recipe = {"id": f"r{index}", "tags": tags}
+        # None stands for a missing field, as in older catalog documents
+        for key, value in (("oilAmount", oil), ("cuisine", cuisine), ("difficulty", difficulty)):
+            if value is not None:
+                recipe[key] = value
+        recipes.append(recipe)
+    return recipes
+
+PREFERENCES = [
+    {},
+    {"dietaryHabit": "vegetarian", "cuisinePreference": ["north"]},
+    {"dietaryHabit": "vegan", "cuisinePreference": ["south", "east"], "healthConditions": ["diabetes"]},
+    {"dietaryHabit": "non-vegetarian", "healthConditions": ["diabetes", "heart-disease"]},
+    {"dietaryHabit": "eggetarian", "cuisinePreference": ["west"]}
+]
+
+@pytest.mark.parametrize("preferences", PREFERENCES)
+def test_score_matches_per_recipe_similarity(preferences):
+    recipes = make_recipes()
+    features = RecipeFeatures.from_recipes(recipes)
+    expected = np.array([calculate_recipe_similarity(preferences, recipe) for recipe in recipes])
+    rows = np.arange(0, len(recipes), 7)
+    
+    assert features.score(preferences).tolist() == expected.tolist()
+    assert features.score(preferences, rows).tolist() == expected[rows].tolist()
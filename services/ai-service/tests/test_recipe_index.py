@@ -0,0 +1,43 @@
+import asyncio
+
+from app import recipe_index as recipe_index_module
+from app.recipe_index import RecipeIndex, project_recipe
+
+def recipe(recipe_id, oil_amount):
+    return {"_id": recipe_id, "oilAmount": oil_amount, "tags": ["vegetarian"], "cuisine": "south", "difficulty": "easy"}
+
+def loaded_index(recipes):
+    index = RecipeIndex()
+    index.entries = {entry["id"]: entry for entry in map(project_recipe, recipes)}
+    index._loaded = True
+    return index
+
+def test_change_during_rebuild_does_not_keep_stale_matrix(monkeypatch):
+    index = loaded_index([recipe("r1", 10), recipe("r2", 20)])
+    builds = []
+    
+    class ChangingExecutor:
+        async def run(self, fn, *args):
+            features = fn(*args)
+            if not builds:
+                # A recipe is inserted while the first build is off the event loop
+                index.apply_change({"operationType": "insert", "fullDocument": recipe("r3", 5)})
+            builds.append(len(features))
+            return features
+    
+    monkeypatch.setattr(recipe_index_module, "model_executor", ChangingExecutor())
+    
+    async def read_twice():
+        version = index.version
+        first = await index.features()
+        second = await index.features()
+        return version, first, second
+    
+    version, first, second = asyncio.run(read_twice())
+    
+    assert len(first) == 2
+    assert index.version > version
+    assert second is not first
+    assert second.ids == ["r1", "r2", "r3"]
+    assert builds == [2, 3]
+    assert asyncio.run(index.features()) is second
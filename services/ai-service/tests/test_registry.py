@@ -0,0 +1,43 @@
+import asyncio
+import os
+
+import pytest
+
+from app.models.registry import ModelRegistry
+
+def make_versions(registry, names):
+    for name in names:
+        os.makedirs(os.path.join(registry.versions_path, name))
+
+def set_active(registry, version):
+    with open(registry.pointer_path, "w") as f:
+        f.write(version)
+
+def test_prune_keeps_newest_versions_and_the_active_one(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    versions = [f"v2024010{day}000000000000" for day in range(1, 8)]
+    make_versions(registry, versions)
+    set_active(registry, versions[0])  # Rolled back to the oldest
+    
+    removed = registry.prune(keep=3)
+    
+    assert sorted(removed) == versions[1:4]
+    assert sorted(os.listdir(registry.versions_path)) == [versions[0]] + versions[4:]
+
+def test_prune_disabled_with_zero(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    make_versions(registry, ["v20240101000000000000", "v20240102000000000000"])
+    
+    assert registry.prune(keep=0) == []
+    assert len(os.listdir(registry.versions_path)) == 2
+
+def test_unsaved_version_leaves_no_directory(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    asyncio.run(registry.load())
+    
+    models = registry.create_version()
+    assert not os.path.exists(models.model_path)
+    
+    with pytest.raises(RuntimeError):
+        asyncio.run(registry.publish(models))
+    assert os.listdir(registry.versions_path) == []
@@ -0,0 +1,63 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from app import training
+from app.models.linear_stats import RidgeStats
+from app.models.ml_models import MLModels, CONSUMPTION_FEATURES
+
+T0 = datetime(2024, 1, 1)
+FIRST_BOUND = T0 + timedelta(days=10)
+SECOND_BOUND = FIRST_BOUND + timedelta(hours=1)
+
+def make_log(user_id, day, created_at, amount=40.0):
+    return {"userId": user_id, "amount": amount, "date": T0 + timedelta(days=day), "createdAt": created_at}
+
+def seed(fake_db):
+    fake_db.users.insert_many([{"userId": "u1", "familySize": 4, "age": 35}, {"userId": "u2", "familySize": 2, "age": 50}])
+    for user_id in ("u1", "u2"):
+        # Ten logs already trained on, then five newer than the stored watermark
+        fake_db.oil_logs.insert_many(make_log(user_id, day - 20, T0 - timedelta(days=1)) for day in range(10))
+        fake_db.oil_logs.insert_many(make_log(user_id, day, T0 + timedelta(days=day + 1)) for day in range(5))
+    # Committed before the scan but stamped after its bound
+    fake_db.oil_logs.insert_many([make_log("u1", 6, FIRST_BOUND + timedelta(minutes=3))])
+
+def context_logs(fake_db):
+    async def load_context_logs(user_ids, watermark):
+        context = {}
+        for log in sorted(fake_db.oil_logs.documents, key=lambda log: log["date"]):
+            if log["userId"] in user_ids and log["createdAt"] <= watermark:
+                context.setdefault(log["userId"], []).append({"amount": log["amount"], "date": log["date"]})
+        return {user_id: logs[-training.CONTEXT_LOGS:] for user_id, logs in context.items()}
+    return load_context_logs
+
+def test_log_written_during_incremental_scan_is_trained_by_next_run(fake_db, monkeypatch, tmp_path):
+    seed(fake_db)
+    monkeypatch.setattr(training, "get_database", lambda: fake_db)
+    monkeypatch.setattr(training, "load_context_logs", context_logs(fake_db))
+    bounds = iter([FIRST_BOUND, SECOND_BOUND])
+    monkeypatch.setattr(training, "scan_bound", lambda: next(bounds))
+    
+    # u2's logs come first (userId descending); once the cursor has moved on to u1, a u2 log
+    # stamped before the newest log already read is committed
+    def insert_late_log(log):
+        if log["userId"] == "u1" and fake_db.oil_logs.on_read is not None:
+            fake_db.oil_logs.on_read = None
+            fake_db.oil_logs.insert_many([make_log("u2", 7, FIRST_BOUND + timedelta(minutes=2))])
+    fake_db.oil_logs.on_read = insert_late_log
+    
+    ml_models = MLModels(str(tmp_path))
+    state = {"stats": RidgeStats(len(CONSUMPTION_FEATURES)), "users_count": 2, "training_samples": 20, "watermark": T0}
+    
+    async def run_twice():
+        first = await training.collect_incremental_stats(ml_models, state)
+        second = await training.collect_incremental_stats(ml_models, {**state, **first})
+        return first, second
+    
+    first, second = asyncio.run(run_twice())
+    
+    assert first["watermark"] == FIRST_BOUND
+    assert first["new_samples"] == 10
+    # Both the log past the first bound and the one committed mid-scan are picked up once
+    assert second["watermark"] == SECOND_BOUND
+    assert second["new_samples"] == 2
+    assert second["training_samples"] == 20 + 10 + 2